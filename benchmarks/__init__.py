@@ -0,0 +1 @@
+# benchmarks and equivalence checks
@@ -0,0 +1,170 @@
+"""
+airspeed velocity (asv) benchmarks for the data-processing library, run over synthetic
+catalogs at 1×, 10× and 100× the size of the real short-GRB sample (see src/synthetic.py).
+
+    asv run                # benchmark the current commit
+    asv continuous main HEAD
+    asv publish && asv preview
+
+The configuration lives in asv.conf.json at the top level of the repository. Any method
+can also be called directly, e.g. `Pairing().setup(10); Pairing().time_match_in_time(10)`.
+"""
+
+import os, sys, tempfile
+import numpy as np
+import pandas as pd
+
+try:
+    import src
+except ImportError: # running from a plain checkout rather than through asv
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.synthetic import synthetic_catalog
+from src.store import BurstStore, xrt_store, optical_store
+from src.fluxtools import add_spectral_flux
+from src.utilities import split_uncertainties
+from src.pairing import match_in_time, match_by_interpolation, match_by_overlap, classify_darkness
+from src.montecarlo import montecarlo_beta_ox
+from src.outofcore import stream_pairing
+from src.rebin import rebin_lightcurves
+
+scales = [1, 10, 100]
+_cache = {}
+
+def catalog(scale):
+    """Synthetic catalog and stores for a given scale, generated once per process."""
+
+    if scale not in _cache:
+        data = synthetic_catalog(scale, seed=20230421)
+        data["xrt store"] = xrt_store(data["xrt"], data["catalog"])
+        data["optical store"] = optical_store(data["optical"])
+        _cache[scale] = data
+    return _cache[scale]
+
+class _Scaled:
+    params = [scales]
+    param_names = ["scale"]
+    timeout = 300
+
+    def setup(self, scale):
+        self.data = catalog(scale)
+        self.xrt, self.optical = self.data["xrt store"], self.data["optical store"]
+
+class Pairing(_Scaled):
+    def time_match_in_time(self, scale):
+        match_in_time(self.xrt, self.optical, 0.1)
+
+    def time_match_in_time_wide(self, scale):
+        match_in_time(self.xrt, self.optical, 0.5)
+
+    def time_match_by_interpolation(self, scale):
+        match_by_interpolation(self.xrt, self.optical)
+
+    def time_match_by_overlap(self, scale):
+        match_by_overlap(self.xrt, self.optical, 0.1)
+
+    def peakmem_match_in_time(self, scale):
+        match_in_time(self.xrt, self.optical, 0.1)
+
+    def track_pairs(self, scale):
+        return len(match_in_time(self.xrt, self.optical, 0.1))
+    track_pairs.unit = "pairs"
+
+    def time_rebin_lightcurves(self, scale):
+        rebin_lightcurves(self.xrt)
+
+    def time_match_in_time_rebinned(self, scale):
+        match_in_time(rebin_lightcurves(self.xrt), self.optical, 0.1)
+
+    def track_pairs_rebinned(self, scale):
+        return len(match_in_time(rebin_lightcurves(self.xrt), self.optical, 0.1))
+    track_pairs_rebinned.unit = "pairs"
+
+class FluxConversion(_Scaled):
+    def time_add_spectral_flux(self, scale):
+        add_spectral_flux(self.data["xrt"], self.data["catalog"])
+
+    def time_split_uncertainties(self, scale):
+        split_uncertainties(self.data["optical"]["Flux (Jy)"])
+
+class Classification(_Scaled):
+    def setup(self, scale):
+        super().setup(scale)
+        self.pairs = match_in_time(self.xrt, self.optical, 0.1)
+        self.classified = classify_darkness(self.pairs, self.data["catalog"])
+
+    def time_classify_darkness(self, scale):
+        classify_darkness(self.pairs, self.data["catalog"])
+
+    def time_classify_darkness_restrictive(self, scale):
+        classify_darkness(self.pairs, self.data["catalog"], restrictive=True)
+
+    def time_montecarlo(self, scale):
+        montecarlo_beta_ox(self.classified, n_samples=200, seed=1)
+
+class Selections(_Scaled):
+    def setup(self, scale):
+        super().setup(scale)
+        self.frame = self.data["xrt"]
+        self.sample = np.random.default_rng(0).choice(self.xrt.grbs, min(200, len(self.xrt)), replace=False)
+
+    def time_boolean_mask_selection(self, scale):
+        for grb in self.sample:
+            self.frame[self.frame["GRB"] == grb]
+
+    def time_groupby_selection(self, scale):
+        groups = self.frame.groupby("GRB")
+        for grb in self.sample:
+            groups.get_group(grb)
+
+    def time_store_selection(self, scale):
+        for grb in self.sample:
+            self.xrt[grb]
+
+    def time_groupby_min(self, scale):
+        self.frame.groupby("GRB")["Time"].min()
+
+    def time_store_reduce(self, scale):
+        self.xrt.reduce("Time")
+
+class IO(_Scaled):
+    def setup(self, scale):
+        super().setup(scale)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.csv = os.path.join(self.tmp.name, "all_optical.csv")
+        self.data["optical"].to_csv(self.csv, index=False)
+        self.store_dir = os.path.join(self.tmp.name, "xrt")
+        self.xrt.save(self.store_dir)
+
+    def teardown(self, scale):
+        self.tmp.cleanup()
+
+    def time_read_csv(self, scale):
+        pd.read_csv(self.csv)
+
+    def time_build_optical_store(self, scale):
+        optical_store(self.csv)
+
+    def time_store_save(self, scale):
+        self.xrt.save(os.path.join(self.tmp.name, "saved"))
+
+    def time_store_load_mmap(self, scale):
+        store = BurstStore.load(self.store_dir, mmap=True)
+        store[store.grbs[len(store)//2]]
+
+class StreamedPairing(_Scaled):
+    def setup(self, scale):
+        super().setup(scale)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.paths = [os.path.join(self.tmp.name, f"{name}.csv") for name in ("xrt", "optical", "catalog")]
+        for name, path in zip(("xrt", "optical", "catalog"), self.paths):
+            self.data[name].to_csv(path, index=False)
+
+    def teardown(self, scale):
+        self.tmp.cleanup()
+
+    def time_stream_pairing(self, scale):
+        stream_pairing(*self.paths, os.path.join(self.tmp.name, "pairs"), batch_bytes=2**22)
+
+    def peakmem_stream_pairing(self, scale):
+        stream_pairing(*self.paths, os.path.join(self.tmp.name, "pairs"), batch_bytes=2**22)
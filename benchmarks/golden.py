@@ -0,0 +1,223 @@
+"""
+Golden-output equivalence and timing harness for the β_ox pairing code paths.
+
+Every path is run over the bundled inputs and its output is compared, within numeric
+tolerances, with a reference: the thesis-era products in `products/Generated Files (C++)`
+and `products/Dark Pairings`, the output of the legacy `Trial` class, or a plain-loop
+transcription of the matching cell of pipeline.ipynb. Wall time and peak (traced) memory
+are recorded for every run. Run from the top-level directory of the repository:
+
+    python -m benchmarks.golden --out bench_output.txt
+"""
+
+import os, sys, io, glob, time, argparse, tempfile, tracemalloc, contextlib, warnings, importlib.util
+import numpy as np
+import pandas as pd
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+
+from src.store import xrt_store, optical_store
+from src.pairing import match_in_time, match_by_interpolation, nu_x
+
+generated_dir = os.path.join(root, "products", "Generated Files (C++)")
+dark_dir = os.path.join(root, "products", "Dark Pairings")
+_legacy_modules = {} # scripts under src/legacy that are imported once per process
+terse_columns = ["ID", "dtX", "dtO", "dt", "BetaX", "BetaX_up", "BetaX_low", "BetaOX", "BetaOX_up", "BetaOX_low"]
+
+def load_legacy_module(relpath):
+    """Imports one of the scripts under src/legacy (whose directories contain spaces) by path."""
+
+    path = os.path.join(root, "src", "legacy", relpath)
+    spec = importlib.util.spec_from_file_location(os.path.splitext(os.path.basename(path))[0], path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def measure(func, *args, **kwargs):
+    """Runs `func` with its standard output silenced and returns (result, wall time [s],
+    peak traced memory [MiB])."""
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        result = func(*args, **kwargs)
+    wall = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return result, wall, peak
+
+def compare_tables(result, reference, keys, values, key_decimals=2, atol=0., rtol=0.):
+    """
+    Compares two tables row by row. Rows are matched on the `keys` columns (numeric keys
+    rounded to `key_decimals`, repeated keys matched in order of appearance), and the
+    `values` columns of matched rows must agree within `atol` + `rtol`*|reference|.
+
+    Returns
+    -------
+    summary : dict
+        row counts, number of matched/missing/extra rows, number of value mismatches and
+        the largest absolute difference
+    """
+
+    def keyed(table):
+        table = table.reset_index(drop=True)
+        key = pd.DataFrame({k: table[k].round(key_decimals) if pd.api.types.is_numeric_dtype(table[k]) else table[k].astype(str)
+                            for k in keys})
+        key["_n"] = key.groupby(keys, dropna=False).cumcount()
+        return pd.concat([key, table[values].add_prefix("v_")], axis=1)
+
+    merged = keyed(result).merge(keyed(reference), on=keys+["_n"], how="outer", suffixes=("", "_ref"), indicator=True)
+    both = merged[merged["_merge"] == "both"]
+    diffs, bad = [], np.zeros(len(both), dtype=bool)
+    for col in values:
+        a, b = both[f"v_{col}"].to_numpy(dtype=float), both[f"v_{col}_ref"].to_numpy(dtype=float)
+        same = (np.isnan(a) & np.isnan(b)) | (a == b)
+        with np.errstate(invalid="ignore"):
+            diff = np.where(same, 0., np.abs(a-b))
+            bad |= ~same & ~(diff <= atol + rtol*np.abs(b))
+        diffs.append(np.nanmax(diff) if len(diff) else 0.)
+    return {"rows": len(result), "reference rows": len(reference), "matched": len(both),
+            "missing": int((merged["_merge"] == "right_only").sum()), "extra": int((merged["_merge"] == "left_only").sum()),
+            "mismatched": int(bad.sum()), "max abs diff": float(max(diffs, default=0.))}
+
+def read_terse(path):
+    """Reads a terse pairing table (legacy or C++ output, or a dark-pairings file)."""
+
+    table = pd.read_csv(path)
+    table.columns = terse_columns
+    return table
+
+# ---------------------------------------------------------------- legacy calculation
+
+def _run_trial(trial, files):
+    trial.load_XRayData(files[0])
+    trial.load_BetaX(files[1])
+    trial.load_OpticalData(files[2])
+    trial.load_WavelengthData(files[3])
+    trial.calculate_Beta_OX()
+    return trial
+
+def run_legacy_trial(dt, data_dir="data"):
+    """The original `Trial` class of calc_beta_ox.py (which reads the comma-separated
+    inputs). Returns the terse output table."""
+
+    legacy = load_legacy_module("Calculation Code/calc_beta_ox.py")
+    legacy.DT_PERCENT_DIF = float(dt)
+    files = [os.path.join(root, data_dir, f"{name}.csv") for name in ("XRayData", "BetaXData", "OpticalData", "FilterInfo")]
+    with tempfile.TemporaryDirectory() as outdir:
+        legacy.diropenbox = lambda: outdir + os.sep # the legacy code joins paths with a backslash
+        _run_trial(legacy.Trial(), files).write_paired_data()
+        return read_terse(glob.glob(os.path.join(outdir, f"*GRB_Pairings-dt_{int(dt)}%.csv"))[0])
+
+def run_indexed_trial(dt, data_dir="data", ext=".csv"):
+    """IndexedTrial from calc_beta_ox_indexed.py. Returns the terse output table."""
+
+    indexed = load_legacy_module("Calculation Code/calc_beta_ox_indexed.py")
+    files = [os.path.join(root, data_dir, f"{name}{ext}") for name in ("XRayData", "BetaXData", "OpticalData", "FilterInfo")]
+    with tempfile.TemporaryDirectory() as outdir:
+        trial = _run_trial(indexed.IndexedTrial(float(dt)), files)
+        return read_terse(trial.write_paired_data(outdir)[1])
+
+# ---------------------------------------------------------------- legacy darkness
+
+def legacy_dark(terse, criterion, delta_beta_ox=0.):
+    """Darkness criteria of Graphing_Beta_OX.py applied to a terse table, through the
+    vectorized selections of graph_beta_ox_batch.py."""
+
+    if "batch" not in _legacy_modules:
+        _legacy_modules["batch"] = load_legacy_module("Graphing Code/graph_beta_ox_batch.py")
+    batch = _legacy_modules["batch"]
+    pairs = terse.set_axis(batch.columns, axis=1)
+    select = batch.dark_Jakobsson if criterion == "Jakobsson" else batch.dark_vanderHorst
+    return terse.loc[select(pairs, delta_beta_ox).index]
+
+# ---------------------------------------------------------------- pipeline matching
+
+def pipeline_loop(xrt, optical, max_dt):
+    """Plain-loop transcription of the temporal matching cell of pipeline.ipynb (nominal
+    values only), used as the reference for the vectorized pairing engines."""
+
+    xrt_data, all_optical = xrt.frame(), optical.frame()
+    rows = []
+    for i_o in all_optical.index:
+        t_o = all_optical.loc[i_o, "Time (s)"]
+        F_o = all_optical.loc[i_o, "Flux"]
+        nu_o = 299792458/float(all_optical.loc[i_o, "λ_eff"]/1e10)
+        for i_x in xrt_data[xrt_data["GRB"] == all_optical.loc[i_o, "GRB"]].index:
+            t_x = float(xrt_data.loc[i_x, "Time"])
+            dt = np.abs(t_o-t_x)/t_x
+            if dt <= max_dt:
+                F_x = xrt_data.loc[i_x, "SpecFlux"]
+                Beta_ox = -np.log10(F_x/F_o)/np.log10(nu_x/nu_o)
+                if pd.notna(Beta_ox):
+                    rows.append({"GRB": all_optical.loc[i_o, "GRB"], "t_o": t_o, "t_x": t_x, "dt%": dt,
+                                 "nu_o": nu_o, "F_o": F_o, "F_x": F_x, "B_ox": Beta_ox})
+    return pd.DataFrame(rows, columns=["GRB", "t_o", "t_x", "dt%", "nu_o", "F_o", "F_x", "B_ox"])
+
+# ---------------------------------------------------------------- harness
+
+def run_harness(dts=(5, 10, 20), pipeline_dts=(0.05, 0.1, 0.2), catalog="./products/Swift_sGRB_catalog.csv"):
+    """
+    Runs every path and comparison.
+
+    Returns
+    -------
+    report : pandas DataFrame
+        one row per (path, reference) comparison with the counts from `compare_tables`,
+        wall time [s], peak memory [MiB] and a pass/fail status
+    """
+
+    rows = []
+    def record(path, reference, summary, wall, peak, exact=False):
+        ok = summary["missing"] == 0 and summary["extra"] == 0 and summary["mismatched"] == 0
+        rows.append({"path": path, "reference": reference, **summary, "wall time (s)": wall,
+                     "peak memory (MiB)": peak, "status": "pass" if ok else ("FAIL" if exact else "differs")})
+
+    terse_keys, terse_values = ["ID", "dtX", "dtO"], ["dt", "BetaX", "BetaX_up", "BetaX_low", "BetaOX", "BetaOX_up", "BetaOX_low"]
+    for dt in dts:
+        reference = read_terse(os.path.join(generated_dir, f"GRB_Pairings-dt_{dt}_.csv"))
+        legacy, wall, peak = measure(run_legacy_trial, dt)
+        record(f"legacy Trial (dt={dt}%)", "C++ products", compare_tables(legacy, reference, terse_keys, terse_values, atol=0.0051), wall, peak)
+        indexed, wall, peak = measure(run_indexed_trial, dt)
+        record(f"IndexedTrial (dt={dt}%)", "legacy Trial", compare_tables(indexed, legacy, terse_keys, terse_values, key_decimals=12), wall, peak, exact=True)
+        indexed_txt, wall, peak = measure(run_indexed_trial, dt, os.path.join("data", "legacy"), ".txt")
+        record(f"IndexedTrial, .txt inputs (dt={dt}%)", "C++ products", compare_tables(indexed_txt, reference, terse_keys, terse_values, atol=0.0051), wall, peak)
+
+        for criterion in ("Jakobsson", "vanderHorst"):
+            for folder, suffix, delta in [("No Delta Beta", "", 0.), ("Nonzero Delta Beta", "_w_delBeta", np.log10(1 + dt/100))]:
+                path = os.path.join(dark_dir, folder, f"{criterion}_Dark-GRB_Pairings-dt_{dt}_{suffix}.csv")
+                dark, wall, peak = measure(legacy_dark, reference, criterion, delta)
+                record(f"{criterion} darkness{' + Δβ' if delta else ''} (dt={dt}%)", "Dark Pairings products",
+                       compare_tables(dark, read_terse(path), terse_keys, terse_values, atol=0.0051), wall, peak)
+
+    (xrt, optical), wall, peak = measure(lambda: (xrt_store(catalog=catalog), optical_store()))
+    rows.append({"path": "load XRT + optical stores", "reference": "", "wall time (s)": wall, "peak memory (MiB)": peak, "status": ""})
+    pair_keys, pair_values = ["GRB", "t_o", "t_x", "nu_o"], ["dt%", "F_o", "F_x", "B_ox"]
+    for max_dt in pipeline_dts:
+        loop, wall, peak = measure(pipeline_loop, xrt, optical, max_dt)
+        rows.append({"path": f"pipeline loop (max_dt={max_dt})", "reference": "", "rows": len(loop),
+                     "wall time (s)": wall, "peak memory (MiB)": peak, "status": ""})
+        vectorized, wall, peak = measure(match_in_time, xrt, optical, max_dt)
+        record(f"pairing.match_in_time (max_dt={max_dt})", "pipeline loop",
+               compare_tables(vectorized, loop, pair_keys, pair_values, key_decimals=6, rtol=1e-9), wall, peak, exact=True)
+    interpolated, wall, peak = measure(match_by_interpolation, xrt, optical)
+    rows.append({"path": "pairing.match_by_interpolation", "reference": "", "rows": len(interpolated),
+                 "wall time (s)": wall, "peak memory (MiB)": peak, "status": ""})
+    return pd.DataFrame(rows)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check pairing code paths against the reference products and time them.")
+    parser.add_argument("--out", default=None, help="also write the report to this file")
+    args = parser.parse_args()
+
+    os.chdir(root)
+    report = run_harness()
+    with pd.option_context("display.width", 250, "display.max_columns", None, "display.max_rows", None):
+        text = report.to_string(index=False, float_format=lambda x: f"{x:.4g}")
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    sys.exit(int((report["status"] == "FAIL").any()))
@@ -0,0 +1,337 @@
+"""
+Streaming darkness alerts: an asyncio service that keeps per-burst pairing state and
+classifies new optical/X-ray pairs as notices and measurements arrive.
+
+Input is a stream of JSON objects, one per line, read from files being appended to (`tail`)
+and/or a local TCP socket (`listen`). Each has a "type" and a "GRB":
+
+- {"type": "burst", "GRB": ..., "Beta_X": ..., "Beta_X_pos": ..., "Beta_X_neg": ...}
+  announces a burst with its X-ray spectral index (90% errors, as in the catalog), or with
+  "fetch": true retrieves it from the UKSSDC (xrt.get_photonIndex).
+- {"type": "xrt", "GRB": ..., "points": [{"Time", "Tpos", "Tneg", "Flux", "Fluxpos", "Fluxneg"}, ...]}
+  adds X-ray light-curve points (0.3-10 keV fluxes), or with "fetch": true retrieves the
+  current light curve (xrt.XRT_lightcurve) and adds the points that are new.
+- {"type": "optical", "GRB": ..., "Time (s)": ..., "λ_eff": ..., "Flux": ..., "Fluxpos": ..., "Fluxneg": ...}
+  adds a flux density [Jy], or "Magnitude" (AB) with "Mag error" (a number, or a label such
+  as "3-sigma" for an upper limit, see ingest.parse_mag_errors) and optionally "E(B-V)".
+
+Each update only pairs the new points with the existing points of the same burst (within
+`max_dt`, as `pairing.match_in_time`), computes β_ox with `pairing.beta_ox` and flags the
+pairs with `pairing.classify_darkness`. Output events are JSON lines: one "pair" event per
+new pair, a "dark" event the first time a burst has a dark pair, and "error" events for
+messages that could not be processed. Retrievals run in worker threads and feed their
+results back into the stream, so they never hold up other updates.
+
+    python -m src.alerts --tail notices.jsonl --listen 127.0.0.1:8766 --output alerts.jsonl
+"""
+
+import sys, json, time, asyncio, argparse
+import numpy as np
+import pandas as pd
+
+from .fluxtools import xray_spectral_flux
+from .pairing import beta_ox, classify_darkness, nu_x
+from .grbid import normalize_ids
+
+_xray_columns = ["Time", "Flux", "Fluxpos", "Fluxneg"]
+_optical_columns = ["Time (s)", "nu_o", "Flux", "Fluxpos", "Fluxneg"]
+
+def optical_flux(message):
+    """Flux density and errors [Jy] of an optical message, from Flux/Fluxpos/Fluxneg or from an
+    AB magnitude (corrected for Galactic extinction if E(B-V) is given). Upper limits get an
+    infinite Fluxneg."""
+
+    if "Flux" in message:
+        flux = float(message["Flux"])
+        return flux, float(message.get("Fluxpos", 0.)), float(message.get("Fluxneg", 0.))
+    from .ingest import parse_mag_errors
+    from .filters import galactic_extinction_curve
+
+    error = parse_mag_errors([message.get("Mag error")]).iloc[0]
+    extinction = float(galactic_extinction_curve(float(message["λ_eff"])))*float(message.get("E(B-V)", 0.) or 0.)
+    flux = 3631*10**(-(float(message["Magnitude"]) - extinction)/2.5) # AB mag = 0 at f_nu = 3631 Jy
+    if error["Upper limit"]:
+        return flux, 0., np.inf
+    sigma = np.nan_to_num(error["Magpos"]), np.nan_to_num(error["Magneg"])
+    return flux, flux*(10**(0.4*sigma[1]) - 1), flux*(1 - 10**(-0.4*sigma[0]))
+
+def _jsonable(value):
+    if isinstance(value, (np.bool_, bool)):
+        return bool(value)
+    if isinstance(value, (np.integer, np.floating)):
+        return value.item()
+    return value
+
+class BurstState:
+    """Light-curve points, photometry and β_x of one burst, with X-ray points kept sorted by time."""
+
+    def __init__(self, grb):
+        self.grb = grb
+        self.beta = None # (Beta_X, Beta_X_pos, Beta_X_neg), 90% errors
+        self.xray = {col: np.empty(0) for col in _xray_columns}
+        self.spec_flux = [np.empty(0)]*3
+        self.optical = {col: np.empty(0) for col in _optical_columns}
+        self.dark = False
+
+    def add_xray(self, points):
+        """Inserts X-ray points with times not seen before; returns their positions after insertion."""
+
+        times = np.asarray(points["Time"], dtype=float)
+        new = ~np.isin(times, self.xray["Time"]) & np.isfinite(times)
+        times, first = np.unique(times[new], return_index=True) # also drops repeated times within the update
+        rows = np.flatnonzero(new)[first]
+        where = np.searchsorted(self.xray["Time"], times)
+        for col in _xray_columns:
+            values = np.abs(np.asarray(points[col], dtype=float)[rows]) if col != "Time" else times
+            self.xray[col] = np.insert(self.xray[col], where, values)
+        self._convert()
+        return where + np.arange(len(where))
+
+    def add_optical(self, t_o, nu_o, flux):
+        for col, value in zip(_optical_columns, (t_o, nu_o, *flux)):
+            self.optical[col] = np.append(self.optical[col], value)
+        return len(self.optical["Time (s)"]) - 1
+
+    def _convert(self):
+        """Flux densities [Jy] of all X-ray points (NaN until β_x is known)."""
+
+        beta = self.beta or (np.nan, np.nan, np.nan)
+        self.spec_flux = xray_spectral_flux(self.xray["Flux"], self.xray["Fluxpos"], self.xray["Fluxneg"],
+                                            beta[0], beta[1]/1.645, beta[2]/1.645) # 90% conf to 1-sigma
+
+    def set_beta(self, beta):
+        self.beta = tuple(float(b) for b in beta)
+        self._convert()
+
+    def pairs(self, i_o, i_x):
+        """Table of the given (optical, X-ray) index pairs, in the format of `pairing.match_in_time`."""
+
+        t_o, t_x = self.optical["Time (s)"][i_o], self.xray["Time"][i_x]
+        F_o = [self.optical[col][i_o] for col in ("Flux", "Fluxpos", "Fluxneg")]
+        F_x = [arr[i_x] for arr in self.spec_flux]
+        B_ox = beta_ox(*F_o, *F_x, self.optical["nu_o"][i_o])
+        results = pd.DataFrame({"GRB": self.grb, "t_o": t_o, "t_x": t_x, "dt%": np.abs(t_o-t_x)/t_x,
+                                "nu_o": self.optical["nu_o"][i_o], "F_o": F_o[0], "F_o_pos": F_o[1], "F_o_neg": F_o[2],
+                                "nu_x": nu_x, "F_x": F_x[0], "F_x_pos": F_x[1], "F_x_neg": F_x[2],
+                                "B_ox": B_ox[0], "B_ox_pos": B_ox[1], "B_ox_neg": B_ox[2]})
+        return results[results["B_ox"].notna()]
+
+class AlertState:
+    """
+    Incremental pairing and darkness classification for a stream of updates.
+
+    Parameters
+    ----------
+    max_dt : float
+        maximum fractional time separation of a pair (see `pairing.match_in_time`)
+    restrictive : bool
+        require the whole 1-sigma β_ox range to satisfy the darkness criteria
+    catalog : pandas DataFrame or None
+        known bursts with Beta_X/Beta_X_pos/Beta_X_neg, e.g. the sGRB catalog
+    """
+
+    def __init__(self, max_dt=0.1, restrictive=False, catalog=None):
+        self.max_dt = max_dt
+        self.restrictive = restrictive
+        self.bursts = {}
+        self.stats = {"messages": 0, "pairs": 0, "dark": 0, "errors": 0, "max_ms": 0.}
+        if catalog is not None:
+            for grb, *beta in catalog[["GRB", "Beta_X", "Beta_X_pos", "Beta_X_neg"]].dropna().itertuples(index=False):
+                self.burst(grb).set_beta(beta)
+
+    def burst(self, grb):
+        grb = normalize_ids([grb]).iloc[0] # so that "GRB 200522A" and "200522A" share a state
+        if grb not in self.bursts:
+            self.bursts[grb] = BurstState(grb)
+        return self.bursts[grb]
+
+    def _window(self, times, t):
+        """Slice of sorted `times` within the max_dt criterion of `t` (padded; filtered exactly later)."""
+
+        lo = np.searchsorted(times, t/(1+self.max_dt)*(1-1e-9), side="left")
+        hi = np.searchsorted(times, t/(1-self.max_dt)*(1+1e-9), side="right") if self.max_dt < 1 else len(times)
+        return lo, hi
+
+    def update(self, message):
+        """Applies one message and returns the resulting events (a list of dicts)."""
+
+        start = time.perf_counter()
+        self.stats["messages"] += 1
+        kind = message.get("type")
+        state = self.burst(message["GRB"])
+        if kind == "burst":
+            if "Beta_X" not in message:
+                return []
+            state.set_beta([message["Beta_X"], message.get("Beta_X_pos", 0.), message.get("Beta_X_neg", 0.)])
+            i_o, i_x = np.arange(len(state.optical["Time (s)"])), np.arange(len(state.xray["Time"])) # reclassify the whole burst
+        elif kind == "xrt":
+            points = pd.DataFrame(message["points"]).reindex(columns=_xray_columns)
+            points[["Fluxpos", "Fluxneg"]] = points[["Fluxpos", "Fluxneg"]].fillna(0.)
+            i_o, i_x = np.arange(len(state.optical["Time (s)"])), state.add_xray(points)
+        elif kind == "optical":
+            t_o = float(message["Time (s)"])
+            nu_o = 299792458/(float(message["λ_eff"])/1e10) # optical frequency [Hz]
+            i_o = np.array([state.add_optical(t_o, nu_o, optical_flux(message))])
+            i_x = np.arange(*self._window(state.xray["Time"], t_o))
+        else:
+            raise ValueError(f"unknown message type {kind!r}")
+        i_o, i_x = (arr.ravel() for arr in np.meshgrid(i_o, i_x, indexing="ij"))
+        t_o, t_x = state.optical["Time (s)"][i_o], state.xray["Time"][i_x]
+        keep = np.abs(t_o - t_x)/t_x <= self.max_dt
+        i_o, i_x = i_o[keep], i_x[keep]
+
+        events = []
+        if state.beta is not None and len(i_o):
+            catalog = pd.DataFrame([[state.grb, *state.beta]], columns=["GRB", "Beta_X", "Beta_X_pos", "Beta_X_neg"])
+            pairs = classify_darkness(state.pairs(i_o, i_x), catalog, self.restrictive)
+            dark = pairs["Jak_dark"] | pairs["vdH_dark"]
+            events = [{"event": "pair", **{col: _jsonable(val) for col, val in row.items()}} for row in pairs.to_dict("records")]
+            if dark.any() and not state.dark:
+                state.dark = True
+                self.stats["dark"] += 1
+                first = pairs[dark].iloc[0]
+                events.append({"event": "dark", "GRB": state.grb, "t_o": float(first["t_o"]), "t_x": float(first["t_x"]),
+                               "B_ox": float(first["B_ox"]), "B_x": float(first["B_x"]),
+                               "Jak_dark": bool(first["Jak_dark"]), "vdH_dark": bool(first["vdH_dark"])})
+            self.stats["pairs"] += len(pairs)
+        elapsed = 1e3*(time.perf_counter() - start)
+        self.stats["max_ms"] = max(self.stats["max_ms"], elapsed)
+        for event in events:
+            event["elapsed_ms"] = elapsed
+        return events
+
+def _fetch(message):
+    """Blocking UKSSDC retrieval for a message with "fetch": true; returns the message to
+    process in its place."""
+
+    from .xrt import XRT_lightcurve, get_photonIndex # not at module level: xrt.py queries the UKSSDC on import
+
+    grb = message["GRB"]
+    if message["type"] == "burst":
+        gamma, _ = get_photonIndex(grb)
+        return {"type": "burst", "GRB": grb, "Beta_X": gamma.value - 1, "Beta_X_pos": gamma.plus, "Beta_X_neg": gamma.minus}
+    lightcurve = XRT_lightcurve(grb)
+    return {"type": "xrt", "GRB": grb, "points": lightcurve[_xray_columns + ["Tpos", "Tneg"]].to_dict("records")}
+
+async def tail(path, queue, poll_interval=0.5, from_start=True):
+    """Puts every line appended to the file at `path` into `queue` (the existing contents too,
+    if `from_start`), polling for new data every `poll_interval` seconds."""
+
+    with open(path, encoding="utf-8") as f:
+        if not from_start:
+            f.seek(0, 2)
+        pending = ""
+        while True:
+            line = f.readline()
+            if not line:
+                await asyncio.sleep(poll_interval)
+                continue
+            pending += line
+            if pending.endswith("\n"): # otherwise the line is still being written
+                await queue.put(pending)
+                pending = ""
+
+async def listen(host, port, queue):
+    """Accepts connections on a local TCP socket and puts every line received into `queue`."""
+
+    async def handle(reader, writer):
+        while line := await reader.readline():
+            await queue.put(line.decode("utf-8"))
+        writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+class AlertService:
+    """
+    Runs an `AlertState` over messages from any number of sources.
+
+    Parameters
+    ----------
+    state : AlertState
+    emit : callable
+        called with every event (dict); defaults to writing JSON lines to stdout
+    """
+
+    def __init__(self, state=None, emit=None):
+        self.state = state or AlertState()
+        self.emit = emit or (lambda event: print(json.dumps(event), flush=True))
+        self.queue = asyncio.Queue()
+        self._fetches = set()
+
+    async def _fetch(self, message):
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(None, _fetch, message)
+            await self.queue.put(result)
+        except Exception as e:
+            self.state.stats["errors"] += 1
+            self.emit({"event": "error", "GRB": message.get("GRB"), "error": f"retrieval failed: {e!r}"})
+
+    def process(self, message):
+        """Handles one message (a dict or a JSON line)."""
+
+        try:
+            message = json.loads(message) if isinstance(message, str) else message
+            if message.get("fetch"):
+                task = asyncio.ensure_future(self._fetch(message))
+                self._fetches.add(task)
+                task.add_done_callback(self._fetches.discard)
+                return
+            for event in self.state.update(message):
+                self.emit(event)
+        except Exception as e:
+            self.state.stats["errors"] += 1
+            self.emit({"event": "error", "message": message, "error": repr(e)})
+
+    async def run(self, sources=(), until_idle=None):
+        """
+        Processes messages from the queue, which the `sources` coroutines (e.g. `tail` and
+        `listen`) feed. Runs forever, or, with `until_idle` [s], returns once no message has
+        arrived for that long and no retrieval is pending.
+        """
+
+        tasks = [asyncio.ensure_future(source) for source in sources]
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), until_idle)
+                except asyncio.TimeoutError:
+                    if self._fetches:
+                        continue
+                    return self.state.stats
+                if isinstance(item, str) and not item.strip():
+                    continue
+                self.process(item)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Classify optical darkness as notices and measurements arrive.")
+    parser.add_argument("--tail", action="append", default=[], help="JSON-lines file to follow (repeatable)")
+    parser.add_argument("--listen", default=None, help="HOST:PORT of a local socket accepting JSON lines")
+    parser.add_argument("--output", default=None, help="file to append events to (default: stdout)")
+    parser.add_argument("--catalog", default=None, help="CSV with GRB and Beta_X columns to start from")
+    parser.add_argument("--max-dt", type=float, default=0.1)
+    parser.add_argument("--restrictive", action="store_true")
+    parser.add_argument("--from-end", action="store_true", help="skip the existing contents of tailed files")
+    parser.add_argument("--until-idle", type=float, default=None, help="exit after this many seconds without input")
+    args = parser.parse_args()
+
+    catalog = pd.read_csv(args.catalog) if args.catalog else None
+    output = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout
+    emit = lambda event: print(json.dumps(event), file=output, flush=True)
+
+    async def main():
+        service = AlertService(AlertState(args.max_dt, args.restrictive, catalog), emit)
+        sources = [tail(path, service.queue, from_start=not args.from_end) for path in args.tail]
+        if args.listen:
+            host, port = args.listen.rsplit(":", 1)
+            sources.append(listen(host, int(port), service.queue))
+        return await service.run(sources, args.until_idle)
+
+    try:
+        print(asyncio.run(main()), file=sys.stderr)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,150 @@
+"""
+Columnar accumulator for tables built up a row (or a block of rows) at a time.
+
+Growing a DataFrame with `pd.concat` inside a loop copies the whole table on every
+iteration, which is quadratic in its final size. `TableBuilder` instead keeps one NumPy
+array per column with spare capacity, doubles them when they fill up, and turns them into a
+DataFrame once at the end.
+"""
+
+import numpy as np
+import pandas as pd
+
+def _fill_value(dtype):
+    """Value written to a column of this dtype where a row does not give one."""
+
+    if dtype.kind in "fc":
+        return np.nan
+    if dtype.kind in "mM":
+        return np.array("NaT", dtype=dtype)
+    if dtype.kind == "b":
+        return False
+    return None
+
+def _numpy_dtype(dtype):
+    """NumPy dtype for a schema entry; pandas extension dtypes (strings, categoricals, ...) are stored as objects."""
+
+    try:
+        return np.dtype(dtype)
+    except TypeError:
+        return np.dtype(object)
+
+def _infer_dtype(values):
+    """float64 for numbers (so that missing entries can be NaN), bool for booleans, object otherwise."""
+
+    kind = np.asarray(values).dtype.kind
+    if kind in "iuf":
+        return np.dtype(float)
+    if kind in "bmMc":
+        return np.asarray(values).dtype
+    return np.dtype(object)
+
+class TableBuilder:
+    """
+    Accumulates rows into pre-sized, growable per-column arrays.
+
+    Parameters
+    ----------
+    schema : dict or list
+        column -> dtype, or a list of columns whose dtypes are inferred from the first value
+        written to each (see `_infer_dtype`). Writing to a column outside the schema raises
+        a KeyError.
+    capacity : int
+        number of rows to allocate up front
+    """
+
+    def __init__(self, schema, capacity=1024):
+        schema = schema if isinstance(schema, dict) else dict.fromkeys(schema)
+        self.schema = {col: None if dtype is None else _numpy_dtype(dtype) for col, dtype in schema.items()}
+        self._capacity = max(1, int(capacity))
+        self._length = 0
+        self._arrays = {col: np.empty(self._capacity, dtype) for col, dtype in self.schema.items() if dtype is not None}
+
+    @classmethod
+    def from_dataframe(cls, frame, capacity=None):
+        """Builder starting out with the rows and column dtypes of an existing DataFrame."""
+
+        builder = cls(dict(frame.dtypes.items()), capacity=max(2*len(frame), 1024) if capacity is None else capacity)
+        builder.extend(frame)
+        return builder
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def columns(self):
+        return list(self.schema)
+
+    def _reserve(self, size):
+        if size <= self._capacity:
+            return
+        self._capacity = max(size, 2*self._capacity)
+        for col, array in self._arrays.items():
+            grown = np.empty(self._capacity, array.dtype)
+            grown[:self._length] = array[:self._length]
+            self._arrays[col] = grown
+
+    def _array(self, col, values):
+        """Array backing `col`, allocating it (with earlier rows filled in) on its first value."""
+
+        if col not in self.schema:
+            raise KeyError(f"column {col!r} is not in the schema of this table")
+        if col not in self._arrays:
+            dtype = self.schema[col] = _infer_dtype(values)
+            self._arrays[col] = np.empty(self._capacity, dtype)
+            self._arrays[col][:self._length] = _fill_value(dtype)
+        return self._arrays[col]
+
+    def _fill(self, col, start, stop):
+        """Fills rows start:stop of a column that a row or block does not give. Integer columns
+        are promoted to float first, so that the missing entries are NaN as with `pd.concat`."""
+
+        array = self._arrays[col]
+        if array.dtype.kind in "iu":
+            array = self._arrays[col] = array.astype(float)
+            self.schema[col] = array.dtype
+        array[start:stop] = _fill_value(array.dtype)
+
+    def append(self, row=None, **values):
+        """Adds one row, given as a dict and/or keyword arguments. Columns it does not
+        mention are filled with NaN (integer columns become float; None for object columns,
+        False for booleans)."""
+
+        values = {**(row or {}), **values}
+        self._reserve(self._length + 1)
+        for col, value in values.items():
+            sample = [value] if np.ndim(value) == 0 else np.array([None], dtype=object) # sequence-like entries are objects
+            self._array(col, sample)[self._length] = value
+        for col in list(self._arrays):
+            if col not in values:
+                self._fill(col, self._length, self._length + 1)
+        self._length += 1
+
+    def extend(self, columns):
+        """Adds a block of rows given as a DataFrame or a dict of column -> equal-length
+        array (scalars are repeated). Missing columns are filled as in `append`."""
+
+        if isinstance(columns, pd.DataFrame):
+            columns = {col: columns[col].to_numpy() for col in columns.columns}
+        lengths = {len(values) for values in columns.values() if np.ndim(values) > 0}
+        if len(lengths) > 1:
+            raise ValueError(f"columns have different lengths: {sorted(lengths)}")
+        n = lengths.pop() if lengths else 1
+        start, stop = self._length, self._length + n
+        self._reserve(stop)
+        for col, values in columns.items():
+            array = self._array(col, values)
+            if array.dtype == object and np.ndim(values) > 0:
+                array[start:stop] = np.fromiter(values, dtype=object, count=n) # keeps sequence-like entries whole
+            else:
+                array[start:stop] = values
+        for col in list(self._arrays):
+            if col not in columns:
+                self._fill(col, start, stop)
+        self._length = stop
+
+    def to_dataframe(self):
+        """The rows accumulated so far as a DataFrame (a copy; the builder can keep growing)."""
+
+        return pd.DataFrame({col: self._arrays[col][:self._length].copy() if col in self._arrays
+                             else np.full(self._length, np.nan) for col in self.schema})
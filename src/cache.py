@@ -0,0 +1,110 @@
+"""
+On-disk cache of cleaned source tables, keyed by file content and cleaning-code version.
+
+Reading data/newData.xlsx through openpyxl and re-running the same cleaning on every
+source table dominates the start-up of the pipeline. `cached_table` runs a loader once and
+stores its result as a pickle under `cache_directory`; later calls with the same loader,
+version and arguments are served from there as long as the SHA-1 digests of the input
+files are unchanged. Bumping a loader's version (or changing the pandas version, which
+determines the pickle layout) invalidates its entries, and an entry is deleted when it is
+superseded by one for newer file contents.
+"""
+
+import os, glob, hashlib
+import pandas as pd
+
+cache_directory = "./.cache/ingest"
+cache_variable = "DARKGRBS_NO_CACHE" # set to any non-empty value to bypass the cache
+
+def file_digest(path, chunk_size=2**20):
+    """SHA-1 hex digest of a file's contents."""
+
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _loader_name(loader):
+    return f"{getattr(loader, '__module__', '')}.{getattr(loader, '__qualname__', repr(loader))}"
+
+def cache_key(paths, loader, version, args=(), kwargs=None):
+    """
+    Names of the cache entry for a loader call.
+
+    Returns
+    -------
+    prefix : string
+        identifies the loader, its arguments and the input paths, shared by all entries that
+        supersede each other
+    key : string
+        additionally identifies the file contents, the loader version and the pandas version
+    """
+
+    paths = [paths] if isinstance(paths, str) else list(paths)
+    call = [_loader_name(loader), repr(args), repr(sorted((kwargs or {}).items()))] + [os.path.abspath(p) for p in paths]
+    prefix = hashlib.sha1("\0".join(call).encode()).hexdigest()[:12]
+    parts = call + [str(version), pd.__version__] + [file_digest(p) for p in paths]
+    return prefix, hashlib.sha1("\0".join(parts).encode()).hexdigest()[:16]
+
+def cached_table(paths, loader, *args, version=1, directory=None, refresh=False, **kwargs):
+    """
+    Result of `loader(path, *args, **kwargs)`, where `path` is the first of `paths`, served
+    from the cache when the input files, the loader, its `version` and its arguments are the
+    same as for a stored result.
+
+    Parameters
+    ----------
+    paths : str or list of str
+        input file, or all files the loader reads (the first one is passed to it)
+    loader : callable
+        function returning the cleaned table (any picklable object)
+    version : int or str
+        version of the loader's cleaning code; change it whenever its output would change
+    directory : str or None
+        cache location (default: `cache_directory`)
+    refresh : bool
+        run the loader and overwrite the stored result even if it is current
+
+    Returns
+    -------
+    table : pandas DataFrame
+        the loader's result
+    """
+
+    first = paths if isinstance(paths, str) else paths[0]
+    if os.environ.get(cache_variable):
+        return loader(first, *args, **kwargs)
+    directory = directory or cache_directory
+    prefix, key = cache_key(paths, loader, version, args, kwargs)
+    entry = os.path.join(directory, f"{prefix}-{key}.pkl")
+    if not refresh and os.path.exists(entry):
+        try:
+            return pd.read_pickle(entry)
+        except Exception: # unreadable (e.g. truncated) entries are rebuilt
+            pass
+
+    table = loader(first, *args, **kwargs)
+    os.makedirs(directory, exist_ok=True)
+    for stale in glob.glob(os.path.join(directory, f"{prefix}-*.pkl")):
+        os.remove(stale)
+    temporary = f"{entry}.{os.getpid()}.tmp"
+    pd.to_pickle(table, temporary)
+    os.replace(temporary, entry) # atomic, so concurrent readers never see a partial file
+    return table
+
+def read_csv(path, version=1, **kwargs):
+    """Cached `pandas.read_csv`."""
+
+    return cached_table(path, pd.read_csv, version=version, **kwargs)
+
+def read_excel(path, version=1, **kwargs):
+    """Cached `pandas.read_excel`."""
+
+    return cached_table(path, pd.read_excel, version=version, **kwargs)
+
+def clear_cache(directory=None):
+    """Deletes all cache entries."""
+
+    for entry in glob.glob(os.path.join(directory or cache_directory, "*.pkl")):
+        os.remove(entry)
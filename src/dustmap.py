@@ -0,0 +1,244 @@
+"""
+Galactic E(B-V) from a locally stored dust map, looked up for whole catalogs at once.
+
+Two map formats are read, both memory-mapped so that only the pages around the requested
+positions are touched:
+
+- HEALPix maps in Galactic coordinates (e.g. the SFD or Planck E(B-V) maps distributed by
+  LAMBDA/the Planck Legacy Archive as a FITS binary table, or a plain .npy array in RING
+  order). healpy is used for the pixel lookup when it is installed; otherwise an equivalent
+  NumPy implementation is used.
+- The original SFD (1998) Lambert zenithal-equal-area projections,
+  SFD_dust_<n>_ngp.fits and SFD_dust_<n>_sgp.fits.
+
+The R_b values of data/Rb.csv (Schlafly & Finkbeiner 2011, Table 6) are per unit of SFD
+E(B-V), so SFD-based maps need no rescaling for `add_extinction`.
+"""
+
+import os, glob
+import numpy as np
+import pandas as pd
+from astropy.io import fits
+from astropy.coordinates import SkyCoord
+import astropy.units as u
+
+try:
+    import healpy
+except ImportError:
+    healpy = None
+
+def _spread_bits(v):
+    """Interleaves the bits of v with zeros (bit i -> bit 2i), for NESTED pixel indices."""
+
+    v = v.astype(np.int64)
+    result = np.zeros_like(v)
+    for i in range(30):
+        result |= ((v >> i) & 1) << (2*i)
+    return result
+
+def ang2pix(nside, theta, phi, nest=False):
+    """
+    HEALPix pixel indices for colatitudes `theta` and longitudes `phi` [radians], vectorized.
+    Uses healpy if available; otherwise follows the loc2pix algorithm of the HEALPix C++
+    library (Górski et al. 2005).
+    """
+
+    if healpy is not None:
+        return healpy.ang2pix(nside, theta, phi, nest=nest)
+    z = np.cos(np.asarray(theta, dtype=float))
+    za = np.abs(z)
+    tt = np.mod(np.asarray(phi, dtype=float), 2*np.pi) * (2/np.pi) # in [0,4)
+    tt = np.where(tt >= 4, 0., tt)
+    equatorial = za <= 2/3
+    pix = np.zeros(np.broadcast(z, tt).shape, dtype=np.int64)
+
+    # equatorial region
+    temp1 = nside*(0.5 + tt)
+    temp2 = nside*z*0.75
+    jp = (temp1 - temp2).astype(np.int64) # index of ascending edge line
+    jm = (temp1 + temp2).astype(np.int64) # index of descending edge line
+    # polar caps
+    with np.errstate(invalid="ignore"):
+        ntt = np.minimum(tt.astype(np.int64), 3)
+        tp = tt - ntt
+        tmp = nside*np.sqrt(3*(1 - za))
+    jp_cap = np.minimum((tp*tmp).astype(np.int64), nside-1)
+    jm_cap = np.minimum(((1 - tp)*tmp).astype(np.int64), nside-1)
+
+    if not nest:
+        ncap = 2*nside*(nside-1)
+        ir = nside + 1 + jp - jm # ring number counted from z=2/3, in 1..2nside+1
+        kshift = 1 - (ir & 1)
+        ip = np.mod((jp + jm - nside + kshift + 1)//2, 4*nside)
+        pix_eq = ncap + (ir-1)*4*nside + ip
+
+        ir_cap = jp_cap + jm_cap + 1 # ring number counted from the closest pole
+        ip_cap = np.mod((tt*ir_cap).astype(np.int64), 4*ir_cap)
+        pix_cap = np.where(z > 0, 2*ir_cap*(ir_cap-1) + ip_cap, 12*nside**2 - 2*ir_cap*(ir_cap+1) + ip_cap)
+        pix = np.where(equatorial, pix_eq, pix_cap)
+    else:
+        order = int(np.log2(nside))
+        ifp, ifm = jp >> order, jm >> order
+        face_eq = np.where(ifp == ifm, ifp | 4, np.where(ifp < ifm, ifp, ifm + 8))
+        ix_eq = jm & (nside-1)
+        iy_eq = nside - (jp & (nside-1)) - 1
+
+        north = z >= 0
+        face_cap = np.where(north, ntt, ntt + 8)
+        ix_cap = np.where(north, nside - jm_cap - 1, jp_cap)
+        iy_cap = np.where(north, nside - jp_cap - 1, jm_cap)
+
+        face = np.where(equatorial, face_eq, face_cap)
+        ix = np.where(equatorial, ix_eq, ix_cap)
+        iy = np.where(equatorial, iy_eq, iy_cap)
+        pix = face*nside**2 + _spread_bits(ix) + 2*_spread_bits(iy)
+    return pix
+
+class HealpixDustMap:
+    """
+    E(B-V) HEALPix map in Galactic coordinates.
+
+    Parameters
+    ----------
+    path : str
+        FITS file with the map in a binary table extension, or a .npy array (RING order)
+    column : str or None
+        table column holding E(B-V) (default: the first column)
+    nest : bool or None
+        pixel ordering; read from the ORDERING header keyword if None
+    """
+
+    def __init__(self, path, column=None, nest=None):
+        self.path = path
+        if path.endswith(".npy"):
+            self.values = np.load(path, mmap_mode="r")
+            self.nest = bool(nest)
+        else:
+            self._hdul = fits.open(path, memmap=True)
+            hdu = next(h for h in self._hdul if isinstance(h, fits.BinTableHDU))
+            data = hdu.data[column or hdu.columns.names[0]]
+            self.values = data.reshape(-1) # rows of several pixels each (e.g. 1024E) are flattened
+            self.nest = hdu.header.get("ORDERING", "RING").upper().startswith("NEST") if nest is None else nest
+        self.nside = int(round(np.sqrt(len(self.values)/12)))
+        assert 12*self.nside**2 == len(self.values), f"{path} does not contain a full-sky HEALPix map"
+
+    def ebv(self, l, b):
+        """E(B-V) at Galactic longitudes/latitudes `l`, `b` [deg] (nearest pixel)."""
+
+        theta = np.radians(90 - np.asarray(b, dtype=float))
+        phi = np.radians(np.asarray(l, dtype=float))
+        return np.asarray(self.values[ang2pix(self.nside, theta, phi, nest=self.nest)], dtype=float)
+
+class SFDDustMap:
+    """
+    The SFD (1998) E(B-V) maps as the pair of Lambert zenithal-equal-area projections
+    centred on the Galactic poles.
+
+    Parameters
+    ----------
+    directory : str
+        directory containing SFD_dust_*_ngp.fits and SFD_dust_*_sgp.fits
+    interpolate : bool
+        bilinear interpolation between pixels instead of the nearest pixel
+    """
+
+    def __init__(self, directory, interpolate=False):
+        self.interpolate = interpolate
+        self.hemispheres = {}
+        for pole, sign in [("ngp", 1), ("sgp", -1)]:
+            path = sorted(glob.glob(os.path.join(directory, f"SFD_dust_*_{pole}.fits")))[0]
+            hdu = fits.open(path, memmap=True)[0]
+            header = hdu.header
+            self.hemispheres[sign] = (hdu.data, header.get("LAM_SCAL", header["NAXIS1"]//2),
+                                      header.get("CRPIX1", header["NAXIS1"]/2 + 0.5) - 1,
+                                      header.get("CRPIX2", header["NAXIS2"]/2 + 0.5) - 1)
+
+    def ebv(self, l, b):
+        """E(B-V) at Galactic longitudes/latitudes `l`, `b` [deg]."""
+
+        l, b = np.broadcast_arrays(np.radians(np.asarray(l, dtype=float)), np.radians(np.asarray(b, dtype=float)))
+        result = np.full(l.shape, np.nan)
+        for sign, (data, scale, x0, y0) in self.hemispheres.items():
+            hemisphere = (b >= 0) if sign > 0 else (b < 0)
+            r = scale*np.sqrt(1 - sign*np.sin(b[hemisphere]))
+            x = x0 + r*np.cos(l[hemisphere])
+            y = y0 - sign*r*np.sin(l[hemisphere])
+            ny, nx = data.shape
+            if self.interpolate:
+                x, y = np.clip(x, 0, nx-1.001), np.clip(y, 0, ny-1.001)
+                ix, iy = x.astype(int), y.astype(int)
+                fx, fy = x - ix, y - iy
+                result[hemisphere] = ((1-fx)*(1-fy)*data[iy, ix] + fx*(1-fy)*data[iy, ix+1]
+                                      + (1-fx)*fy*data[iy+1, ix] + fx*fy*data[iy+1, ix+1])
+            else:
+                ix = np.clip(np.round(x).astype(int), 0, nx-1)
+                iy = np.clip(np.round(y).astype(int), 0, ny-1)
+                result[hemisphere] = data[iy, ix]
+        return result
+
+def load_dust_map(path, **kwargs):
+    """HealpixDustMap for a file, SFDDustMap for a directory of SFD projections."""
+
+    if os.path.isdir(path):
+        return SFDDustMap(path, **kwargs)
+    return HealpixDustMap(path, **kwargs)
+
+def galactic_ebv(ra, dec, dustmap, scale=1.):
+    """
+    Galactic E(B-V) at many equatorial positions in one call.
+
+    Parameters
+    ----------
+    ra, dec : array_like
+        J2000 coordinates, either in degrees or as sexagesimal strings ("08:48:35.73",
+        "-02:44:07.1"); missing or unparsable positions give NaN
+    dustmap : HealpixDustMap, SFDDustMap or str
+        dust map, or a path for `load_dust_map`
+    scale : float
+        multiplicative recalibration of the map (e.g. 0.86 to convert SFD to the
+        Schlafly & Finkbeiner 2011 scale; leave at 1 for use with data/Rb.csv)
+
+    Returns
+    -------
+    ebv : numpy array
+        E(B-V) [mag] per position
+    """
+
+    dustmap = load_dust_map(dustmap) if isinstance(dustmap, str) else dustmap
+    ra, dec = pd.Series(np.asarray(ra, dtype=object)), pd.Series(np.asarray(dec, dtype=object))
+    sexagesimal = ra.astype(str).str.contains(":").any()
+    valid = ra.notna() & dec.notna()
+    if sexagesimal:
+        valid &= ra.astype(str).str.match(r"^\s*\d") & dec.astype(str).str.match(r"^\s*[+-]?\d")
+    ebv = np.full(len(ra), np.nan)
+    if valid.any():
+        if sexagesimal:
+            coords = SkyCoord(ra[valid].astype(str).to_numpy(), dec[valid].astype(str).to_numpy(), unit=(u.hourangle, u.deg))
+        else:
+            coords = SkyCoord(ra[valid].to_numpy(dtype=float), dec[valid].to_numpy(dtype=float), unit=u.deg)
+        galactic = coords.galactic
+        ebv[valid.to_numpy()] = scale*dustmap.ebv(galactic.l.deg, galactic.b.deg)
+    return ebv
+
+def catalog_ebv(catalog, dustmap, ra_col="XRT RA (J2000)", dec_col="XRT Dec (J2000)", scale=1.):
+    """E(B-V) for every burst in the catalog from its XRT position, as a Series indexed by GRB."""
+
+    return pd.Series(galactic_ebv(catalog[ra_col], catalog[dec_col], dustmap, scale), index=catalog["GRB"].to_numpy(), name="E(B-V)")
+
+def add_extinction(photometry, catalog, dustmap, overwrite=False, scale=1.):
+    """
+    Fills the E(B-V) and Extinction (A_b = R_b E(B-V), with the pipeline's R_b interpolation)
+    columns of a copy of a photometry table (columns GRB and λ_eff, as in all_optical.csv)
+    from the dust map, using the catalog's XRT positions. Existing E(B-V) values are kept
+    unless `overwrite`; bursts without a position keep whatever they had.
+    """
+
+    from .filters import galactic_extinction_curve
+
+    ebv = catalog_ebv(catalog.drop_duplicates("GRB"), dustmap, scale=scale)
+    looked_up = ebv.reindex(photometry["GRB"].to_numpy()).to_numpy()
+    photometry = photometry.copy()
+    current = pd.to_numeric(photometry["E(B-V)"], errors="coerce").to_numpy() if "E(B-V)" in photometry else np.full(len(photometry), np.nan)
+    photometry["E(B-V)"] = np.where(np.isnan(looked_up) | (~np.isnan(current) & (not overwrite)), current, looked_up)
+    photometry["Extinction"] = galactic_extinction_curve(photometry["λ_eff"].to_numpy(dtype=float))*photometry["E(B-V)"]
+    return photometry
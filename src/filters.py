@@ -0,0 +1,239 @@
+"""
+Filter-curve bank and vectorized synthetic photometry.
+
+The transmission curves under data/ (RATIR, McDonald, REM, Magellan and CAHA; assorted
+units and delimiters) are resampled once onto a common logarithmic wavelength grid and
+kept as a single (filters × grid) matrix, saved as a compressed .npz file. Band-averaged
+flux densities of any batch of model spectra sampled on the same grid are then one matrix
+product with a precomputed weight matrix, which gives band fluxes, pivot/effective
+wavelengths and colour corrections for the whole catalog at once instead of assuming a
+single λ_eff per filter.
+"""
+
+import os, glob
+import numpy as np
+import pandas as pd
+from scipy import interpolate
+
+# directory -> (wavelength unit [Ang], transmission unit) of the curves in it
+curve_units = {"RATIR": (10., 1.), "McDonald": (1., 100.), "REM": (10., 100.), "Magellan": (10., 100.), "CAHA": (10., 100.)}
+
+# (bank name, observatory pattern, instrument pattern, filter names) used by `match_filters`
+photometry_rules = [("RATIR/r", "", "RATIR", ["r", "r'"]), ("RATIR/i", "", "RATIR", ["i", "i'"]),
+                    ("RATIR/Z", "", "RATIR", ["Z", "z"]), ("RATIR/Y", "", "RATIR", ["Y"]),
+                    ("RATIR/J", "", "RATIR", ["J"]), ("RATIR/H", "", "RATIR", ["H"]),
+                    ("REM/H", "", "REM", ["H"]), ("REM/r'", "", "REM", ["r", "r'"]),
+                    ("Magellan/IMACS_r", "Magellan", "IMACS", ["r", "r'"]),
+                    ("McDonald/u", "McDonald", "", ["u", "u'"]), ("McDonald/g", "McDonald", "", ["g", "g'"]),
+                    ("McDonald/r", "McDonald", "", ["r", "r'"]), ("McDonald/i", "McDonald", "", ["i", "i'"]),
+                    ("McDonald/z", "McDonald", "", ["z", "z'"]),
+                    ("CAHA/625_130 - r", "CAHA|Calar Alto", "", ["r", "r'"]), ("CAHA/633_123 - R", "CAHA|Calar Alto", "", ["R"])]
+
+default_bank = "./data/filter_bank.npz"
+
+def read_filter_curve(path, wavelength_unit=1., transmission_unit=1.):
+    """Reads one transmission curve (comma, tab or whitespace separated, with or without a
+    header) and returns a DataFrame with columns Wavelength [Ang] and Transmission [0-1],
+    sorted by wavelength."""
+
+    with open(path, newline="") as f:
+        text = f.read().replace("\r\n", "\n").replace("\r", "\n")
+    rows = [line.replace(",", " ").split() for line in text.split("\n")]
+    values = pd.DataFrame([row[:2] for row in rows if len(row) >= 2]).apply(pd.to_numeric, errors="coerce").dropna()
+    curve = pd.DataFrame({"Wavelength": values[0].to_numpy()*wavelength_unit,
+                          "Transmission": np.clip(values[1].to_numpy()/transmission_unit, 0, None)})
+    return curve.sort_values("Wavelength", kind="stable").drop_duplicates("Wavelength").reset_index(drop=True)
+
+def filter_curves(data_dir="./data"):
+    """All transmission curves under `data_dir`, as a dict of bank name ("RATIR/r", ...) -> DataFrame."""
+
+    curves = {}
+    for directory, (wavelength_unit, transmission_unit) in curve_units.items():
+        for path in sorted(glob.glob(os.path.join(data_dir, directory, "*"))):
+            if path.endswith((".jpg", ".png", ".pdf")):
+                continue
+            name = directory + "/" + os.path.splitext(os.path.basename(path))[0]
+            curves[name] = read_filter_curve(path, wavelength_unit, transmission_unit)
+    return curves
+
+class FilterBank:
+    """
+    Transmission curves resampled on a common logarithmic wavelength grid.
+
+    Parameters
+    ----------
+    names : array_like
+        filter names, one per row of `transmission`
+    wavelength : array_like
+        common grid [Ang], logarithmically spaced
+    transmission : array_like
+        (filters × grid) transmission matrix, 0 outside each filter's measured range
+    """
+
+    def __init__(self, names, wavelength, transmission):
+        self.names = np.asarray(names, dtype=str)
+        self.wavelength = np.asarray(wavelength, dtype=float)
+        self.transmission = np.asarray(transmission, dtype=np.float32)
+        self.index = {name: i for i, name in enumerate(self.names.tolist())}
+        # trapezoid weights for ∫ ... dλ/λ, uniform in ln λ on a logarithmic grid
+        dlnl = np.gradient(np.log(self.wavelength))
+        dlnl[[0, -1]] /= 2
+        self._dlnl = dlnl
+        counts = self.transmission*dlnl # photon-counting: ∫ F_ν T dλ/λ / ∫ T dλ/λ
+        self.weights = (counts/counts.sum(axis=1, keepdims=True)).T.astype(float) # (grid × filters)
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def frequency(self):
+        """The grid as frequencies [Hz]."""
+        return 299792458/(self.wavelength/1e10)
+
+    @classmethod
+    def from_curves(cls, curves, lambda_min=1000., lambda_max=25000., n_grid=4000):
+        """Resamples a dict of name -> curve DataFrame (see `read_filter_curve`) onto a
+        logarithmic grid of `n_grid` points between `lambda_min` and `lambda_max` [Ang]."""
+
+        wavelength = np.geomspace(lambda_min, lambda_max, n_grid)
+        transmission = np.vstack([np.interp(wavelength, curve["Wavelength"], curve["Transmission"], left=0, right=0)
+                                  for curve in curves.values()])
+        return cls(list(curves), wavelength, transmission)
+
+    def save(self, path=default_bank):
+        """Writes the bank as a compressed .npz file."""
+
+        np.savez_compressed(path, names=self.names, wavelength=self.wavelength, transmission=self.transmission)
+
+    @classmethod
+    def load(cls, path=default_bank, data_dir="./data", rebuild=False):
+        """Loads a bank written by `save`, building it from the curves under `data_dir` (and
+        saving it to `path`) first if it does not exist yet or `rebuild` is set."""
+
+        if rebuild or not os.path.exists(path):
+            bank = cls.from_curves(filter_curves(data_dir))
+            bank.save(path)
+            return bank
+        with np.load(path) as stored:
+            return cls(stored["names"], stored["wavelength"], stored["transmission"])
+
+    def band_fluxes(self, spectra):
+        """Band-averaged flux densities of a batch of F_ν spectra sampled on the grid
+        ((spectra × grid) array, any units), as a (spectra × filters) array."""
+
+        return np.asarray(spectra, dtype=float) @ self.weights
+
+    def pivot_wavelengths(self):
+        """Pivot wavelengths [Ang], λ_p² = ∫ T λ dλ / ∫ T dλ/λ, of all filters."""
+
+        T = self.transmission.astype(float)
+        return np.sqrt((T*self.wavelength**2) @ self._dlnl / (T @ self._dlnl))
+
+    def effective_wavelengths(self, spectra_lambda):
+        """Effective wavelengths [Ang], ∫ λ T S dλ / ∫ T S dλ, of all filters for one F_λ
+        spectrum S (or a (spectra × grid) batch) sampled on the grid, e.g. Vega for the
+        convention used by `fluxtools.effective_wavelength`."""
+
+        S = np.atleast_2d(np.asarray(spectra_lambda, dtype=float))*self.wavelength*self._dlnl # S dλ
+        T = self.transmission.astype(float).T
+        result = ((S*self.wavelength) @ T) / (S @ T)
+        return result[0] if np.ndim(spectra_lambda) == 1 else result
+
+    def color_corrections(self, beta, reference=None):
+        """
+        Ratio of the band-averaged to the monochromatic flux density of a power law
+        F_ν ∝ ν^-β, for every β and every filter.
+
+        Parameters
+        ----------
+        beta : array_like
+            spectral indices
+        reference : array_like or None
+            wavelength [Ang] per filter at which the monochromatic flux density is taken
+            (default: pivot wavelengths)
+
+        Returns
+        -------
+        corrections : numpy array
+            (len(beta) × filters) array; multiply a flux density at `reference` by this
+            to get the band-averaged value
+        """
+
+        beta = np.atleast_1d(np.asarray(beta, dtype=float))
+        reference = self.pivot_wavelengths() if reference is None else np.asarray(reference, dtype=float)
+        scale = np.sqrt(self.wavelength[0]*self.wavelength[-1]) # keeps the powers in range
+        spectra = (self.wavelength/scale)**beta[:,None] # F_ν ∝ ν^-β ∝ λ^β
+        return self.band_fluxes(spectra) / (reference/scale)**beta[:,None]
+
+def galactic_extinction_curve(wavelength, Rb_table="./data/Rb.csv"):
+    """R_b = A_b/E(B-V) on a wavelength grid [Ang], interpolated from Table 6 of Schlafly &
+    Finkbeiner (2011) as in pipeline.ipynb."""
+
+    RbTable = pd.read_csv(Rb_table).drop([37,55,61,73], axis=0) # smoothing
+    Rb = interpolate.interp1d(RbTable["lambda_eff"], RbTable["R_b"], fill_value="extrapolate")
+    return Rb(wavelength)
+
+def power_law_spectra(wavelength, F_ref, beta, nu_ref, E_BV=0., extinction_curve=None):
+    """
+    Batch of power-law afterglow spectra F_ν = F_ref (ν/ν_ref)^-β, reddened by
+    A_λ = R(λ) E(B-V), sampled on a wavelength grid.
+
+    Parameters
+    ----------
+    wavelength : array_like
+        grid [Ang], e.g. FilterBank.wavelength
+    F_ref, beta, nu_ref, E_BV : array_like
+        flux density at frequency `nu_ref` [Hz], spectral index and colour excess per
+        spectrum (broadcast against each other)
+    extinction_curve : array_like or None
+        R(λ) on the grid (default: `galactic_extinction_curve`)
+
+    Returns
+    -------
+    spectra : numpy array
+        (spectra × grid) array of flux densities, in the units of `F_ref`
+    """
+
+    wavelength = np.asarray(wavelength, dtype=float)
+    F_ref, beta, nu_ref, E_BV = (np.atleast_1d(np.asarray(arr, dtype=float))[:,None]
+                                 for arr in np.broadcast_arrays(F_ref, beta, nu_ref, E_BV))
+    if extinction_curve is None:
+        extinction_curve = galactic_extinction_curve(wavelength)
+    nu = 299792458/(wavelength/1e10)
+    return F_ref*(nu/nu_ref)**(-beta) * 10**(-0.4*extinction_curve*E_BV)
+
+def match_filters(photometry, bank):
+    """Index into `bank` of the transmission curve for every row of a photometry table
+    (columns Observatory, Instrument, Filter, as in all_optical.csv), or -1 where no curve
+    is available."""
+
+    observatory, instrument, filt = (photometry[col].astype("string").fillna("") for col in ("Observatory", "Instrument", "Filter"))
+    codes = np.full(len(photometry), -1)
+    for name, obs_pattern, inst_pattern, names in photometry_rules:
+        if name not in bank.index:
+            continue
+        hit = filt.isin(names).to_numpy() & (codes < 0)
+        if obs_pattern:
+            hit &= observatory.str.contains(obs_pattern).to_numpy()
+        if inst_pattern:
+            hit &= instrument.str.contains(inst_pattern).to_numpy()
+        codes[hit] = bank.index[name]
+    return codes
+
+def photometry_color_corrections(photometry, beta, bank=None):
+    """Colour correction (see `FilterBank.color_corrections`, relative to the tabulated
+    λ_eff) for every row of a photometry table given a spectral index per row. Rows
+    without a transmission curve get 1."""
+
+    bank = bank or FilterBank.load()
+    codes = match_filters(photometry, bank)
+    beta = np.broadcast_to(np.asarray(beta, dtype=float), (len(photometry),))
+    lam = photometry["λ_eff"].to_numpy(dtype=float)
+    corrections = np.ones(len(photometry))
+    rows = np.flatnonzero(codes >= 0)
+    if len(rows):
+        scale = np.sqrt(bank.wavelength[0]*bank.wavelength[-1])
+        spectra = (bank.wavelength/scale)**beta[rows,None]
+        band = np.einsum("ij,ji->i", spectra, bank.weights[:,codes[rows]]) # each row through its own filter
+        corrections[rows] = band / (lam[rows]/scale)**beta[rows]
+    return corrections
@@ -1,12 +1,18 @@
+import os
 import numpy as np
 import matplotlib.pyplot as plt
 import pandas as pd
 from scipy import interpolate, integrate
+try:
+    from .utilities import mirrored, split_uncertainties
+except ImportError: # ratir.py/mcdonald.py import this file as a top-level module, outside the package, for effective_wavelength only
+    def mirrored(url):
+        return url
 
 def effective_wavelength(filter_response, show_plot=False): # pass a dataframe with columns Wavelength (in Ang), Transmission (in %)
     filter_response.sort_values(by="Wavelength",inplace=True)
 
-    vega_spec = pd.read_table("http://svo2.cab.inta-csic.es/svo/theory/fps3/morefiles/vega.dat",
+    vega_spec = pd.read_table(mirrored("http://svo2.cab.inta-csic.es/svo/theory/fps3/morefiles/vega.dat"),
                               delimiter=" ",header=None,names=["Wavelength","Flux"])
     vega_func = interpolate.interp1d(vega_spec["Wavelength"],vega_spec["Flux"],
                                      bounds_error=False,fill_value=0)
@@ -36,6 +42,41 @@ def effective_wavelength(filter_response, show_plot=False): # pass a dataframe w
 
     return lambda_eff
 
+keV_to_Hz = 241797944177033445 # Hz per keV
+xrt_band = (0.3, 10) # keV
+log_mean_energy = 10**np.mean(np.log10(xrt_band)) # keV, halfway between the XRT band edges in log space
+
+def xray_spectral_flux(flux, fluxpos, fluxneg, beta, beta_pos, beta_neg):
+    """Vectorized conversion of integrated XRT band fluxes [erg/s/cm^2] to flux densities [Jy]
+    at the log-mean energy of the band (`log_mean_energy`), assuming a power-law spectrum
+    F_ν ∝ ν^-β. Uncertainties on the flux and on β (1-sigma) are propagated linearly, as in
+    the pipeline. Returns arrays (value, pos_err, neg_err)."""
+
+    flux, fluxpos, fluxneg = (np.asarray(arr, dtype=float) for arr in (flux, fluxpos, fluxneg))
+    B, beta_pos, beta_neg = (np.asarray(arr, dtype=float) for arr in (beta, beta_pos, beta_neg))
+    E_lo, E_hi = xrt_band
+    with np.errstate(divide="ignore", invalid="ignore"):
+        integral = np.where(B == 1, np.log(E_hi) - np.log(E_lo), (E_hi**(1-B) - E_lo**(1-B))/(1-B))
+        dfdF = log_mean_energy**(-B)/integral
+        dfdB = -np.log(log_mean_energy)*log_mean_energy**(-B)*flux/integral
+        pos_err = np.sqrt(dfdF**2*fluxpos**2 + dfdB**2*beta_pos**2)
+        neg_err = np.sqrt(dfdF**2*np.abs(fluxneg)**2 + dfdB**2*beta_neg**2)
+    to_Jy = 1e23/keV_to_Hz # erg/s/cm^2/keV -> Jy
+    return flux*dfdF*to_Jy, pos_err*to_Jy, neg_err*to_Jy
+
+def add_spectral_flux(xrt_data, catalog):
+    """Adds SpecFlux/SpecFluxpos/SpecFluxneg [Jy] columns to a copy of the XRT light-curve table,
+    using each burst's Beta_X from the catalog (90% errors scaled to 1-sigma). Bursts not in the
+    catalog get NaN."""
+
+    beta = catalog.drop_duplicates("GRB").set_index("GRB")[["Beta_X","Beta_X_pos","Beta_X_neg"]]
+    beta = beta.reindex(xrt_data["GRB"].to_numpy())
+    xrt_data = xrt_data.copy()
+    xrt_data["SpecFlux"], xrt_data["SpecFluxpos"], xrt_data["SpecFluxneg"] = xray_spectral_flux(
+        xrt_data["Flux"], xrt_data["Fluxpos"], xrt_data["Fluxneg"],
+        beta["Beta_X"], beta["Beta_X_pos"]/1.645, beta["Beta_X_neg"]/1.645) # 90% conf to 1-sigma
+    return xrt_data
+
 def lightcurve(grb, band="optical", xlimits=False, ylimits=False, **kwargs):
     """Intended for use in an environment where DataFrames called `xrt_data` and `all_optical`
     already exist and contain afterglow optical/X-ray flux data over time, respectively. This
@@ -108,4 +149,65 @@ def simulate_spectrum(idx):
     plt.yscale("log")
     plt.legend()
     #plt.gca().set_yticklabels([])
-    plt.show()
\ No newline at end of file
+    plt.show()
+
+def _nominal(column):
+    """Plain float array of the nominal values of a column that may hold `a_u` objects."""
+
+    if pd.api.types.is_numeric_dtype(column):
+        return column.to_numpy(dtype=float)
+    return split_uncertainties(column)["value"].to_numpy()
+
+def broadband_seds(results, where=None, n_freqs=200, band=xrt_band):
+    """Vectorized counterpart of `simulate_spectrum` for many matched pairs at once. For every
+    row of `results` (optionally only those selected by the boolean mask `where`), evaluates
+    the optical-to-X-ray segment F_o (ν/ν_o)^-β_ox between ν_o and ν_x, and the X-ray segment
+    F_x (ν/ν_x)^-β_x across the XRT band, on a shared logarithmic frequency grid.
+
+    Returns (freqs, ox_seds, x_seds): the grid [Hz] and two (pairs × freqs) arrays of flux
+    density [Jy], NaN outside each segment's frequency range."""
+
+    if where is not None:
+        results = results.loc[where]
+    nu_o, F_o, B_ox = (_nominal(results[col])[:,None] for col in ["nu_o","F_o","B_ox"])
+    nu_x, F_x, B_x = (_nominal(results[col])[:,None] for col in ["nu_x","F_x","B_x"])
+    nu_lo, nu_hi = np.array(band)*keV_to_Hz
+    freqs = np.logspace(np.log10(np.nanmin(nu_o)), np.log10(nu_hi), n_freqs)
+
+    with np.errstate(invalid="ignore"):
+        ox_seds = np.where((freqs >= nu_o) & (freqs <= nu_x), F_o*(freqs/nu_o)**(-B_ox), np.nan)
+        x_seds = np.where((freqs >= nu_lo) & (freqs <= nu_hi), F_x*(freqs/nu_x)**(-B_x), np.nan)
+    return freqs, ox_seds, x_seds
+
+def plot_seds(freqs, ox_seds, x_seds, titles=None, ncols=6, nrows=6, panel_size=2., outfile=None):
+    """Draws SEDs from `broadband_seds` as pages of small-multiple panels, optionally titled with
+    `titles` (one per SED row, e.g. the GRB IDs of the selected pairs). If `outfile` is given
+    (e.g. "seds.png"), page i is saved as "seds_i.png" and the figure is closed; otherwise the
+    figures are returned."""
+
+    per_page = ncols*nrows
+    figures = []
+    for page, first in enumerate(range(0, len(ox_seds), per_page)):
+        fig, axes = plt.subplots(nrows, ncols, figsize=(ncols*panel_size, nrows*panel_size),
+                                 sharex=True, squeeze=False)
+        for k, ax in enumerate(axes.flat):
+            i = first + k
+            if i >= len(ox_seds):
+                ax.set_axis_off()
+                continue
+            ax.plot(freqs, ox_seds[i], "C0")
+            ax.plot(freqs, x_seds[i], "C1")
+            ax.set(xscale="log", yscale="log")
+            ax.tick_params(labelsize=6)
+            if titles is not None:
+                ax.set_title(str(titles[i]), fontsize=7)
+        fig.supxlabel(r"$\nu$ [Hz]")
+        fig.supylabel(r"$F_\nu$ [Jy]")
+        fig.tight_layout()
+        if outfile is None:
+            figures.append(fig)
+        else:
+            root, ext = os.path.splitext(outfile)
+            fig.savefig(f"{root}_{page}{ext}")
+            plt.close(fig)
+    return figures
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+
+id_pattern = r"^(?P<yy>\d{2})(?P<mm>\d{2})(?P<dd>\d{2})(?P<Suffix>[A-Z]?)$"
+prefix_pattern = r"^(?:ID-|GRB[\s_-]*)"
+suffix_codes = {"": 0} | {chr(65+i): i+1 for i in range(26)} # no suffix -> 0, A -> 1, B -> 2, ...
+
+def normalize_ids(ids):
+    """Vectorized cleanup of a column of GRB names: strips whitespace and the "ID-"/"GRB"
+    prefixes used by the various input tables, and upper-cases the letter suffix, so that
+    e.g. "ID-050509B", "GRB 050509b" and "050509B" all become "050509B"."""
+
+    ids = pd.Series(ids, dtype="string").str.strip().str.upper()
+    return ids.str.replace(prefix_pattern, "", regex=True)
+
+def parse_ids(ids, century_pivot=67):
+    """Splits a column of GRB names into integer date components. Returns a DataFrame
+    (aligned with the input) with columns GRB (normalized name), Base (name without the
+    letter suffix), Year (4-digit), Month, Day, Date (YYYYMMDD) and Suffix (0 for no
+    suffix, 1 for A, 2 for B, ...). Two-digit years below `century_pivot` are placed in
+    the 2000s; the first GRB was detected in 1967. Unparseable names get <NA>."""
+
+    names = normalize_ids(ids)
+    parts = names.str.extract(id_pattern)
+    yy = pd.to_numeric(parts["yy"]).astype("Int64")
+    parsed = pd.DataFrame({"GRB": names,
+                           "Base": parts["yy"]+parts["mm"]+parts["dd"],
+                           "Year": 1900 + yy.where(yy >= century_pivot, yy + 100),
+                           "Month": pd.to_numeric(parts["mm"]).astype("Int64"),
+                           "Day": pd.to_numeric(parts["dd"]).astype("Int64")}, index=names.index)
+    parsed["Date"] = parsed["Year"]*10000 + parsed["Month"]*100 + parsed["Day"]
+    parsed["Suffix"] = parts["Suffix"].map(suffix_codes).astype("Int64")
+    return parsed
+
+def grb_years(ids, century_pivot=67):
+    return parse_ids(ids, century_pivot)["Year"]
+
+def sort_chronologically(dataframe, colname="GRB", ascending=True):
+    """Returns a copy of `dataframe` sorted by burst date and then by letter suffix, which
+    (unlike a plain string sort of the names) stays correct across the 1999/2000 boundary."""
+
+    parsed = parse_ids(dataframe[colname])
+    order = np.lexsort((parsed["Suffix"].fillna(-1).to_numpy(), parsed["Date"].fillna(-1).to_numpy()))
+    if not ascending:
+        order = order[::-1]
+    return dataframe.iloc[order].copy()
+
+class GRBIndex:
+    """Hash index over a column of GRB names, supporting exact and suffix-tolerant lookups.
+
+    A tolerant lookup falls back to matching on the burst date alone when the names differ
+    only by a missing suffix (e.g. "050724" vs. "050724A"), provided that the date is not
+    ambiguous, i.e. only one burst on that date is present in the index. Names with two
+    different suffixes (e.g. "081226A" vs. "081226B") never match.
+    """
+
+    def __init__(self, ids):
+        parsed = parse_ids(ids).reset_index(drop=True)
+        self.ids = parsed["GRB"].to_numpy(dtype=object)
+        self.positions = pd.Series(np.arange(len(parsed))).groupby(self.ids).indices # name -> row positions
+        unique = parsed.drop_duplicates("GRB").dropna(subset=["Base"])
+        counts = unique["Base"].value_counts()
+        unambiguous = unique[unique["Base"].isin(counts.index[counts == 1])]
+        self.by_base = pd.Series(unambiguous["GRB"].to_numpy(), index=unambiguous["Base"].to_numpy())
+        self.base_suffix = pd.Series(unambiguous["Suffix"].to_numpy(), index=unambiguous["Base"].to_numpy())
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, grb):
+        return pd.notna(self.resolve([grb])[0])
+
+    def resolve(self, ids, tolerant=True):
+        """Maps each name in `ids` to the name under which it is stored in the index (or
+        <NA> if it cannot be matched). Vectorized over the whole column."""
+
+        query = parse_ids(ids).reset_index(drop=True)
+        resolved = query["GRB"].where(query["GRB"].isin(list(self.positions)))
+        if tolerant:
+            missing = resolved.isna() & query["Base"].isin(self.by_base.index)
+            base = query.loc[missing, "Base"]
+            compatible = (query.loc[missing, "Suffix"] == 0) | (base.map(self.base_suffix) == 0)
+            resolved[missing] = base.map(self.by_base).where(compatible)
+        return resolved.to_numpy(dtype=object)
+
+    def lookup(self, grb, tolerant=True):
+        """Returns the row positions stored under `grb` (empty if there is no match)."""
+
+        resolved = self.resolve([grb], tolerant)[0]
+        if pd.isna(resolved):
+            return np.array([], dtype=int)
+        return self.positions[resolved]
+
+    def get_indexer(self, ids, tolerant=True):
+        """Row position of the first entry matching each name in `ids`, or -1 if none."""
+
+        resolved = self.resolve(ids, tolerant)
+        first = {grb: pos[0] for grb, pos in self.positions.items()}
+        return pd.Series(resolved).map(first).fillna(-1).astype(int).to_numpy()
+
+def tolerant_merge(left, right, on="GRB", how="left", **kwargs):
+    """Equivalent of `pd.merge(left, right, on=on, how=how)` in which the GRB names of `left`
+    are first resolved against those of `right` with a GRBIndex, so that names differing
+    only in prefix, case, or a missing letter suffix are still joined."""
+
+    resolved = GRBIndex(right[on]).resolve(left[on])
+    names = normalize_ids(left[on]).to_numpy(dtype=object)
+    left = left.assign(**{on: np.where(pd.isna(resolved), names, resolved)})
+    right = right.assign(**{on: normalize_ids(right[on]).to_numpy()})
+    return pd.merge(left, right, on=on, how=how, **kwargs)
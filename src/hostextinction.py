@@ -0,0 +1,151 @@
+"""
+Grid-search estimate of the host-galaxy extinction needed to explain optical darkness.
+
+For every matched pair, the optical flux density expected from the X-rays is F_x (ν_o/ν_x)^-β_o
+with β_o = β_x - 0.5 (a cooling break between the bands, i.e. the faintest optical flux the
+fireball model allows, and so the least extinction). The observed F_o is compared with that
+prediction dimmed by a host A_V, evaluated at the rest-frame wavelength of the optical
+band, for a grid of A_V values and several extinction laws at once. The χ² surface is
+built by broadcasting over (pairs × laws × A_V grid) in chunks sized to a memory budget.
+Upper limits only contribute where the model is on the wrong side of them.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+from .montecarlo import _uncertain
+
+# Pei (1992), Table 4: (a_i, λ_i [μm], b_i, n_i) for the BKG, FUV, 2175 Å, 9.7 μm, 18 μm and FIR terms
+pei_parameters = {"MW": [(165., 0.047, 90., 2.), (14., 0.08, 4., 6.5), (0.045, 0.22, -1.95, 2.),
+                         (0.002, 9.7, -1.95, 2.), (0.002, 18., -1.8, 2.), (0.012, 25., 0., 2.)],
+                  "LMC": [(175., 0.046, 90., 2.), (19., 0.08, 5.5, 4.5), (0.023, 0.22, -1.95, 2.),
+                          (0.005, 9.7, -1.95, 2.), (0.006, 18., -1.8, 2.), (0.02, 25., 0., 2.)],
+                  "SMC": [(185., 0.042, 90., 2.), (27., 0.08, 5.5, 4.), (0.005, 0.22, -1.95, 2.),
+                          (0.01, 9.7, -1.95, 2.), (0.012, 18., -1.8, 2.), (0.03, 25., 0., 2.)]}
+
+def pei_extinction(wavelength, law="SMC"):
+    """A_λ/A_V for the Pei (1992) Milky Way, LMC or SMC extinction curve at rest-frame
+    wavelengths [Ang]."""
+
+    def xi(lam_um):
+        return sum(a/((lam_um/lam_i)**n + (lam_i/lam_um)**n + b) for a, lam_i, b, n in pei_parameters[law])
+
+    return xi(np.asarray(wavelength, dtype=float)/1e4) / xi(0.55)
+
+def _chi2_chunk(arrays, k, A_V):
+    """χ² over the A_V grid for one chunk of pairs: (pairs × laws × grid) array."""
+
+    deficit, sigma_model_low, sigma_model_high, upper_o, upper_x = (arr[:,None,None] for arr in arrays)
+    residual = 0.4*A_V[None,None,:]*k[:,:,None] - deficit # log10(F_o,obs/F_o,model) as a function of A_V
+    sigma = np.where(residual > 0, sigma_model_low, sigma_model_high)
+    chi2 = (residual/sigma)**2
+    chi2 = np.where(upper_o & (residual > 0), 0., chi2) # observed flux is an upper limit: only a too-bright model counts
+    chi2 = np.where(upper_x & (residual < 0), 0., chi2) # predicted flux is an upper limit: only a too-faint model counts
+    return chi2
+
+def _fit_chunk(arrays, k, A_V, delta_chi2):
+    chi2 = _chi2_chunk(arrays, k, A_V)
+    best = np.argmin(chi2, axis=2) # first minimum, i.e. the smallest A_V if the minimum is flat
+    chi2_min = np.take_along_axis(chi2, best[...,None], axis=2)[...,0]
+    inside = chi2 <= chi2_min[...,None] + delta_chi2
+    grid = np.arange(len(A_V))
+    lo = np.min(np.where(inside, grid, len(A_V)), axis=2)
+    hi = np.max(np.where(inside, grid, -1), axis=2)
+    return A_V[best], A_V[lo], np.where(hi == len(A_V)-1, np.inf, A_V[hi]), chi2_min
+
+def host_extinction(results, where=None, laws=("MW", "LMC", "SMC"), A_V=np.linspace(0, 10, 1001), beta_offset=0.5,
+                    redshift=None, default_z=0.5, delta_chi2=1., memory_budget=128*2**20, processes=1):
+    """
+    Minimum host A_V needed to bring the X-ray-predicted optical flux down to the observed one.
+
+    Parameters
+    ----------
+    results : pandas DataFrame
+        matched pairs (e.g. from `pairing.classify_darkness`) with columns F_o, F_x, B_x
+        (floats with _pos/_neg error columns, a_u objects or their string form), nu_o and nu_x.
+        The B_x errors are taken to be 90% confidence, as in the catalog, and scaled to 1-sigma.
+    where : array_like of bool, string or None
+        rows to evaluate: a mask, the name of a boolean column (e.g. "vdH_dark"), or None for
+        the rows flagged by Jak_dark or vdH_dark (all rows if neither column exists)
+    laws : tuple of strings
+        extinction laws to evaluate (keys of `pei_parameters`)
+    A_V : array_like
+        grid of host A_V values [mag]
+    beta_offset : float
+        β_o = β_x - beta_offset for the intrinsic optical spectrum (0.5: cooling break between
+        the bands; 0: no break, which requires more extinction)
+    redshift : array_like, string or None
+        redshift per pair, or the name of a column holding it; missing values use `default_z`
+    default_z : float
+        redshift assumed where none is known
+    delta_chi2 : float
+        Δχ² defining the reported A_V range (1 for 1-sigma)
+    memory_budget : int
+        approximate number of bytes of χ² arrays held at once per process
+    processes : int
+        number of worker processes to spread the chunks over
+
+    Returns
+    -------
+    estimates : pandas DataFrame
+        indexed like the evaluated rows of `results`, with columns A_V_<law>, A_V_<law>_pos,
+        A_V_<law>_neg and chi2_<law> for each law, and A_V/A_V_pos/A_V_neg/law for the law
+        needing the least extinction. A_V_pos is inf if the range reaches the end of the grid
+        (e.g. for upper limits), and all values are NaN if both fluxes are limits.
+    """
+
+    if where is None:
+        flags = [col for col in ("Jak_dark", "vdH_dark") if col in results.columns]
+        where = results[flags].any(axis=1) if flags else slice(None)
+    elif isinstance(where, str):
+        where = results[where].astype(bool)
+    results = results.loc[where]
+    A_V = np.asarray(A_V, dtype=float)
+
+    (F_o, F_o_pos, F_o_neg), (F_x, F_x_pos, F_x_neg), (B_x, B_x_pos, B_x_neg) = (_uncertain(results, col) for col in ["F_o","F_x","B_x"])
+    nu_o, nu_x = (_uncertain(results, col)[0] for col in ["nu_o","nu_x"])
+    if isinstance(redshift, str):
+        redshift = results[redshift]
+    z = np.full(len(results), default_z) if redshift is None else pd.to_numeric(pd.Series(np.asarray(redshift)), errors="coerce").fillna(default_z).to_numpy()
+
+    lever = np.log10(nu_x/nu_o)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        deficit = np.log10(F_x) + (B_x - beta_offset)*lever - np.log10(F_o) # dex by which the prediction exceeds the observation
+        # 1-sigma log errors; limits are handled separately, so their infinite side is not used
+        o_up, o_down = np.log10(1 + F_o_pos/F_o), -np.log10(np.clip(1 - F_o_neg/F_o, 1e-3, None))
+        x_up, x_down = np.log10(1 + F_x_pos/F_x), -np.log10(np.clip(1 - F_x_neg/F_x, 1e-3, None))
+    upper_o, upper_x = np.isinf(F_o_neg), np.isinf(F_x_neg)
+    o_up, o_down, x_up, x_down = (np.nan_to_num(arr, nan=0., posinf=0.) for arr in (o_up, o_down, x_up, x_down))
+    b_up, b_down = B_x_pos/1.645*lever, B_x_neg/1.645*lever # 90% conf to 1-sigma
+    sigma_model_low = np.sqrt(o_down**2 + x_up**2 + b_up**2) # observation above the model
+    sigma_model_high = np.sqrt(o_up**2 + x_down**2 + b_down**2) # observation below the model
+    sigma_floor = 1e-3
+    arrays = [deficit, np.maximum(sigma_model_low, sigma_floor), np.maximum(sigma_model_high, sigma_floor), upper_o, upper_x]
+
+    lam_rest = 299792458/nu_o*1e10/(1 + z)
+    k = np.column_stack([pei_extinction(lam_rest, law) for law in laws]) # A_λ/A_V, (pairs × laws)
+
+    chunk = max(1, int(memory_budget // (8*5*len(laws)*len(A_V)))) # ~5 live (chunk × laws × grid) float arrays
+    jobs = [([arr[i:i+chunk] for arr in arrays], k[i:i+chunk], A_V, delta_chi2) for i in range(0, len(results), chunk)]
+    if processes > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            outputs = list(pool.map(_fit_chunk, *zip(*jobs)))
+    else:
+        outputs = [_fit_chunk(*job) for job in jobs]
+    best, lo, hi, chi2 = (np.concatenate([out[i] for out in outputs]) if outputs else np.empty((0, len(laws))) for i in range(4))
+
+    undetermined = (upper_o & upper_x) | ~np.isfinite(deficit)
+    estimates = pd.DataFrame(index=results.index)
+    for j, law in enumerate(laws):
+        estimates[f"A_V_{law}"] = np.where(undetermined, np.nan, best[:,j])
+        estimates[f"A_V_{law}_pos"] = np.where(undetermined, np.nan, hi[:,j] - best[:,j])
+        estimates[f"A_V_{law}_neg"] = np.where(undetermined, np.nan, best[:,j] - lo[:,j])
+        estimates[f"chi2_{law}"] = np.where(undetermined, np.nan, chi2[:,j])
+    least = np.argmin(np.where(np.isnan(best), np.inf, best), axis=1) if len(laws) else np.zeros(0, dtype=int)
+    rows = np.arange(len(results))
+    estimates["A_V"] = np.where(undetermined, np.nan, best[rows, least])
+    estimates["A_V_pos"] = np.where(undetermined, np.nan, hi[rows, least] - best[rows, least])
+    estimates["A_V_neg"] = np.where(undetermined, np.nan, best[rows, least] - lo[rows, least])
+    estimates["law"] = np.where(undetermined, None, np.asarray(laws, dtype=object)[least])
+    return estimates
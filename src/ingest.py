@@ -0,0 +1,221 @@
+"""
+Adapters that read the literature photometry tables into one canonical schema.
+
+Each table under data/ has its own conventions: magnitudes written as ">25.7" or
+"22.7 +/- 0.4" (Rastinejad et al. 2021), a `Mag error` column mixing numbers with labels
+such as "3-sigma" or "UL" and merged Excel cells (newData.xlsx), and headerless flux tables
+in μJy where a zero error marks an upper limit (Fong et al. 2015). An adapter is a function
+of the table's path returning a DataFrame with the `canonical_columns`; it is registered
+under a name with `register_adapter`, and `ingest` runs any number of them and concatenates
+the results. All parsing is done with vectorized pandas string operations on whole columns.
+The cleaned tables are cached on disk by `cache.cached_table`; an adapter's version has to
+be bumped whenever a change to it alters its output, and `ingest_version` whenever a change
+to the shared parsing functions does.
+
+Upper limits are flagged explicitly by the "Upper limit" column (with "Limit sigma" where
+the table states it), and also follow the repository's `a_u` convention: a magnitude limit
+has an infinite Magpos, a flux limit an infinite Fluxneg.
+"""
+
+import re
+import numpy as np
+import pandas as pd
+
+from .grbid import normalize_ids
+from .cache import cached_table
+
+# column -> dtype of every table returned by an adapter
+canonical_columns = {"GRB": "string", "Band": "string", "Observatory": "string", "Instrument": "string",
+                     "Filter": "string", "λ_eff": float, "Time (s)": float, "Exposure (s)": float,
+                     "Magnitude": float, "Magpos": float, "Magneg": float,
+                     "Flux": float, "Fluxpos": float, "Fluxneg": float, # [Jy]
+                     "Upper limit": bool, "Limit sigma": float, "E(B-V)": float, "Source": "string"}
+
+magnitude_pattern = r"^\s*(?P<relation>[>≥])?\s*(?P<value>[+-]?\d*\.?\d+)\s*(?:(?:\+/-|±)\s*(?P<error>\d*\.?\d+))?\s*$"
+asymmetric_pattern = r"^\s*\+\s*(?P<plus>\d*\.?\d+)\s*/\s*-\s*(?P<minus>\d*\.?\d+)\s*$"
+sigma_pattern = r"(?P<sigma>\d*\.?\d+)\s*-?\s*sigma"
+
+ingest_version = 1
+
+ingest_adapters = {}
+
+def register_adapter(name, path, version=1, depends=()):
+    """Decorator registering `reader(path)` as the adapter `name` for the table at `path`.
+    `version` is the adapter's cleaning-code version and `depends` lists any other files it
+    reads, both of which are part of its cache key."""
+
+    def register(reader):
+        ingest_adapters[name] = (reader, path, version, tuple(depends))
+        return reader
+    return register
+
+def canonical(columns, index=None):
+    """DataFrame with exactly the `canonical_columns` (in order and with their dtypes) from a
+    dict or DataFrame holding any subset of them. Missing columns are filled with NA, or
+    False for "Upper limit"."""
+
+    table = pd.DataFrame(columns, index=index)
+    table = table.reindex(columns=list(canonical_columns))
+    table["Upper limit"] = table["Upper limit"].fillna(False)
+    return table.astype(canonical_columns).reset_index(drop=True)
+
+def parse_magnitudes(strings, limit_sigma=np.nan):
+    """
+    Parses a column of magnitude strings such as ">25.7", "22.7 +/- 0.4", "24.8 +/- .1"
+    or "21.3".
+
+    Parameters
+    ----------
+    strings : array_like
+        magnitude strings (non-strings are converted first)
+    limit_sigma : float
+        significance of the limits, if the table states it once for all of them
+
+    Returns
+    -------
+    parsed : pandas DataFrame
+        aligned with the input, with columns Magnitude, Magpos, Magneg, Upper limit and
+        Limit sigma. Unparseable entries get a NaN magnitude.
+    """
+
+    parts = pd.Series(strings).astype("string").str.extract(magnitude_pattern)
+    upper = parts["relation"].notna().to_numpy()
+    error = pd.to_numeric(parts["error"]).to_numpy(dtype=float)
+    return pd.DataFrame({"Magnitude": pd.to_numeric(parts["value"]).to_numpy(dtype=float),
+                         "Magpos": np.where(upper, np.inf, error),
+                         "Magneg": np.where(upper, 0., error),
+                         "Upper limit": upper,
+                         "Limit sigma": np.where(upper, limit_sigma, np.nan)}, index=parts.index)
+
+def parse_mag_errors(errors):
+    """
+    Parses a column of magnitude errors that mixes numbers with labels, as in the `Mag error`
+    column of newData.xlsx: a finite number is a 1-sigma error, "+0.44 / -0.31" an asymmetric
+    one, and anything else ("3-sigma", "5-sigma", "UL", "inf", ...) marks the magnitude as an
+    upper limit, with the significance taken from the label where it gives one. Missing
+    errors are kept as NaN on a detection.
+
+    Returns
+    -------
+    parsed : pandas DataFrame
+        aligned with the input, with columns Magpos, Magneg, Upper limit and Limit sigma
+    """
+
+    errors = pd.Series(errors)
+    labels = errors.astype("string").str.strip()
+    numeric = pd.to_numeric(labels, errors="coerce").to_numpy(dtype=float)
+    asymmetric = labels.str.extract(asymmetric_pattern).apply(pd.to_numeric).to_numpy(dtype=float)
+    has_asymmetric = ~np.isnan(asymmetric[:,0])
+    upper = errors.notna().to_numpy() & ~np.isfinite(numeric) & ~has_asymmetric
+    sigma = pd.to_numeric(labels.str.extract(sigma_pattern, flags=re.IGNORECASE)["sigma"]).to_numpy(dtype=float)
+    return pd.DataFrame({"Magpos": np.where(upper, np.inf, np.where(has_asymmetric, asymmetric[:,0], numeric)),
+                         "Magneg": np.where(upper, 0., np.where(has_asymmetric, asymmetric[:,1], numeric)),
+                         "Upper limit": upper,
+                         "Limit sigma": np.where(upper, sigma, np.nan)}, index=errors.index)
+
+def split_telescope_instrument(strings):
+    """Splits "Telescope/Instrument" strings at the last slash, so that e.g. "Gemini-S/GMOS"
+    gives ("Gemini-S", "GMOS"), "ESO/MPG/GROND" gives ("ESO/MPG", "GROND") and "TNG" gives
+    ("TNG", <NA>). Returns a DataFrame with columns Observatory and Instrument."""
+
+    strings = pd.Series(strings).astype("string").str.strip()
+    parts = strings.str.rsplit("/", n=1, expand=True).reindex(columns=[0, 1])
+    has_instrument = parts[1].notna()
+    return pd.DataFrame({"Observatory": parts[0].where(has_instrument, strings),
+                         "Instrument": parts[1]}, index=strings.index)
+
+def _flux_limits(flux, error):
+    """Flux, Fluxpos, Fluxneg and Upper limit columns [Jy] from fluxes and errors in μJy,
+    where a zero error marks an upper limit (the convention of Fong et al. 2015)."""
+
+    flux, error = (pd.to_numeric(pd.Series(arr)).to_numpy(dtype=float)/1e6 for arr in (flux, error))
+    upper = error == 0
+    return {"Flux": flux, "Fluxpos": error, "Fluxneg": np.where(upper, np.inf, error), "Upper limit": upper}
+
+def clean_new_data(path):
+    """newData.xlsx in its own columns, with merged Excel cells forward-filled and rows
+    without a numeric magnitude dropped, as in pipeline.ipynb."""
+
+    table = pd.read_excel(path)
+    merged = ["GRB", "TriggerNumber", "Observatory", "Instrument", "Source", "E(B-V)"]
+    table[merged] = table[merged].ffill() # merged cells are only filled in their first row
+    table["Magnitude"] = pd.to_numeric(table["Magnitude"], errors="coerce")
+    return table.dropna(subset=["Magnitude"])
+
+@register_adapter("newData", "./data/newData.xlsx")
+def read_new_data(path):
+    """Photometry compiled for this work from GCNs and other publications (see `clean_new_data`)."""
+
+    table = clean_new_data(path)
+    errors = parse_mag_errors(table["Mag error"])
+    return canonical({"GRB": normalize_ids(table["GRB"].astype(str)), "Band": "optical",
+                      "Observatory": table["Observatory"], "Instrument": table["Instrument"],
+                      "Filter": table["Filter"], "λ_eff": table["λ_eff"], "Time (s)": table["Time (s)"],
+                      "Magnitude": table["Magnitude"], **errors, "E(B-V)": table["E(B-V)"],
+                      "Source": table["Source"]}, index=table.index)
+
+@register_adapter("Rastinejad+2021", "./data/Rastinejad_Table1.csv")
+def read_rastinejad(path):
+    """Table 1 of Rastinejad et al. (2021), whose limits are 3-sigma."""
+
+    table = pd.read_csv(path)
+    magnitudes = parse_magnitudes(table["Magnitude"], limit_sigma=3.)
+    return canonical({"GRB": normalize_ids(table["GRB"]), "Band": "optical",
+                      **split_telescope_instrument(table["Telescope/Instrument"]),
+                      "Filter": table["Filter"], "λ_eff": table["Wavelength"], "Time (s)": table["dt [sec]"],
+                      **magnitudes, "E(B-V)": table["E(B-V)"], "Source": "Rastinejad+2021"})
+
+@register_adapter("Fong+2015 optical", "./data/OpticalData.csv", depends=["./data/FilterInfo.csv"])
+def read_fong_optical(path, filter_info="./data/FilterInfo.csv"):
+    """Optical fluxes [μJy] from Fong et al. (2015), at times in hours, with effective
+    wavelengths [nm] looked up in FilterInfo.csv by observatory, instrument and filter."""
+
+    table = pd.read_csv(path, header=None, names=["GRB","Time","Observatory","Instrument","Filter","Exposure","F_o","e_F_o"])
+    filters = pd.read_csv(filter_info, header=None, names=["Observatory","Instrument","Filter","Wavelength","Frequency"])
+    table = table.merge(filters.drop_duplicates(["Observatory","Instrument","Filter"]), how="left",
+                        on=["Observatory","Instrument","Filter"])
+    return canonical({"GRB": normalize_ids(table["GRB"]), "Band": "optical",
+                      "Observatory": table["Observatory"], "Instrument": table["Instrument"], "Filter": table["Filter"],
+                      "λ_eff": table["Wavelength"]*10, "Time (s)": table["Time"]*60*60, "Exposure (s)": table["Exposure"],
+                      **_flux_limits(table["F_o"], table["e_F_o"]), "Source": "Fong+2015"})
+
+@register_adapter("Fong+2015 X-ray", "./data/XRayData.csv")
+def read_fong_xray(path):
+    """X-ray flux densities [μJy] from Fong et al. (2015), at times in seconds."""
+
+    table = pd.read_csv(path, header=None, names=["GRB","Time","Exposure","F_x","e_F_x"])
+    return canonical({"GRB": normalize_ids(table["GRB"]), "Band": "X-ray", "Observatory": "Swift", "Instrument": "XRT",
+                      "Time (s)": table["Time"], "Exposure (s)": table["Exposure"],
+                      **_flux_limits(table["F_x"], table["e_F_x"]), "Source": "Fong+2015"})
+
+def ingest(names=None, paths=None, cache=True):
+    """
+    Reads literature photometry tables into one DataFrame with the `canonical_columns`.
+
+    Parameters
+    ----------
+    names : list of strings or None
+        adapters to run (keys of `ingest_adapters`); all of them if None
+    paths : dict or None
+        adapter name -> path, overriding the default location of a table
+    cache : bool
+        serve unchanged tables from the ingestion cache (see `cache.cached_table`)
+
+    Returns
+    -------
+    photometry : pandas DataFrame
+        all rows, sorted like all_optical.csv (by GRB, latest burst first, then by time)
+    """
+
+    names = list(ingest_adapters) if names is None else names
+    paths = paths or {}
+    tables = []
+    for name in names:
+        reader, path, version, depends = ingest_adapters[name]
+        path = paths.get(name, path)
+        if cache:
+            tables.append(cached_table([path, *depends], reader, version=f"{ingest_version}.{version}"))
+        else:
+            tables.append(reader(path))
+    photometry = pd.concat(tables, ignore_index=True) if tables else canonical({})
+    return photometry.sort_values(["GRB", "Time (s)"], ascending=[False, True], kind="stable", ignore_index=True)
@@ -0,0 +1,233 @@
+"""
+Local fitting of broken power laws to Swift-XRT light curves.
+
+Every light curve is fitted in log-log space with continuous power laws having 0 to 3
+breaks, and the number of breaks is chosen with an information criterion. Upper limits
+only contribute when the model exceeds them. The results use the same piecewise structure
+as the XRT live catalogue (see xrt.get_lightcurveModel), so temporal indices and Δβ_ox can
+be computed for the whole catalog without any network access:
+
+    from src.store import xrt_store
+    from src.lcfit import fit_lightcurves, temporal_index
+    summary, segments = fit_lightcurves(xrt_store(), processes=4)
+    alpha, alpha_err = temporal_index(segments, results["GRB"], results["t_o"])
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from scipy.optimize import least_squares
+
+from .store import BurstStore, xrt_store
+
+def broken_power_law(logt, norm, alphas, logbreaks):
+    """log10 flux of a continuous power law F ∝ t^-α_i with slope changes at `logbreaks`,
+    normalized so that log10 F = `norm` at t = 1 s on the first segment."""
+
+    logF = norm - alphas[0]*logt
+    for i, logb in enumerate(logbreaks):
+        logF -= (alphas[i+1]-alphas[i])*np.maximum(logt-logb, 0)
+    return logF
+
+def _unpack(params, n_breaks, lo):
+    norm, alphas = params[0], params[1:n_breaks+2]
+    logbreaks = lo + np.cumsum(params[n_breaks+2:]) # positive increments keep the breaks ordered
+    return norm, alphas, logbreaks
+
+def _residuals(params, n_breaks, lo, logt, logF, up, down, limit, limit_sigma):
+    model = broken_power_law(logt, *_unpack(params, n_breaks, lo))
+    diff = model - logF
+    res = diff/np.where(diff > 0, up, down)
+    return np.where(limit, np.maximum(diff, 0)/limit_sigma, res)
+
+def fit_broken_power_law(time, flux, fluxpos, fluxneg, n_breaks, min_segment=0.2):
+    """
+    Fits one light curve with a continuous power law having `n_breaks` breaks.
+
+    Parameters
+    ----------
+    time, flux, fluxpos, fluxneg : array_like
+        light curve; an infinite `fluxneg` marks an upper limit
+    n_breaks : int
+        number of breaks
+    min_segment : float
+        minimum separation (in dex) between consecutive breaks and between the breaks and
+        the first detection
+
+    Returns
+    -------
+    fit : dict or None
+        norm, alphas, alpha_errs, logbreaks, logbreak_errs, chi2, n (number of points
+        used) and degenerate (whether any parameter ended up on its bound, i.e. a slope at
+        ±10 or breaks `min_segment` apart, or is not constrained by the data; parameters on
+        a bound get NaN errors), or None if there are too few detections for the number of
+        parameters
+    """
+
+    time, flux, fluxpos, fluxneg = (np.asarray(arr, dtype=float) for arr in (time, flux, fluxpos, fluxneg))
+    ok = (time > 0) & (flux > 0)
+    time, flux, fluxpos, fluxneg = time[ok], flux[ok], fluxpos[ok], fluxneg[ok]
+    limit = np.isinf(fluxneg)
+    n_params = 2*n_breaks + 2
+    if (~limit).sum() < n_params + 1:
+        return None
+
+    logt, logF = np.log10(time), np.log10(flux)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        up = np.log10(1 + fluxpos/flux)
+        down = np.where(fluxneg < flux, -np.log10(1 - fluxneg/flux), up)
+    up = np.where(limit, 1., np.maximum(up, 1e-3))
+    down = np.where(limit, 1., np.maximum(down, 1e-3))
+    limit_sigma = np.median(up[~limit])
+
+    det_t = logt[~limit]
+    lo, hi = det_t.min(), det_t.max()
+    if n_breaks and (hi - lo) < (n_breaks+1)*min_segment:
+        return None
+    # start from breaks at evenly spaced quantiles of the detection times and a single slope
+    slope = -np.polyfit(det_t, logF[~limit], 1)[0]
+    starts = np.quantile(det_t, np.linspace(0, 1, n_breaks+2)[1:-1])
+    x0 = np.r_[logF[~limit].mean() + slope*det_t.mean(), np.full(n_breaks+1, slope),
+               np.diff(np.r_[lo, starts])]
+    lower = np.r_[-np.inf, np.full(n_breaks+1, -10.), np.full(n_breaks, min_segment)]
+    upper = np.r_[np.inf, np.full(n_breaks+1, 10.), np.full(n_breaks, max(hi-lo, min_segment*1.01))]
+    x0 = np.clip(x0, lower + 1e-6, upper - 1e-6)
+    solution = least_squares(_residuals, x0, bounds=(lower, upper), x_scale="jac",
+                             args=(n_breaks, lo, logt, logF, up, down, limit, limit_sigma))
+
+    norm, alphas, logbreaks = _unpack(solution.x, n_breaks, lo)
+    chi2 = float(np.sum(solution.fun**2))
+    at_bound = (solution.active_mask != 0) | np.isclose(solution.x, lower, rtol=0, atol=1e-4) \
+               | np.isclose(solution.x, upper, rtol=0, atol=1e-4)
+    # covariance of the free parameters (those pinned at a bound get NaN errors), with the
+    # pseudo-inverse where they are not all constrained, e.g. a break between two points
+    free = np.flatnonzero(~at_bound)
+    J = solution.jac[:, free]
+    singular_values = np.linalg.svd(J, compute_uv=False)
+    constrained = len(free) == 0 or singular_values.min() > 1e-6*singular_values.max() # well-posed fits have condition numbers < 1e4
+    free_cov = np.linalg.inv(J.T @ J) if constrained else np.linalg.pinv(J.T @ J)
+    cov = np.full((n_params, n_params), np.nan)
+    cov[np.ix_(free, free)] = free_cov*max(chi2/max(len(logt)-len(free), 1), 1) # inflate for a poor fit
+    errors = np.sqrt(np.abs(np.diag(cov)))
+    # break errors follow from the cumulative sum of the increments
+    increments = cov[n_breaks+2:, n_breaks+2:]
+    cumulative = np.tril(np.ones((n_breaks, n_breaks)))
+    logbreak_errs = np.sqrt(np.abs(np.diag(cumulative @ increments @ cumulative.T)))
+    return {"norm": norm, "alphas": alphas, "alpha_errs": errors[1:n_breaks+2], "logbreaks": logbreaks,
+            "logbreak_errs": logbreak_errs, "chi2": chi2, "n": len(logt),
+            "degenerate": bool(at_bound.any() or not constrained)}
+
+def information_criterion(chi2, n_params, n, criterion="BIC"):
+    if criterion == "BIC":
+        return chi2 + n_params*np.log(n)
+    if criterion == "AICc":
+        return chi2 + 2*n_params + 2*n_params*(n_params+1)/max(n-n_params-1, 1)
+    raise ValueError(f"unknown criterion {criterion!r}; use 'BIC' or 'AICc'")
+
+def fit_lightcurve(time, flux, fluxpos, fluxneg, max_breaks=3, criterion="BIC", min_segment=0.2):
+    """Fits 0 to `max_breaks` breaks and returns the preferred fit (see `fit_broken_power_law`)
+    with its number of breaks and information criterion added, or None. Degenerate fits are
+    only chosen if every fit is degenerate, so that the next-simpler model wins otherwise."""
+
+    best = None
+    for n_breaks in range(max_breaks+1):
+        fit = fit_broken_power_law(time, flux, fluxpos, fluxneg, n_breaks, min_segment)
+        if fit is None:
+            break
+        fit["n_breaks"] = n_breaks
+        fit["IC"] = information_criterion(fit["chi2"], 2*n_breaks+2, fit["n"], criterion)
+        if best is None or (fit["degenerate"], fit["IC"]) < (best["degenerate"], best["IC"]):
+            best = fit
+    return best
+
+def _fit_chunk(args):
+    bursts, flux_col, max_breaks, criterion, min_segment = args
+    return [(grb, fit_lightcurve(lc["Time"], lc[flux_col], lc[flux_col+"pos"], lc[flux_col+"neg"],
+                                 max_breaks, criterion, min_segment)) for grb, lc in bursts]
+
+def fit_lightcurves(xrt=None, grbs=None, flux_col="Flux", max_breaks=3, criterion="BIC",
+                    min_segment=0.2, processes=None):
+    """
+    Fits broken power laws to many XRT light curves in parallel.
+
+    Parameters
+    ----------
+    xrt : BurstStore, pandas DataFrame or string, optional
+        light curves (Time, <flux_col>, <flux_col>pos, <flux_col>neg), as a store, a table,
+        or the path to the CSV product; defaults to ./products/Swift_XRT_lightcurves.csv
+    grbs : list of strings, optional
+        bursts to fit; defaults to every burst in `xrt`
+    flux_col : string
+        flux column to fit (the temporal indices do not depend on the flux units)
+    max_breaks : int
+        maximum number of breaks
+    criterion : string
+        "BIC" or "AICc", used to select the number of breaks
+    min_segment : float
+        minimum length (in dex of time) of the inner segments
+    processes : int, optional
+        number of worker processes; defaults to the number of CPU cores
+
+    Returns
+    -------
+    summary : pandas DataFrame
+        one row per fitted burst: N_breaks, chi2, N_points and IC
+    segments : pandas DataFrame
+        one row per segment: GRB, T_start [s] (0 for the first segment), T_start_pos,
+        T_start_neg, alpha, alpha_err and norm (log10 flux at 1 s). This is the table format
+        used by pairing.model_segments/evaluate_models; `to_models` converts it to the
+        (breaktimes, alphas) form returned by xrt.get_lightcurveModel.
+    """
+
+    if xrt is None:
+        xrt = xrt_store()
+    elif not isinstance(xrt, BurstStore):
+        xrt = xrt_store(xrt)
+    grbs = xrt.grbs.tolist() if grbs is None else [grb for grb in grbs if grb in xrt]
+    processes = min(processes or os.cpu_count() or 1, max(len(grbs), 1))
+    bursts = [(grb, {col: np.array(values) for col, values in xrt[grb].items()}) for grb in grbs]
+    chunks = [(bursts[i::processes*4], flux_col, max_breaks, criterion, min_segment)
+              for i in range(min(processes*4, len(bursts)))]
+    if processes > 1:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            fits = [fit for chunk in pool.map(_fit_chunk, chunks) for fit in chunk]
+    else:
+        fits = [fit for chunk in map(_fit_chunk, chunks) for fit in chunk]
+
+    summary, segments = [], []
+    order = {grb: i for i, grb in enumerate(grbs)}
+    for grb, fit in sorted(fits, key=lambda item: order[item[0]]):
+        if fit is None:
+            continue
+        summary.append((grb, fit["n_breaks"], fit["chi2"], fit["n"], fit["IC"]))
+        breaks, errs = 10**fit["logbreaks"], fit["logbreak_errs"]
+        starts = np.r_[0., breaks]
+        with np.errstate(over="ignore"):
+            pos, neg = np.r_[np.nan, breaks*(10**errs-1)], np.r_[np.nan, breaks*(1-10**-errs)]
+        for i in range(fit["n_breaks"]+1):
+            segments.append((grb, starts[i], pos[i], neg[i], fit["alphas"][i], fit["alpha_errs"][i], fit["norm"]))
+    summary = pd.DataFrame(summary, columns=["GRB", "N_breaks", "chi2", "N_points", "IC"])
+    segments = pd.DataFrame(segments, columns=["GRB", "T_start", "T_start_pos", "T_start_neg", "alpha", "alpha_err", "norm"])
+    return summary, segments
+
+def to_models(segments):
+    """Converts a segment table to GRB -> (breaktimes, alphas) with float entries, where
+    segment i holds for t < breaktimes[i] and the last break time is inf."""
+
+    return {grb: (seg["T_start"].tolist()[1:] + [np.inf], seg["alpha"].tolist())
+            for grb, seg in segments.groupby("GRB", sort=False)}
+
+def temporal_index(segments, grbs, times):
+    """
+    Vectorized offline counterpart of xrt.get_temporalIndex: the temporal index (and its
+    error) of the segment covering each (burst, time) query. NaN for bursts without a fit.
+    """
+
+    segments = segments.sort_values(["GRB", "T_start"], kind="stable").reset_index(drop=True)
+    query = pd.DataFrame({"GRB": np.asarray(grbs, dtype=object), "T_start": np.asarray(times, dtype=float),
+                          "_order": np.arange(len(grbs))}).sort_values("T_start", kind="stable")
+    matched = pd.merge_asof(query, segments[["GRB", "T_start", "alpha", "alpha_err"]].sort_values("T_start", kind="stable"),
+                            on="T_start", by="GRB", direction="backward")
+    matched = matched.sort_values("_order")
+    return matched["alpha"].to_numpy(), matched["alpha_err"].to_numpy()
@@ -0,0 +1,235 @@
+"""
+Title: "Automating the Calculation of Beta_OX" (indexed engine)
+
+Drop-in replacement for the Trial class of calc_beta_ox.py. It reads the same four
+input files (X-ray flux data, Beta_X data, optical flux data, telescope filter data),
+applies the same pairing rules and writes the same comprehensive and terse .csv files,
+but keeps every table as columns instead of lists of GRB objects: IDs and
+telescope/instrument/filter combinations are resolved through dict indexes, the
+optical-X-ray pairs are found with one join on GRB ID, and Beta_OX and its bounds are
+computed for all pairs at once.
+"""
+
+#import necessary modules
+import os
+import numpy as np, pandas as pd
+from easygui import fileopenbox, diropenbox
+
+#set wavelength for X-Rays in nm
+#self is based off of an energy of 1 keV and the fact that lambda = hf
+FREQUENCY_XRAY = 2.415e+17
+
+def _divide(numerator, denominator):
+    """Elementwise division that yields NaN (instead of inf) where the denominator is 0,
+    with a mask of those entries; the legacy code caught ZeroDivisionError there."""
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return numerator / np.where(denominator == 0, np.nan, denominator), denominator == 0
+
+def _read_table(filename):
+    """Reads an input table; the tab-separated .txt versions of the inputs are accepted too."""
+
+    return pd.read_csv(str(filename), header=None, sep="\t" if str(filename).endswith(".txt") else ",")
+
+class IndexedTrial:
+    """Trial-compatible pairing engine; see the module docstring."""
+
+    def __init__(self, dt_percent_dif=0.):
+        #allowed temporal separation, in percent of the optical dt
+        self.dt_percent_dif = dt_percent_dif
+        self.xray = None #X-Ray data, one row per measurement
+        self.beta_x = {} #GRB ID -> (Beta_X, upper sigma, lower sigma)
+        self.pairs = None #one row per optical/X-Ray pair
+        self.total_possible_pairings = 0
+
+    # Loads X-Ray data file
+    def load_XRayData(self, filename):
+        xrayData = _read_table(filename)
+        self.xray = pd.DataFrame(xrayData.values.tolist(), columns=["GRB ID","dt_X","Exp_X","F_x","sigma_X"], dtype=object)
+
+        print("\n****************** X-Ray GRB Data ******************")
+        print(self.xray)
+        print("\nNumber of GRBs loaded:",len(self.xray))
+        return len(self.xray)
+
+    # Loads Beta_X data file into a hash index keyed on GRB ID. As in the legacy
+    # code, a later row for the same ID overrides an earlier one
+    def load_BetaX(self, filename):
+        BetaXData = _read_table(filename)
+        print("*** Beta_X Data ***")
+        print(BetaXData)
+
+        rows = BetaXData.values.tolist()
+        self.beta_x = {row[0]: tuple(row[1:4]) for row in rows}
+        xray_ids = set(self.xray["GRB ID"])
+        for row in rows:
+            if row[0] not in xray_ids:
+                print("\nUnable to match GRB ID",row[0],"with Beta_X",row[1])
+        counts = self.xray["GRB ID"].value_counts()
+        Beta_X_pairs = sum(int(counts.get(row[0], 0)) for row in rows)
+
+        print("Number of loaded GRBs from Beta_X file:",len(rows))
+        print("Number of successful pairings with X-Ray Data:",Beta_X_pairs)
+        print("Pairing Rate:",(Beta_X_pairs / len(self.xray))*100,"%")
+        return len(rows)
+
+    # Loads optical data file and pairs every optical measurement with all X-Ray
+    # measurements of the same GRB (with Beta_X data) within the allowed temporal
+    # separation, in optical-file order and then X-Ray-file order
+    def load_OpticalData(self, filename):
+        opticalData = _read_table(filename)
+        print("*** Optical GRB Data ***")
+        print(opticalData.rename(columns={0:"GRB ID",1:"dt_O [s]",2:"Telescope",3:"Instrument",4:"Filter",5:"Exposure Time [s]",6:"F_o [uJy]",7:"sigma_O [uJy]"}))
+
+        optical = pd.DataFrame(opticalData.values.tolist(), dtype=object,
+                               columns=["GRB ID","dt_O [hr]","Telescope","Instrument","Filter","Exp_O","F_o","sigma_O"])
+        optical["dt_O"] = [3600 * h for h in optical["dt_O [hr]"]] #transform optical dt from hours into seconds
+        optical["_o"] = np.arange(len(optical))
+
+        xray = self.xray[self.xray["GRB ID"].isin(list(self.beta_x))].assign(_x=lambda df: np.arange(len(df)))
+        pairs = optical.merge(xray, on="GRB ID", how="inner").sort_values(["_o","_x"], kind="stable")
+        dtX, dtO = pairs["dt_X"].to_numpy(dtype=float), pairs["dt_O"].to_numpy(dtype=float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            close = (100 * np.abs(dtX - dtO) / dtO) < self.dt_percent_dif
+        self.pairs = pairs[close].reset_index(drop=True)
+        betas = [self.beta_x[grb] for grb in self.pairs["GRB ID"]]
+        for i, col in enumerate(["Beta_X","Beta_X_upper_sigma","Beta_X_lower_sigma"]):
+            self.pairs[col] = pd.Series([b[i] for b in betas], dtype=object)
+
+        for _, row in optical[~optical["_o"].isin(self.pairs["_o"])].iterrows():
+            print("Unable to match GRB",row["GRB ID"],"with optical dt",row["dt_O [hr]"],"[hr] =",row["dt_O"],"[s].")
+
+        self.total_possible_pairings = self.find_total_possible_pairings(optical)
+        print("Number of loaded GRBs from optical data file:",len(optical))
+        print("Number of possible pairs:",int(self.total_possible_pairings))
+        print("Number of successful pairs:",len(self.pairs))
+        print("Pairing Rate:",(len(self.pairs) / self.total_possible_pairings)*100,"%")
+        return len(optical)
+
+    # Assigns each pair the frequency of the first row of the wavelength file with
+    # the same telescope, instrument and filter
+    def load_WavelengthData(self, filename):
+        observationData = _read_table(filename)
+        print("*** Wavelength Data ***")
+        print(observationData.rename(columns=dict(zip(range(5),["Telescope","Instrument","Filter","Wavelength","Frequency"]))))
+
+        frequencies = {}
+        for tel, inst, filt, wavelength, frequency in observationData.values.tolist():
+            if all(isinstance(key, str) for key in (tel, inst, filt)): #NaN never compares equal
+                frequencies.setdefault((tel, inst, filt), frequency)
+        keys = zip(self.pairs["Telescope"], self.pairs["Instrument"], self.pairs["Filter"])
+        self.pairs["frequency_Opt"] = pd.Series([frequencies.get(key, -1) for key in keys], dtype=object)
+
+        unpaired = self.pairs[self.pairs["frequency_Opt"].map(lambda f: f == -1).astype(bool)]
+        print()
+        for _, row in unpaired.iterrows():
+            print("\nGRB",row["GRB ID"],"with optical dt",row["dt_O"],", telescope",row["Telescope"],", instrument",row["Instrument"],", with filter",row["Filter"],"unpaired.")
+        success_counter = len(self.pairs) - len(unpaired)
+        print("Number of Wavelength Sets Loaded:",len(observationData))
+        print("Number of Unsuccessfully Paired:",len(unpaired))
+        print("Number of Successfully Paired:",success_counter)
+        print("Overall Success Rate:",100 * (success_counter / self.total_possible_pairings),"%")
+        return len(observationData)
+
+    # Calculates Beta_OX and the upper and lower bounds on its uncertainty for every
+    # fully paired entry at once. Entries where the legacy code hit a division by
+    # zero get 0, as before
+    def calculate_Beta_OX(self):
+        paired = self.pairs[self.pairs["frequency_Opt"].map(lambda f: f != -1).astype(bool)].copy()
+        F_x, F_o, sigma_x, sigma_o, frequency_O = (paired[col].to_numpy(dtype=float)
+                                                   for col in ["F_x","F_o","sigma_X","sigma_O","frequency_Opt"])
+        lever, no_frequency = _divide(FREQUENCY_XRAY, frequency_O)
+        lever = np.log(lever)
+
+        ratio, failed = _divide(F_x, F_o)
+        failed |= no_frequency
+        with np.errstate(divide="ignore", invalid="ignore"):
+            Beta_OX = np.log(ratio) / lever
+        paired["Beta_OX"] = [0 if f else b for f, b in zip(failed, Beta_OX.tolist())]
+
+        x_rel, x_failed = _divide(sigma_x, F_x)
+        o_rel, o_failed = _divide(sigma_o, F_o)
+        upper, up_failed = _divide(1 + x_rel, 1 - o_rel)
+        lower, low_failed = _divide(1 - x_rel, 1 + o_rel)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sigma_OX_upper = np.log(upper) / lever
+            sigma_OX_lower = np.abs(np.log(lower) / lever)
+        up_failed |= x_failed | o_failed | no_frequency
+        low_failed |= x_failed | o_failed | no_frequency
+        paired["sigma_OX_upper"] = [0 if f else s for f, s in zip(up_failed, sigma_OX_upper.tolist())]
+        paired["sigma_OX_lower"] = [0 if f else s for f, s in zip(low_failed, sigma_OX_lower.tolist())]
+        self.results = paired
+
+        print("*** Beta_OX Data ***")
+        print(paired[["GRB ID","F_x","sigma_X","F_o","sigma_O","frequency_Opt","Beta_OX","sigma_OX_upper","sigma_OX_lower"]])
+        print("Number of Successful Beta_OX Calculations:",len(paired))
+        print("Overall Success Rate:",100 * (len(paired) / self.total_possible_pairings),"%")
+
+    #writes paired GRB data to file
+    def write_paired_data(self, savepath=None):
+        percent_dif = str(int(self.dt_percent_dif))
+        if savepath is None:
+            print("\nChoose a location to save the paired data tables.")
+            savepath = diropenbox()
+        filename_comprehensive = os.path.join(savepath, "Comprehensive_Paired_Data_Table_" + percent_dif + "%.csv")
+        filename_terse = os.path.join(savepath, "GRB_Pairings-dt_" + percent_dif + "%.csv")
+        print("Saving to",filename_comprehensive)
+
+        r = self.results
+        dt_XRay = [dt / 3600 for dt in r["dt_X"]]
+        dt_Opt = [dt / 3600 for dt in r["dt_O"]]
+        #the optical exposure time was never stored by the legacy code, so it is written as 0
+        comprehensive = zip(r["GRB ID"], dt_XRay, r["Exp_X"], r["F_x"], r["sigma_X"], r["Beta_X"], r["Beta_X_upper_sigma"],
+                            r["Beta_X_lower_sigma"], dt_Opt, r["Telescope"], r["Instrument"], r["Filter"], [0]*len(r),
+                            r["F_o"], r["sigma_O"], [FREQUENCY_XRAY]*len(r), r["frequency_Opt"],
+                            r["Beta_OX"], r["sigma_OX_upper"], r["sigma_OX_lower"])
+        filecontent = ["GRB ID,X-Ray dt [hr],X-Ray Exposure Time [s],F_x [uJy],Sigma_x [uJy],Beta_X,Beta_X Upper Sigma,Lower Sigma,Optical dt [hr],Telescope,Instrument,Filter,Optical Exposure Time [s],F_o [uJy],Sigma_o [uJy],Wavelength_X [nm],Frequency_X [Hz],Wavelength_o [nm],Frequency_o [Hz],Beta_OX, Bound of Sigma_OX,Lower Bound of Sigma_OX,\n"]
+        filecontent += [",".join(map(str, row)) for row in comprehensive]
+        with open(filename_comprehensive, "w+") as myFile_comprehensive:
+            myFile_comprehensive.write("\n".join(filecontent))
+
+        separation = [np.abs(o - x) / 3600 for o, x in zip(r["dt_O"], r["dt_X"])]
+        terse = zip(r["GRB ID"], dt_XRay, dt_Opt, separation, r["Beta_X"], r["Beta_X_upper_sigma"], r["Beta_X_lower_sigma"],
+                    r["Beta_OX"], r["sigma_OX_upper"], r["sigma_OX_lower"])
+        filecontent = ["GRB ID,X-Ray dt [hr],Optical dt [hr],|dt_x - dt_o| [hr],Beta_X,Beta_X Upper Sigma, Lower Sigma,Beta_OX, Bound of Sigma_OX,Lower Bound of Sigma_OX"]
+        filecontent += [",".join(map(str, row)) for row in terse]
+        with open(filename_terse, "w+") as myFile_terse:
+            myFile_terse.write("\n".join(filecontent))
+        return filename_comprehensive, filename_terse
+
+    # Total number of possible optical/X-Ray pairings: for every GRB ID with Beta_X data
+    # present in both files, the product of its number of X-Ray and optical entries
+    def find_total_possible_pairings(self, optical):
+        xray_counts = self.xray.loc[self.xray["GRB ID"].isin(list(self.beta_x)), "GRB ID"].value_counts()
+        optical_counts = optical["GRB ID"].value_counts()
+        shared = xray_counts.index.intersection(optical_counts.index)
+        print("Number of Unique X-Ray GRBs with Beta_X Data:",len(xray_counts))
+        print("Number of Unique Optical GRBs:",len(optical_counts))
+        print("Number of GRBs in both:",len(shared))
+        return int((xray_counts[shared] * optical_counts[shared]).sum())
+
+'''*********************************************************************
+                      BEGIN MAIN FUNC CALLS
+*********************************************************************'''
+
+if __name__ == '__main__':
+    print("\nPlease select the X-Ray data file.")
+    XRayDataFile_name = fileopenbox()
+    print("\nPlease select the Beta_X data file.")
+    Beta_X_File_name = fileopenbox()
+    DT_PERCENT_DIF = float(input("Please enter the desired temporal percent difference (%): "))
+    print("Please select the optical data file.")
+    OpticalData_name = fileopenbox()
+    print("\nPlease select the wavelength data file.")
+    WavelengthData_name = fileopenbox()
+
+    t1 = IndexedTrial(DT_PERCENT_DIF)
+    t1.load_XRayData(XRayDataFile_name)
+    t1.load_BetaX(Beta_X_File_name)
+    t1.load_OpticalData(OpticalData_name)
+    t1.load_WavelengthData(WavelengthData_name)
+    print("\nNow calculating Beta_OX...")
+    t1.calculate_Beta_OX()
+    t1.write_paired_data()
+
+    print("\nComplete. Terminating...")
@@ -0,0 +1,181 @@
+"""
+Title: "Automating the Graphing of Beta_OX vs. Beta_X" (headless batch mode)
+
+Non-interactive counterpart of Graphing_Beta_OX.py. Every pairing file is loaded into
+columns instead of a list of GRB objects, the Jakobsson and van der Horst darkness
+criteria and the darkest-pairing-per-GRB selections are evaluated for all rows at once,
+and every graph the menu offers (all data, Jak/VdH dark, Jak/VdH darkest, optionally the
+same for individual GRB IDs) is rendered with and without the Delta Beta_OX term for
+every file in one run, along with the same dark/darkest .csv tables. For example, from
+the top-level directory of the repository:
+
+    python "src/legacy/Graphing Code/graph_beta_ox_batch.py" "products/Generated Files (C++)"/*.csv --outdir "products/Generated Files (Python)"
+"""
+
+#import necessary modules
+import os, re, glob, argparse
+import numpy as np, pandas as pd, matplotlib
+matplotlib.use("Agg")
+from matplotlib import pyplot as plt
+
+# for error bar caps
+matplotlib.rcParams.update({'errorbar.capsize': 2})
+
+#column names, matching the attributes of the GRB class of Graphing_Beta_OX.py
+columns = ["ID", "dtX", "dtO", "del_t", "BetaX", "upper_sigmaX", "lower_sigmaX", "BetaOX", "upper_sigmaOX", "lower_sigmaOX"]
+#column headers of the dark/darkest .csv files
+output_headers = ["ID Number", "dt_x [hr]", "dt_o [hr]", "dt [hr]", "Beta_x", "sigma_x_Up", "sigma_x_Low", "Beta_ox", "sigma_ox_Up", "sigma_ox_Low"]
+
+# Loads a terse Beta_OX pairing file into a DataFrame with one column per GRB attribute
+def load_pairings(filename):
+    pairs = pd.read_csv(filename)
+    pairs.columns = columns
+    pairs[columns[1:]] = pairs[columns[1:]].astype(float)
+    return pairs
+
+# Temporal separation (in percent) encoded in a pairing file's name, e.g. GRB_Pairings-dt_10_.csv
+def file_dt(filename):
+    return int(re.search(r"dt_(\d+)", os.path.basename(filename)).group(1))
+
+# Delta Beta_OX due to temporal separation, or 0 if it is not included
+def delta_beta_ox(dt_percent, include=True):
+    return np.log10(1 + dt_percent/100) if include else 0.
+
+# Pairings that are optically dark according to the Jakobsson method, with their
+# darkness distance in a D_Jakobsson column
+def dark_Jakobsson(pairs, delta_beta_ox_t=0.):
+    D = 0.5 + pairs["BetaOX"] - pairs["upper_sigmaOX"] - delta_beta_ox_t
+    dark = (D > 0) & (pairs["BetaOX"] != 0)
+    return pairs[dark].assign(D_Jakobsson=D[dark])
+
+# Pairings that are optically dark according to the van der Horst method, with their
+# darkness distance in a D_vanderHorst column
+def dark_vanderHorst(pairs, delta_beta_ox_t=0.):
+    BetaX, BetaOX = pairs["BetaX"], pairs["BetaOX"]
+    D = (-BetaX - pairs["lower_sigmaX"] + BetaOX - (pairs["upper_sigmaOX"] + delta_beta_ox_t) - 0.5)/np.sqrt(2)
+    dark = ((-BetaX - 0.5 > -BetaOX + (pairs["upper_sigmaOX"] + delta_beta_ox_t))
+            & (-BetaOX + 0.5 < -BetaX - pairs["lower_sigmaX"]) & (BetaOX != 0))
+    return pairs[dark].assign(D_vanderHorst=D[dark])
+
+# Darkest pairing per GRB ID. As in determine_darkest_*, IDs are grouped in runs of
+# consecutive rows and ties go to the earliest row of the run
+def darkest(dark_pairs, distance_col):
+    if len(dark_pairs) == 0:
+        return dark_pairs
+    ID = dark_pairs["ID"].to_numpy()
+    run = np.cumsum(np.r_[True, ID[1:] != ID[:-1]])
+    D = dark_pairs[distance_col].to_numpy()
+    order = np.lexsort((np.arange(len(D)), -D, run)) # by run, then largest D, then position
+    first = order[np.r_[True, run[order][1:] != run[order][:-1]]]
+    return dark_pairs.iloc[np.sort(first)]
+
+# Writes dark/darkest pairings in the format of the interactive tool
+def write_pairings(pairs, path):
+    pairs[columns].to_csv(path, header=output_headers, index=False)
+    return path
+
+# Draws a graph of Beta_OX vs. Beta_X on a (reused) figure and saves it as a PNG
+def graph(pairs, parsed_filename, graph_title, delta_beta_ox_t, y_or_n_delB, image_name, outdir, fig=None, dpi=600):
+    fig = fig or plt.figure(figsize=(10,9))
+    fig.clear()
+    ax = fig.add_axes((0.1, 0.4, 0.8, 0.5))
+    plotted = pairs[pairs["BetaOX"] != 0]
+
+    if y_or_n_delB == 'Y':
+        title = ax.set_title(graph_title + parsed_filename + " + Δβₒₓ")
+    else:
+        title = ax.set_title(graph_title + parsed_filename)
+    title.set_position([0.5, 1.05])
+    ax.set_xlabel('βₓ')
+    ax.set_ylabel('βₒₓ')
+
+    ax.errorbar(-plotted["BetaX"], -plotted["BetaOX"],
+                xerr=np.array([plotted["lower_sigmaX"], plotted["upper_sigmaX"]]),
+                yerr=np.array([plotted["lower_sigmaOX"] + delta_beta_ox_t, plotted["upper_sigmaOX"] + delta_beta_ox_t]),
+                fmt='go', ecolor='k', capthick=2)
+
+    x = np.linspace(0,10,1000)
+    ax.plot(x, x, linestyle=':', color='red', label="βₒₓ = βₓ")
+    ax.plot(x, x-0.5, linestyle='-.', color='brown', label="βₒₓ = βₓ - 0.5")
+    ax.axhline(y=0.5, linestyle='--', color='orange', label="βₒₓ = 0.5")
+    ax.set_xlim(0.2, 3)
+    ax.set_ylim(-0.4, 1.4)
+    ax.legend()
+
+    if y_or_n_delB == 'Y':
+        graph_filename = image_name + parsed_filename + "_w_delBeta.png"
+    else:
+        graph_filename = image_name + parsed_filename + ".png"
+    path = os.path.join(outdir, graph_filename)
+    fig.savefig(path, dpi=dpi)
+    return path
+
+# All graph variants (and dark/darkest tables) for one pairing file and one Delta Beta setting.
+# Returns (file, variant, number of pairings, output path) rows
+def graph_file(filename, y_or_n_delB, outdir, ids=(), fig=None, dpi=600):
+    pairs = load_pairings(filename)
+    parsed_filename = os.path.splitext(os.path.basename(filename))[0]
+    delta_t_beta = file_dt(filename)
+    delta_beta_ox_t = delta_beta_ox(delta_t_beta, y_or_n_delB == 'Y')
+    suffix = "_w_delBeta" if y_or_n_delB == 'Y' else ""
+    rows = []
+
+    def emit(selection, graph_title, image_name, variant, table=True):
+        if len(selection) == 0: # the interactive tool skips empty graphs
+            rows.append([filename, variant, y_or_n_delB, 0, ""])
+            return
+        path = graph(selection, parsed_filename, graph_title, delta_beta_ox_t, y_or_n_delB, image_name, outdir, fig, dpi)
+        rows.append([filename, variant, y_or_n_delB, len(selection), path])
+        if table:
+            write_pairings(selection, os.path.join(outdir, image_name + "dt_" + str(delta_t_beta) + suffix + ".csv"))
+
+    title = "βₒₓ vs. βₓ"
+    for subset, label, user_defined_ID in [(pairs, "", "")] + [(pairs[pairs["ID"] == ID], "_" + ID, ID + " ") for ID in ids]:
+        jak = dark_Jakobsson(subset, delta_beta_ox_t)
+        vdh = dark_vanderHorst(subset, delta_beta_ox_t)
+        if label:
+            emit(subset, f"{title} ({user_defined_ID}All): ", "ALL" + label + "-", f"all{label}", table=False)
+        else:
+            emit(subset, title + ": ", "Beta_OX_Graph_ALL-", "all", table=False)
+        emit(jak, f"{title} ({user_defined_ID}Jak Dark): ", "Jak_Dark" + label + "-", f"Jakobsson dark{label}")
+        emit(vdh, f"{title} ({user_defined_ID}VdH Dark): ", "vdH_Dark" + label + "-", f"van der Horst dark{label}")
+        emit(darkest(jak, "D_Jakobsson"), f"{title} ({user_defined_ID}Jak Darkest): ", "Jak_Darkest" + label + "-", f"Jakobsson darkest{label}")
+        emit(darkest(vdh, "D_vanderHorst"), f"{title} ({user_defined_ID}VdH Darkest): ", "vdH_Darkest" + label + "-", f"van der Horst darkest{label}")
+    return rows
+
+# Renders every graph variant for every pairing file, with and without Delta Beta_OX
+def run_batch(files, outdir, delta_beta=("N", "Y"), ids=(), dpi=600):
+    os.makedirs(outdir, exist_ok=True)
+    fig = plt.figure(figsize=(10,9))
+    rows = []
+    for filename in files:
+        for y_or_n_delB in delta_beta:
+            rows += graph_file(filename, y_or_n_delB, outdir, ids, fig, dpi)
+    plt.close(fig)
+    manifest = pd.DataFrame(rows, columns=["file", "variant", "delta Beta", "pairings", "output"])
+    manifest.to_csv(os.path.join(outdir, "manifest.csv"), index=False)
+    return manifest
+
+'''*********************************************************************
+                      BEGIN MAIN FUNC CALLS
+*********************************************************************'''
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Render every Beta_OX vs. Beta_X graph variant for a set of pairing files.")
+    parser.add_argument("files", nargs="*", help="pairing files (default: products/Generated Files (C++)/*.csv)")
+    parser.add_argument("--outdir", default="./products/Generated Files (Python)")
+    parser.add_argument("--ids", nargs="*", default=[], help="GRB IDs to also graph individually")
+    parser.add_argument("--all-ids", action="store_true", help="graph every GRB ID individually")
+    parser.add_argument("--delta-beta", choices=["Y", "N", "both"], default="both", help="include Delta Beta_OX due to temporal separation")
+    parser.add_argument("--dpi", type=int, default=600)
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob(os.path.join("products", "Generated Files (C++)", "*.csv")))
+    ids = args.ids
+    if args.all_ids:
+        ids = sorted(set().union(*(load_pairings(f)["ID"] for f in files)))
+    delta_beta = ("N", "Y") if args.delta_beta == "both" else (args.delta_beta,)
+
+    manifest = run_batch(files, args.outdir, delta_beta, ids, args.dpi)
+    print(manifest.to_string(index=False))
+    print(f"\nWrote {(manifest['output'] != '').sum()} graphs to {args.outdir}")
@@ -0,0 +1,176 @@
+"""
+Out-of-core pairing for catalogs whose light curves, photometry or pair tables do not fit in memory.
+
+`partition_by_grb` reads a CSV in chunks and appends the rows of every burst to a file of its
+own, so only one chunk is held in memory at a time. `stream_pairing` then goes through the
+partitions a few bursts at a time (up to a size budget), pairs and classifies them with the
+same functions as the in-memory pipeline (`store.xrt_store`/`optical_store`,
+`pairing.match_in_time` and `pairing.classify_darkness`) and appends the pairs to a
+`store.BurstStoreWriter`. Peak memory is therefore set by the budget or the largest single
+burst (and the chunk size), not by the catalog. The result is a BurstStore directory of
+.npy columns, which `BurstStore.load` memory-maps.
+
+    python -m src.outofcore --xrt products/Swift_XRT_lightcurves.csv --optical products/all_optical.csv \\
+        --catalog products/Swift_sGRB_catalog.csv --output pairs_store --summary pairs_summary.csv
+"""
+
+import os, re, glob, pickle, hashlib, argparse, tempfile
+import numpy as np
+import pandas as pd
+
+from .grbid import normalize_ids
+from .store import BurstStore, BurstStoreWriter, xrt_store, optical_store
+from .pairing import match_in_time, classify_darkness
+from .builder import TableBuilder
+
+def _file_name(grb):
+    """File name for a burst's partition; names that are not safe as file names get a hash suffix."""
+
+    safe = re.sub(r"[^\w.+-]", "_", grb)
+    return safe if safe == grb else f"{safe}-{hashlib.sha1(grb.encode()).hexdigest()[:8]}"
+
+def partition_by_grb(path, directory, chunksize=100_000, id_col="GRB"):
+    """
+    Splits a long-format CSV (e.g. Swift_XRT_lightcurves.csv or all_optical.csv) into one file
+    per burst under `directory`, reading `chunksize` rows at a time. Each file holds the burst's
+    rows from every chunk as consecutive pickled dicts of column arrays (see `read_partition`),
+    which keeps the dtypes of the chunks and makes an append cheap. GRB names are normalized
+    (see `grbid.normalize_ids`), so rows of the same burst written differently end up together;
+    rows without a name are dropped. Existing partitions in `directory` are replaced.
+
+    Returns
+    -------
+    files : dict
+        normalized GRB name -> path of its partition
+    """
+
+    os.makedirs(directory, exist_ok=True)
+    for stale in glob.glob(os.path.join(directory, "*.pkl")):
+        os.remove(stale)
+    files = {}
+    for chunk in pd.read_csv(path, chunksize=chunksize, dtype={id_col: str}): # keeps e.g. "050724" from becoming 50724
+        ids = normalize_ids(chunk[id_col].astype("string")).to_numpy(dtype=object)
+        named = np.flatnonzero(pd.notna(ids))
+        order = named[np.argsort(ids[named].astype(str), kind="stable")]
+        grbs, starts = np.unique(ids[order].astype(str), return_index=True)
+        columns = {col: chunk[col].to_numpy()[order] for col in chunk.columns}
+        columns[id_col] = ids[order]
+        for grb, start, stop in zip(grbs.tolist(), starts, [*starts[1:], len(order)]):
+            new = grb not in files
+            if new:
+                files[grb] = os.path.join(directory, f"{_file_name(grb)}.pkl")
+            with open(files[grb], "wb" if new else "ab") as f:
+                pickle.dump({col: values[start:stop] for col, values in columns.items()}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return files
+
+def _pieces(path):
+    pieces = []
+    with open(path, "rb") as f:
+        while True:
+            try:
+                pieces.append(pickle.load(f))
+            except EOFError:
+                return pieces
+
+def _frame(pieces):
+    return pd.DataFrame({col: np.concatenate([piece[col] for piece in pieces]) for col in pieces[0]})
+
+def read_partition(path):
+    """All rows of a partition written by `partition_by_grb`, as one DataFrame."""
+
+    return _frame(_pieces(path))
+
+def _batches(grbs, sizes, batch_bytes):
+    """Consecutive groups of `grbs` whose partitions add up to at most `batch_bytes` (a burst
+    larger than that forms a group of its own)."""
+
+    batch, total = [], 0
+    for grb in grbs:
+        if batch and total + sizes[grb] > batch_bytes:
+            yield batch
+            batch, total = [], 0
+        batch.append(grb)
+        total += sizes[grb]
+    if batch:
+        yield batch
+
+def _read_partitions(files, grbs):
+    return _frame([piece for grb in grbs for piece in _pieces(files[grb])])
+
+def stream_pairing(xrt, optical, catalog, output, max_dt=0.1, restrictive=False, workdir=None,
+                   chunksize=100_000, batch_bytes=2**25):
+    """
+    Temporal matching and darkness classification of the partitions of a few bursts at a
+    time, with the pairs written incrementally to a BurstStore directory.
+
+    Parameters
+    ----------
+    xrt : string
+        CSV of XRT light curves (columns as Swift_XRT_lightcurves.csv)
+    optical : string
+        CSV of photometry (columns as all_optical.csv)
+    catalog : pandas DataFrame or string
+        catalog (or its path) with Beta_X/Beta_X_pos/Beta_X_neg, one row per burst
+    output : string
+        directory of the pair store; its columns are those of `classify_darkness` (without
+        GRB, which is the store's index), sorted by t_o and t_x within each burst
+    max_dt : float
+        maximum fractional time separation of a pair (see `pairing.match_in_time`)
+    restrictive : bool
+        use the restrictive darkness criteria (see `pairing.classify_darkness`)
+    workdir : string or None
+        where to put the per-burst partitions while running (default: the system's temporary directory)
+    chunksize : int
+        number of CSV rows read at a time while partitioning
+    batch_bytes : int
+        size of the partitions (bytes on disk) processed together. Batching small bursts amortizes
+        the fixed cost of each pass; peak memory scales with the larger of this and the
+        largest single burst, and 0 processes one burst at a time.
+
+    Returns
+    -------
+    summary : pandas DataFrame
+        one row per burst with both X-ray and optical data: GRB, X-ray, Optical, Temporal
+        matches and Dark (pairs dark by either criterion), as in TableA1.csv
+    """
+
+    if isinstance(catalog, str):
+        catalog = pd.read_csv(catalog)
+    catalog = catalog.assign(GRB=normalize_ids(catalog["GRB"]).to_numpy(dtype=object)).drop_duplicates("GRB")
+    summary = TableBuilder({"GRB": object, "X-ray": int, "Optical": int, "Temporal matches": int, "Dark": int})
+    with tempfile.TemporaryDirectory(dir=workdir) as scratch, BurstStoreWriter(output, time_col="t_o") as writer:
+        xrt_files = partition_by_grb(xrt, os.path.join(scratch, "xrt"), chunksize)
+        optical_files = partition_by_grb(optical, os.path.join(scratch, "optical"), chunksize)
+        grbs = sorted(set(xrt_files) & set(optical_files))
+        sizes = {grb: os.path.getsize(xrt_files[grb]) + os.path.getsize(optical_files[grb]) for grb in grbs}
+        for batch in _batches(grbs, sizes, batch_bytes):
+            xrt_data, optical_data = _read_partitions(xrt_files, batch), _read_partitions(optical_files, batch)
+            entries = catalog[catalog["GRB"].isin(batch)]
+            pairs = match_in_time(xrt_store(xrt_data, entries), optical_store(optical_data), max_dt)
+            pairs = classify_darkness(pairs, entries, restrictive).sort_values(["GRB", "t_o", "t_x"], kind="stable")
+            writer.extend(BurstStore.from_dataframe(pairs, time_col="t_o")) # stable, so t_x order is kept
+            dark = (pairs["Jak_dark"] | pairs["vdH_dark"]).groupby(pairs["GRB"]).sum()
+            counts = {"X-ray": xrt_data["GRB"].value_counts(), "Optical": optical_data["GRB"].value_counts(),
+                      "Temporal matches": pairs["GRB"].value_counts(), "Dark": dark}
+            summary.extend({"GRB": batch, **{col: counts[col].reindex(batch, fill_value=0).to_numpy() for col in counts}})
+    return summary.to_dataframe()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pair and classify bursts a few partitions at a time, writing the pairs to a BurstStore directory.")
+    parser.add_argument("--xrt", default="./products/Swift_XRT_lightcurves.csv")
+    parser.add_argument("--optical", default="./products/all_optical.csv")
+    parser.add_argument("--catalog", default="./products/Swift_sGRB_catalog.csv")
+    parser.add_argument("--output", required=True, help="directory of the pair store")
+    parser.add_argument("--summary", default=None, help="CSV to write the per-burst counts to")
+    parser.add_argument("--max-dt", type=float, default=0.1)
+    parser.add_argument("--restrictive", action="store_true")
+    parser.add_argument("--workdir", default=None, help="directory for the temporary per-burst partitions")
+    parser.add_argument("--chunksize", type=int, default=100_000)
+    parser.add_argument("--batch-bytes", type=int, default=2**25, help="bytes of partitions processed together")
+    args = parser.parse_args()
+
+    summary = stream_pairing(args.xrt, args.optical, args.catalog, args.output, args.max_dt,
+                             args.restrictive, args.workdir, args.chunksize, args.batch_bytes)
+    if args.summary:
+        summary.to_csv(args.summary, index=False)
+    print(f"{int(summary['Temporal matches'].sum())} pairs of {len(summary)} bursts written to {args.output}")
@@ -0,0 +1,439 @@
+"""
+Pairing of optical/UV/IR photometry with X-ray flux densities, and the β_ox darkness criteria.
+
+Three pairing modes operate on BurstStore objects (see store.py):
+
+- `match_in_time` pairs every optical epoch with every X-ray point of the same burst
+  taken within a fractional time separation `max_dt`, like the loop in pipeline.ipynb.
+- `match_by_interpolation` instead evaluates a per-burst piecewise power-law model of
+  the X-ray light curve at every optical epoch, so that each epoch gets an X-ray flux
+  whose uncertainty grows with the distance (in log time) to the nearest X-ray detection.
+- `match_by_overlap` pairs each optical exposure with the X-ray bins (Time - Tneg to
+  Time + Tpos) it overlaps, or comes within a fractional tolerance of.
+
+All return one row per pair, with every uncertain quantity split into value/_pos/_neg
+float columns (infinite errors mark limits, as in the data products).
+"""
+
+import numpy as np
+import pandas as pd
+
+from .fluxtools import log_mean_energy, keV_to_Hz
+from .grbid import tolerant_merge
+
+_stride = 1000. # separates bursts in the combined (burst code, log10 time) sort keys
+
+nu_x = log_mean_energy * keV_to_Hz # x-ray frequency [Hz]
+
+def delta_B_ox(dt, alpha=1):
+    """Error in β_ox due to the temporal separation `dt` of the pair (Fitzpatrick Eq. 41)."""
+
+    return np.abs(alpha*np.log10(1+dt))
+
+def _codes_in(store, other):
+    """For every row of `other`, the code of its burst in `store` (-1 if absent)."""
+
+    lookup = np.array([store.index.get(grb, -1) for grb in other.grbs.tolist()], dtype=np.int64)
+    return lookup[other.group_codes()]
+
+def _keys(codes, times):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return codes*_stride + np.log10(times)
+
+def _log_errors(value, plus, minus):
+    """Upper and lower 1-sigma errors in log10 of a positive quantity."""
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        up = np.log10(1 + plus/value)
+        down = np.where(minus < value, -np.log10(1 - minus/value), np.inf)
+    return up, down
+
+def beta_ox(F_o, F_o_pos, F_o_neg, F_x, F_x_pos, F_x_neg, nu_o, nu_x=nu_x):
+    """
+    Vectorized optical-to-X-ray spectral index -log10(F_x/F_o)/log10(ν_x/ν_o), with upper and
+    lower errors propagated in quadrature in log space. An optical upper limit gives an
+    infinite lower error (β_ox is an upper limit); an X-ray upper limit an infinite upper one.
+    The width of the XRT band is not propagated into ν_x.
+
+    Returns
+    -------
+    B_ox, B_ox_pos, B_ox_neg : numpy arrays
+    """
+
+    lever = np.log10(nu_x/np.asarray(nu_o, dtype=float))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        B_ox = -np.log10(np.asarray(F_x)/np.asarray(F_o))/lever
+    o_up, o_down = _log_errors(*(np.asarray(arr, dtype=float) for arr in (F_o, F_o_pos, F_o_neg)))
+    x_up, x_down = _log_errors(*(np.asarray(arr, dtype=float) for arr in (F_x, F_x_pos, F_x_neg)))
+    return B_ox, np.hypot(o_up, x_down)/lever, np.hypot(o_down, x_up)/lever
+
+def _pairs_frame(optical, i_o, F_x, t_x):
+    """Assembles the output table for optical rows `i_o` paired with X-ray fluxes `F_x`."""
+
+    cols = optical.columns
+    t_o = cols["Time (s)"][i_o]
+    nu_o = 299792458/(cols["λ_eff"][i_o]/1e10) # optical frequency [Hz]
+    F_o = [cols[c][i_o] for c in ("Flux", "Fluxpos", "Fluxneg")]
+    B_ox = beta_ox(*F_o, *F_x, nu_o)
+    results = pd.DataFrame({"GRB": np.repeat(optical.grbs, np.diff(optical.offsets))[i_o],
+                            "t_o": t_o, "t_x": t_x, "dt%": np.abs(t_o-t_x)/t_x, "nu_o": nu_o,
+                            "F_o": F_o[0], "F_o_pos": F_o[1], "F_o_neg": F_o[2], "nu_x": nu_x,
+                            "F_x": F_x[0], "F_x_pos": F_x[1], "F_x_neg": F_x[2],
+                            "B_ox": B_ox[0], "B_ox_pos": B_ox[1], "B_ox_neg": B_ox[2]})
+    return results
+
+def match_in_time(xrt, optical, max_dt, flux_col="SpecFlux"):
+    """
+    Pairs each optical epoch with every X-ray point of the same burst such that
+    |t_o - t_x|/t_x <= max_dt. Equivalent to the nested loop of pipeline.ipynb, but the
+    candidate X-ray points of all epochs are found at once by binary search in the
+    (burst, time)-sorted X-ray store, so the cost is O((n_o + n_pairs) log n_x).
+
+    Parameters
+    ----------
+    xrt : BurstStore
+        X-ray light curves with flux densities in `flux_col` [Jy] (see store.xrt_store)
+    optical : BurstStore
+        photometry with Flux/Fluxpos/Fluxneg [Jy] and λ_eff [Ang] (see store.optical_store)
+    max_dt : float
+        maximum allowed fractional time separation
+    flux_col : string
+        X-ray flux density column; `<flux_col>pos` and `<flux_col>neg` hold its errors
+
+    Returns
+    -------
+    results : pandas DataFrame
+        one row per pair with columns GRB, t_o, t_x, dt%, nu_o, F_o, nu_x, F_x and B_ox
+        (the last three with _pos/_neg error columns). Pairs with undefined β_ox are dropped.
+    """
+
+    codes = _codes_in(xrt, optical)
+    t_o = np.asarray(optical.columns["Time (s)"], dtype=float)
+    x_keys = _keys(xrt.group_codes(), np.asarray(xrt.columns["Time"], dtype=float))
+    valid = np.flatnonzero((codes >= 0) & (t_o > 0))
+    lo = np.searchsorted(x_keys, _keys(codes[valid], t_o[valid]/(1+max_dt)) - 1e-9, side="left")
+    if max_dt < 1:
+        hi = np.searchsorted(x_keys, _keys(codes[valid], t_o[valid]/(1-max_dt)) + 1e-9, side="right")
+    else:
+        hi = xrt.offsets[codes[valid]+1]
+    counts = np.maximum(hi-lo, 0)
+    i_o = np.repeat(valid, counts)
+    i_x = np.repeat(lo - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+
+    t_x = np.asarray(xrt.columns["Time"], dtype=float)[i_x]
+    keep = np.abs(t_o[i_o]-t_x)/t_x <= max_dt # exact criterion, after the padded search
+    i_o, i_x = i_o[keep], i_x[keep]
+    F_x = [np.asarray(xrt.columns[flux_col+suffix], dtype=float)[i_x] for suffix in ("", "pos", "neg")]
+    results = _pairs_frame(optical, i_o, F_x, t_x[keep])
+    return results[results["B_ox"].notna()].reset_index(drop=True)
+
+def model_segments(models):
+    """
+    Flattens per-burst piecewise power-law models into a segment table.
+
+    Parameters
+    ----------
+    models : dict
+        GRB -> (breaktimes, alphas), as returned by xrt.get_lightcurveModel: segment i holds
+        for t < breaktimes[i], and the last break time is inf. Entries may be floats or a_u
+        objects; the larger of an a_u's two errors is kept as the α uncertainty.
+
+    Returns
+    -------
+    segments : pandas DataFrame
+        columns GRB, T_start [s] (0 for the first segment), alpha and alpha_err, sorted by
+        GRB and T_start
+    """
+
+    rows = []
+    for grb, (breaktimes, alphas) in models.items():
+        starts = [0.] + [float(getattr(t, "value", t)) for t in breaktimes[:-1]]
+        for start, alpha in zip(starts, alphas):
+            err = max(getattr(alpha, "plus", np.nan), getattr(alpha, "minus", np.nan))
+            rows.append((grb, start, float(getattr(alpha, "value", alpha)), err))
+    segments = pd.DataFrame(rows, columns=["GRB", "T_start", "alpha", "alpha_err"])
+    return segments.sort_values(["GRB", "T_start"], kind="stable").reset_index(drop=True)
+
+def livecat_models(grbs, lookuptable=None):
+    """Piecewise power-law models of `grbs` from the XRT live catalogue (one request per
+    burst); bursts without a parseable live-cat fit are left out."""
+
+    from . import xrt as xrt_module # network access on import
+    if lookuptable is None:
+        lookuptable = xrt_module.grb_list
+    models = {}
+    for grb in grbs:
+        try:
+            models[grb] = xrt_module.get_lightcurveModel(grb, lookuptable)
+        except Exception:
+            pass
+    return models
+
+def _detections(xrt, flux_col):
+    """Codes, log10 times, log10 fluxes and log10 flux errors of the X-ray detections."""
+
+    flux = np.asarray(xrt.columns[flux_col], dtype=float)
+    up, down = _log_errors(flux, np.asarray(xrt.columns[flux_col+"pos"], dtype=float),
+                           np.asarray(xrt.columns[flux_col+"neg"], dtype=float))
+    detected = (flux > 0) & np.isfinite(up) & np.isfinite(down)
+    with np.errstate(divide="ignore"):
+        return (xrt.group_codes()[detected], np.log10(np.asarray(xrt.columns["Time"], dtype=float)[detected]),
+                np.log10(flux[detected]), np.maximum((up+down)[detected]/2, 1e-3))
+
+def fit_power_laws(xrt, flux_col="SpecFlux"):
+    """Weighted least-squares single power law in log-log space for every burst with at
+    least two X-ray detections, computed for all bursts at once from per-burst sums.
+    Returns a segment table like `model_segments`."""
+
+    codes, logt, logF, sigma = _detections(xrt, flux_col)
+    n = len(xrt)
+    w = 1/sigma**2
+    S, Sx, Sy = (np.bincount(codes, weights=v, minlength=n) for v in (w, w*logt, w*logF))
+    Sxx, Sxy = (np.bincount(codes, weights=v, minlength=n) for v in (w*logt**2, w*logt*logF))
+    count = np.bincount(codes, minlength=n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        det = S*Sxx - Sx**2
+        slope, slope_err = (S*Sxy - Sx*Sy)/det, np.sqrt(S/det)
+    good = (count >= 2) & (det > 0)
+    return pd.DataFrame({"GRB": xrt.grbs[good], "T_start": 0., "alpha": -slope[good], "alpha_err": slope_err[good]})
+
+def evaluate_models(segments, xrt, grbs, times, flux_col="SpecFlux", default_alpha_err=0.2):
+    """
+    Evaluates piecewise power-law X-ray light-curve models at arbitrary (burst, time) points.
+
+    The shape of each burst's model comes from `segments` (continuous at the breaks) and its
+    normalization is the weighted mean offset of the burst's X-ray detections from that
+    shape. The log10 uncertainty of the model at a time t is
+
+        sqrt(scatter**2 + (alpha_err * d)**2)
+
+    where `scatter` is the rms (plus standard error) of the detections about the model and
+    d is the distance in dex from t to the nearest detection, so that uncertainties grow
+    with extrapolation distance.
+
+    Parameters
+    ----------
+    segments : pandas DataFrame
+        segment table from `model_segments`
+    xrt : BurstStore
+        X-ray light curves the models are normalized to
+    grbs, times : array_like
+        query points
+    flux_col : string
+        X-ray flux density column of `xrt`
+    default_alpha_err : float
+        α uncertainty used for segments without one
+
+    Returns
+    -------
+    logF, sigma, distance : numpy arrays
+        log10 model flux, its 1-sigma uncertainty and the extrapolation distance (all in
+        dex) for every query point; NaN where the burst has no model or no detections
+    """
+
+    n = len(xrt)
+    lookup = pd.Series(np.arange(n), index=xrt.grbs)
+    codes = pd.Series(np.asarray(grbs)).map(lookup).fillna(-1).to_numpy(dtype=np.int64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        logt = np.log10(np.asarray(times, dtype=float))
+    logF, sigma, distance = (np.full(len(codes), np.nan) for _ in range(3))
+
+    seg_codes = pd.Series(segments["GRB"].to_numpy()).map(lookup).fillna(-1).to_numpy(dtype=np.int64)
+    segments, seg_codes = segments[seg_codes >= 0], seg_codes[seg_codes >= 0]
+    det_codes, det_logt, det_logF, det_sigma = _detections(xrt, flux_col)
+    if len(seg_codes) == 0 or len(det_codes) == 0:
+        return logF, sigma, distance
+
+    with np.errstate(divide="ignore"):
+        b = np.log10(segments["T_start"].to_numpy(dtype=float))
+    alpha = segments["alpha"].to_numpy(dtype=float)
+    alpha_err = segments["alpha_err"].fillna(default_alpha_err).to_numpy(dtype=float)
+    first = np.r_[True, seg_codes[1:] != seg_codes[:-1]]
+    b = np.where(first, 0., b) # anchor the first segment at t = 1 s
+    # model shape at the start of each segment, accumulated within each burst
+    step = np.where(first, 0., -np.r_[0., alpha[:-1]]*(b - np.r_[0., b[:-1]]))
+    cumulative = np.cumsum(step)
+    start_shape = cumulative - cumulative[np.maximum.accumulate(np.where(first, np.arange(len(first)), 0))]
+    seg_keys = seg_codes*_stride + np.where(first, -_stride/2, b)
+
+    def shape(codes, logt):
+        i = np.maximum(np.searchsorted(seg_keys, codes*_stride + logt, side="right") - 1, 0)
+        return np.where(seg_codes[i] == codes, start_shape[i] - alpha[i]*(logt - b[i]), np.nan), i
+
+    residual = det_logF - shape(det_codes, det_logt)[0]
+    w = np.where(np.isfinite(residual), 1/det_sigma**2, 0.)
+    residual = np.nan_to_num(residual)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        S = np.bincount(det_codes, weights=w, minlength=n)
+        norm = np.bincount(det_codes, weights=w*residual, minlength=n)/S
+        scatter = np.sqrt(np.bincount(det_codes, weights=w*(residual-norm[det_codes])**2, minlength=n)/S + 1/S)
+
+    query = np.flatnonzero(codes >= 0)
+    model, i_seg = shape(codes[query], logt[query])
+    logF[query] = model + norm[codes[query]]
+
+    # distance to the nearest detection of the same burst, on either side
+    det_keys = det_codes*_stride + det_logt
+    keys = codes[query]*_stride + logt[query]
+    right = np.searchsorted(det_keys, keys)
+    nearest = np.full(len(query), np.inf)
+    for j in (right-1, right):
+        j = np.clip(j, 0, len(det_keys)-1)
+        same = det_codes[j] == codes[query]
+        nearest = np.minimum(nearest, np.where(same, np.abs(keys - det_keys[j]), np.inf))
+    distance[query] = np.where(np.isfinite(nearest), nearest, np.nan)
+    sigma[query] = np.hypot(scatter[codes[query]], alpha_err[i_seg]*distance[query])
+    return logF, sigma, distance
+
+def match_by_interpolation(xrt, optical, models=None, flux_col="SpecFlux", max_extrapolation=1., default_alpha_err=0.2):
+    """
+    Pairs every optical epoch with the X-ray flux density of its burst at the same time,
+    evaluated from a piecewise power-law model of the X-ray light curve (see
+    `evaluate_models`). Unlike `match_in_time`, no X-ray point needs to lie close to the
+    optical epoch, so a single evaluation replaces a sweep over `max_dt`.
+
+    Parameters
+    ----------
+    xrt : BurstStore
+        X-ray light curves with flux densities in `flux_col` [Jy]
+    optical : BurstStore
+        photometry with Flux/Fluxpos/Fluxneg [Jy] and λ_eff [Ang]
+    models : dict or pandas DataFrame, optional
+        per-burst models, either as GRB -> (breaktimes, alphas) (e.g. from `livecat_models`)
+        or as a `model_segments` table. Bursts without a model get a single power law
+        fitted with `fit_power_laws`.
+    flux_col : string
+        X-ray flux density column of `xrt`
+    max_extrapolation : float
+        epochs farther than this (in dex of time) from every X-ray detection are dropped
+    default_alpha_err : float
+        α uncertainty used for model segments without one
+
+    Returns
+    -------
+    results : pandas DataFrame
+        same columns as `match_in_time` (with t_x = t_o and dt% = 0), plus Extrapolation
+        (distance in dex to the nearest X-ray detection)
+    """
+
+    fitted = fit_power_laws(xrt, flux_col)
+    if models is None:
+        segments = fitted
+    else:
+        segments = models if isinstance(models, pd.DataFrame) else model_segments(models)
+        segments = pd.concat([segments, fitted[~fitted["GRB"].isin(segments["GRB"])]], ignore_index=True)
+        segments = segments.sort_values(["GRB", "T_start"], kind="stable").reset_index(drop=True)
+
+    grbs = np.repeat(optical.grbs, np.diff(optical.offsets))
+    t_o = np.asarray(optical.columns["Time (s)"], dtype=float)
+    logF, sigma, distance = evaluate_models(segments, xrt, grbs, t_o, flux_col, default_alpha_err)
+    i_o = np.flatnonzero(np.isfinite(logF) & (distance <= max_extrapolation))
+    F_x = 10**logF[i_o]
+    F_x = [F_x, F_x*(10**sigma[i_o]-1), F_x*(1-10**-sigma[i_o])]
+    results = _pairs_frame(optical, i_o, F_x, t_o[i_o])
+    results["Extrapolation"] = distance[i_o]
+    return results[results["B_ox"].notna()].reset_index(drop=True)
+
+def _overlap_bounds(starts, ends, codes, q_starts, q_ends, q_codes):
+    """
+    For each query interval, a range [lo, hi) of positions in the (burst, start)-sorted
+    intervals that contains every interval of the same burst overlapping it. `hi` is found
+    from the sorted start times; `lo` from the running maximum of the end times along that
+    order, which is sorted as well, so both are binary searches. The range can include
+    intervals that do not overlap the query only where intervals overlap each other.
+    """
+
+    start_keys = _keys(codes, starts)
+    reach = np.maximum.accumulate(_keys(codes, ends)) # latest end time of all intervals up to here
+    lo = np.searchsorted(reach, _keys(q_codes, q_starts), side="left")
+    hi = np.searchsorted(start_keys, _keys(q_codes, q_ends), side="right")
+    return lo, np.maximum(hi, lo)
+
+def match_by_overlap(xrt, optical, tolerance=0., flux_col="SpecFlux", exposure_col="Exposure (s)", min_time=1e-3):
+    """
+    Pairs each optical exposure with every X-ray bin of the same burst that overlaps it in
+    time, or would overlap it if the exposure were widened by a factor (1 + tolerance) on
+    either side. X-ray bins run from Time - Tneg to Time + Tpos. The bins are sorted once by
+    start time and searched through an index of their start times and running maximum end
+    times (see `_overlap_bounds`), so the cost is O((n_o + n_x) log n_x + n_pairs) instead of
+    a comparison of every optical epoch with every X-ray point.
+
+    Parameters
+    ----------
+    xrt : BurstStore
+        X-ray light curves with flux densities in `flux_col` [Jy] and bin half-widths Tpos
+        and Tneg [s] (see store.xrt_store)
+    optical : BurstStore
+        photometry with Flux/Fluxpos/Fluxneg [Jy], λ_eff [Ang] and optionally the exposure
+        length [s] in `exposure_col`, centred on Time (s). Rows without an exposure (or
+        stores without the column) are treated as instantaneous; in all_optical.csv, only
+        the Fong et al. (2015) points have exposures.
+    tolerance : float
+        fractional widening of each exposure (0 requires a true overlap)
+    flux_col : string
+        X-ray flux density column; `<flux_col>pos` and `<flux_col>neg` hold its errors
+    exposure_col : string
+        optical exposure length column
+    min_time : float
+        interval start times are clipped to this [s] so that they have a logarithm
+
+    Returns
+    -------
+    results : pandas DataFrame
+        same columns as `match_in_time` (t_x is the bin centre), plus Overlap (length of the
+        overlap of the exposure and the bin [s]) and Gap (separation of the two in dex, 0 if
+        they overlap). Pairs with undefined β_ox are dropped.
+    """
+
+    codes = _codes_in(xrt, optical)
+    t_o = np.asarray(optical.columns["Time (s)"], dtype=float)
+    if exposure_col in optical.columns:
+        half_exposure = np.nan_to_num(np.asarray(optical.columns[exposure_col], dtype=float)/2)
+    else:
+        half_exposure = np.zeros(len(t_o))
+    o_start, o_end = np.maximum(t_o - half_exposure, min_time), t_o + half_exposure
+
+    t_x = np.asarray(xrt.columns["Time"], dtype=float)
+    x_start = np.maximum(t_x - np.abs(np.nan_to_num(np.asarray(xrt.columns["Tneg"], dtype=float))), min_time)
+    x_end = t_x + np.abs(np.nan_to_num(np.asarray(xrt.columns["Tpos"], dtype=float)))
+    x_codes = xrt.group_codes()
+    order = np.lexsort((x_start, x_codes)) # rows are sorted by centre time, bins by start time here
+
+    valid = np.flatnonzero((codes >= 0) & (t_o > 0))
+    lo, hi = _overlap_bounds(x_start[order], x_end[order], x_codes[order],
+                             o_start[valid]/(1+tolerance), o_end[valid]*(1+tolerance), codes[valid])
+    counts = hi - lo
+    i_o = np.repeat(valid, counts)
+    i_x = order[np.repeat(lo - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())]
+
+    with np.errstate(divide="ignore"):
+        gap = np.maximum(0, np.maximum(np.log10(o_start[i_o]/x_end[i_x]), np.log10(x_start[i_x]/o_end[i_o])))
+    keep = (x_codes[i_x] == codes[i_o]) & (gap <= np.log10(1+tolerance) + 1e-12) # exact criterion, after the index search
+    i_o, i_x, gap = i_o[keep], i_x[keep], gap[keep]
+    F_x = [np.asarray(xrt.columns[flux_col+suffix], dtype=float)[i_x] for suffix in ("", "pos", "neg")]
+    results = _pairs_frame(optical, i_o, F_x, t_x[i_x])
+    results["Overlap"] = np.maximum(0, np.minimum(o_end[i_o], x_end[i_x]) - np.maximum(o_start[i_o], x_start[i_x]))
+    results["Gap"] = gap
+    return results[results["B_ox"].notna()].reset_index(drop=True)
+
+def classify_darkness(results, catalog, restrictive=False, B_ox_err=None):
+    """
+    Adds β_x from `catalog` (columns Beta_X, Beta_X_pos, Beta_X_neg) as B_x/B_x_pos/B_x_neg
+    and flags each pair as dark by the Jakobsson (β_ox < 0.5) and van der Horst
+    (β_ox < β_x - 0.5) criteria. With `restrictive`, the whole 1-sigma range must satisfy
+    the criterion: β_ox + σ⁺ < 0.5 and β_ox + σ⁺ < β_x - σ⁻ - 0.5. `B_ox_err` optionally
+    names a column (e.g. Δβ_ox) added in quadrature to the β_ox errors.
+    """
+
+    betas = catalog[["GRB", "Beta_X", "Beta_X_pos", "Beta_X_neg"]].rename(
+        columns={"Beta_X": "B_x", "Beta_X_pos": "B_x_pos", "Beta_X_neg": "B_x_neg"})
+    results = tolerant_merge(results, betas, on="GRB", how="left")
+    B_ox, B_x = results["B_ox"], results["B_x"]
+    if restrictive:
+        plus = results["B_ox_pos"] if B_ox_err is None else np.hypot(results["B_ox_pos"], results[B_ox_err])
+        results["Jak_dark"] = B_ox + plus < 0.5
+        results["vdH_dark"] = B_ox + plus < B_x - results["B_x_neg"] - 0.5
+    else:
+        results["Jak_dark"] = B_ox < 0.5
+        results["vdH_dark"] = B_ox < B_x - 0.5
+    return results
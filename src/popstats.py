@@ -0,0 +1,189 @@
+"""
+Two-sample comparisons of dark and bright populations.
+
+For any column of the matched-pair results (or of the catalog, at the burst level) split by
+a darkness flag, `compare_populations` reports the two-sample Kolmogorov-Smirnov and
+Anderson-Darling statistics, bootstrap confidence intervals on each population's location
+and on their difference, and permutation-test p-values for all three statistics. Resamples
+are drawn as batched (resamples × sample) index and label arrays, processed in chunks sized
+to a memory budget and optionally spread over a process pool; each chunk gets its own
+SeedSequence child, so results depend on the seed but not on the number of processes.
+"""
+
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+def population_samples(results, catalog, column, flag="vdH_dark", level=None, aggregate="median"):
+    """
+    Values of `column` split by the boolean `flag` column of `results`.
+
+    With level="pair" (the default for columns of `results`), every matched pair is one
+    sample. With level="burst" (the default for columns only found in `catalog`), each GRB
+    with at least one pair is one sample, counted as dark if any of its pairs is, with its
+    catalog value or the `aggregate` of its pair values. Missing values are dropped.
+
+    Returns
+    -------
+    dark, bright : numpy arrays
+    """
+
+    level = level or ("pair" if column in results.columns else "burst")
+    flags = results[flag].astype(bool)
+    if level == "pair":
+        values = pd.to_numeric(results[column], errors="coerce").to_numpy(dtype=float)
+        dark = flags.to_numpy()
+    else:
+        by_burst = flags.groupby(results["GRB"]).any()
+        if column in results.columns:
+            values = pd.to_numeric(results[column], errors="coerce").groupby(results["GRB"]).agg(aggregate).reindex(by_burst.index)
+        else:
+            values = pd.to_numeric(catalog.drop_duplicates("GRB").set_index("GRB")[column], errors="coerce").reindex(by_burst.index)
+        values, dark = values.to_numpy(dtype=float), by_burst.to_numpy()
+    good = ~np.isnan(values)
+    return values[good & dark], values[good & ~dark]
+
+def _tie_groups(pooled_sorted):
+    """Indices of the last element of each run of equal values in a sorted array."""
+
+    return np.flatnonzero(np.r_[pooled_sorted[1:] != pooled_sorted[:-1], True])
+
+def ks_statistics(labels, ends, n1, n2):
+    """Two-sample KS statistic D for a batch of labelings ((resamples × N) boolean array,
+    True for the first sample) of the same sorted pooled values."""
+
+    c1 = np.cumsum(labels, axis=1)[:, ends]
+    c2 = (ends + 1) - c1
+    return np.max(np.abs(c1/n1 - c2/n2), axis=1)
+
+def ad_statistics(labels, ends, n1, n2):
+    """Two-sample Anderson-Darling statistic A²_akN (Scholz & Stephens 1987, the midrank
+    version for ties used by scipy.stats.anderson_ksamp, before standardization) for a batch
+    of labelings of the same sorted pooled values."""
+
+    N = n1 + n2
+    B = (ends + 1).astype(float)
+    l = np.diff(np.r_[0, B])
+    Ba = B - l/2
+    M1 = np.cumsum(labels, axis=1)[:, ends].astype(float)
+    f1 = np.diff(np.c_[np.zeros(len(M1)), M1], axis=1)
+    Ma1 = M1 - f1/2
+    Ma2 = Ba - Ma1
+    denominator = Ba*(N - Ba) - N*l/4
+    with np.errstate(divide="ignore", invalid="ignore"):
+        w = np.where(denominator > 0, l/N/denominator, 0.)
+    A2 = (w*(N*Ma1 - Ba*n1)**2).sum(axis=1)/n1 + (w*(N*Ma2 - Ba*n2)**2).sum(axis=1)/n2
+    return A2*(N - 1)/N
+
+def _location(values, statistic):
+    return np.median(values, axis=-1) if statistic == "median" else np.mean(values, axis=-1)
+
+def _resample_chunk(pooled, n1, n_resamples, seed, statistic):
+    """Bootstrap locations of both samples and permutation statistics (location difference,
+    KS D, AD A²) for one chunk of resamples. `pooled` is sorted, with the first sample's
+    values flagged by the order returned from `compare_samples`."""
+
+    values, is_first = pooled
+    rng = np.random.default_rng(seed)
+    first, second = values[is_first], values[~is_first]
+    n2 = len(second)
+    boot1 = _location(first[rng.integers(0, n1, (n_resamples, n1))], statistic)
+    boot2 = _location(second[rng.integers(0, n2, (n_resamples, n2))], statistic)
+
+    labels = rng.permuted(np.broadcast_to(is_first, (n_resamples, len(values))), axis=1)
+    tiled = np.broadcast_to(values, labels.shape)
+    diff = _location(tiled[labels].reshape(n_resamples, n1), statistic) - _location(tiled[~labels].reshape(n_resamples, n2), statistic)
+    ends = _tie_groups(values)
+    return boot1, boot2, diff, ks_statistics(labels, ends, n1, n2), ad_statistics(labels, ends, n1, n2)
+
+def compare_samples(first, second, n_resamples=10_000, seed=None, statistic="median", confidence=0.95,
+                    memory_budget=256*2**20, processes=1):
+    """
+    Two-sample comparison of `first` (e.g. dark) against `second` (e.g. bright).
+
+    Parameters
+    ----------
+    first, second : array_like
+        the two samples (NaNs are dropped)
+    n_resamples : int
+        number of bootstrap resamples and of permutations
+    seed : int, SeedSequence or None
+        seed for the random number generator
+    statistic : string
+        "median" or "mean", the location statistic bootstrapped and compared
+    confidence : float
+        confidence level of the bootstrap intervals
+    memory_budget : int
+        approximate number of bytes of resample arrays held at once per process
+    processes : int
+        number of worker processes to spread the resample chunks over
+
+    Returns
+    -------
+    summary : dict
+        sample sizes; each sample's location and bootstrap interval; the difference
+        (first - second) with its bootstrap interval and permutation p-value; the KS statistic
+        with the p-value from scipy and from the permutations; the AD statistic (A²_akN) with
+        the standardized statistic and approximate p-value from scipy and the permutation p-value
+    """
+
+    first, second = (np.asarray(arr, dtype=float) for arr in (first, second))
+    first, second = first[~np.isnan(first)], second[~np.isnan(second)]
+    n1, n2 = len(first), len(second)
+    summary = {"n_first": n1, "n_second": n2}
+    if n1 < 2 or n2 < 2:
+        return summary
+
+    order = np.argsort(np.r_[first, second], kind="stable")
+    values = np.r_[first, second][order]
+    is_first = (order < n1)
+    ends = _tie_groups(values)
+    observed_diff = _location(first, statistic) - _location(second, statistic)
+    observed_ks = ks_statistics(is_first[None,:], ends, n1, n2)[0]
+    observed_ad = ad_statistics(is_first[None,:], ends, n1, n2)[0]
+
+    chunk = max(1, int(memory_budget // (8*4*(n1 + n2)))) # ~4 live (chunk × N) arrays
+    sizes = [min(chunk, n_resamples - start) for start in range(0, n_resamples, chunk)]
+    seed = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    seeds = seed.spawn(len(sizes))
+    jobs = [((values, is_first), n1, size, s, statistic) for size, s in zip(sizes, seeds)]
+    if processes > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            outputs = list(pool.map(_resample_chunk, *zip(*jobs)))
+    else:
+        outputs = [_resample_chunk(*job) for job in jobs]
+    boot1, boot2, perm_diff, perm_ks, perm_ad = (np.concatenate([out[i] for out in outputs]) for i in range(5))
+
+    tails = 100*np.array([(1 - confidence)/2, (1 + confidence)/2])
+    p_value = lambda permuted, observed: (1 + np.sum(permuted >= observed - 1e-12))/(1 + len(permuted))
+    ks = stats.ks_2samp(first, second)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore") # scipy warns when its p-value is capped or floored
+        ad = stats.anderson_ksamp([first, second])
+    summary.update({f"{statistic}_first": _location(first, statistic), "ci_first": tuple(np.percentile(boot1, tails)),
+                    f"{statistic}_second": _location(second, statistic), "ci_second": tuple(np.percentile(boot2, tails)),
+                    "difference": observed_diff, "ci_difference": tuple(np.percentile(boot1 - boot2, tails)),
+                    "p_difference": p_value(np.abs(perm_diff), abs(observed_diff)),
+                    "KS": observed_ks, "p_KS": ks.pvalue, "p_KS_perm": p_value(perm_ks, observed_ks),
+                    "AD": observed_ad, "AD_std": ad.statistic, "p_AD": ad.significance_level,
+                    "p_AD_perm": p_value(perm_ad, observed_ad)})
+    return summary
+
+def compare_populations(results, catalog, columns, flag="vdH_dark", level=None, n_resamples=10_000, seed=None,
+                        statistic="median", confidence=0.95, memory_budget=256*2**20, processes=1):
+    """
+    Dark vs. bright comparison (see `compare_samples`) for each of `columns`, split by
+    `flag` (see `population_samples` for how pair- and burst-level columns are handled).
+    Returns a DataFrame with one row per column; "first" is the dark population.
+    """
+
+    seeds = np.random.SeedSequence(seed).spawn(len(columns))
+    rows = []
+    for column, s in zip(columns, seeds):
+        dark, bright = population_samples(results, catalog, column, flag, level)
+        summary = compare_samples(dark, bright, n_resamples, s, statistic, confidence, memory_budget, processes)
+        rows.append({"column": column, "flag": flag, **summary})
+    table = pd.DataFrame(rows).set_index("column")
+    return table.rename(columns=lambda col: col.replace("first", "dark").replace("second", "bright"))
@@ -0,0 +1,346 @@
+"""
+Local HTTP/JSON query service over the catalog, light curves, photometry and pairing results.
+
+At startup the products are loaded once into in-memory indexes: the sGRB catalog and the
+per-burst summaries in a dict keyed by normalized GRB name, the light curves and photometry
+as `BurstStore`s, the temporal matches (`pairing.match_in_time` + `classify_darkness`, with
+and without the restrictive criteria) grouped by burst, and the bursts sorted by date with
+one boolean darkness mask per criterion, so that a date range is two binary searches. The
+product files are polled for changes, and a new index is built in the background and swapped
+in when they change; queries keep being answered from the previous one in the meantime.
+
+    python -m src.query --port 8767
+
+Endpoints (all GET, JSON responses):
+
+- /status                        loaded products, load time, request and reload counts
+- /grb/<name>                    catalog entry, numbers of points/matches/dark matches, darkest pair
+- /grb/<name>/pairs?dark=<c>     temporal matches, optionally only those dark by criterion <c>
+- /grb/<name>/xrt, /grb/<name>/optical
+                                 light curve / photometry, as column -> list of values
+- /bursts?from=<date>&to=<date>&dark=<c>&restrictive=1
+                                 summaries of the bursts in a date range (YYYY-MM-DD or YYYYMMDD,
+                                 both inclusive) that are dark by criterion <c>
+
+Names are matched like `grbid.GRBIndex` ("GRB 200522A", "200522a" and "200522" all find
+200522A). Criteria are "jak" (β_ox < 0.5), "vdh" (β_ox < β_x - 0.5), "any" (either) and
+"none" (bursts with matches but no dark ones); add restrictive=1 to require the whole
+1-sigma β_ox range to satisfy them.
+"""
+
+import os, re, json, time, argparse, threading
+from urllib.parse import urlsplit, parse_qs, unquote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import numpy as np
+import pandas as pd
+
+from .grbid import GRBIndex, normalize_ids, parse_ids, id_pattern, prefix_pattern
+from .store import xrt_store, optical_store
+from .pairing import match_in_time, classify_darkness
+
+product_paths = {"catalog": "./products/Swift_sGRB_catalog.csv",
+                 "xrt": "./products/Swift_XRT_lightcurves.csv",
+                 "optical": "./products/all_optical.csv"}
+criteria = {"jak": ["Jak_dark"], "vdh": ["vdH_dark"], "any": ["Jak_dark", "vdH_dark"]}
+
+def _jsonable(value):
+    """Plain Python value for JSON; missing values and the infinite errors of upper limits become null."""
+
+    if isinstance(value, (np.bool_, bool)):
+        return bool(value)
+    if isinstance(value, (np.integer, np.floating)):
+        value = value.item()
+    if value is pd.NA or (isinstance(value, float) and not np.isfinite(value)):
+        return None
+    return value
+
+def _records(frame):
+    return [{col: _jsonable(val) for col, val in row.items()} for row in frame.to_dict("records")]
+
+def _date(text):
+    """YYYYMMDD integer from "YYYY-MM-DD" or "YYYYMMDD"."""
+
+    digits = text.replace("-", "").strip()
+    if len(digits) != 8 or not digits.isdigit():
+        raise ValueError(f"dates must be YYYY-MM-DD or YYYYMMDD, not {text!r}")
+    return int(digits)
+
+class ProductIndex:
+    """
+    Immutable in-memory indexes over one version of the products.
+
+    Parameters
+    ----------
+    catalog : pandas DataFrame
+        sGRB catalog with GRB and Beta_X/Beta_X_pos/Beta_X_neg columns
+    xrt : pandas DataFrame
+        XRT light curves (as Swift_XRT_lightcurves.csv)
+    optical : pandas DataFrame
+        photometry (as all_optical.csv)
+    max_dt : float
+        maximum fractional time separation of a temporal match
+    """
+
+    def __init__(self, catalog, xrt, optical, max_dt=0.1):
+        start = time.perf_counter()
+        self.max_dt = max_dt
+        catalog = catalog.assign(GRB=normalize_ids(catalog["GRB"]).to_numpy(dtype=object))
+        self.xrt, self.optical = xrt_store(xrt, catalog), optical_store(optical)
+        pairs = match_in_time(self.xrt, self.optical, max_dt)
+        restrictive = classify_darkness(pairs, catalog, restrictive=True)
+        pairs = classify_darkness(pairs, catalog)
+        for col in ["Jak_dark", "vdH_dark"]:
+            pairs[f"{col}_restrictive"] = restrictive[col].to_numpy()
+        pairs["GRB"] = normalize_ids(pairs["GRB"]).to_numpy(dtype=object)
+        self.npairs = len(pairs)
+
+        # store rows are looked up under the names used in the files
+        self._stored = {band: dict(zip(normalize_ids(store.grbs).tolist(), store.grbs.tolist()))
+                        for band, store in (("xrt", self.xrt), ("optical", self.optical))}
+        entries = dict(zip(catalog["GRB"], _records(catalog)))
+        names = sorted(set(entries) | set(self._stored["xrt"]) | set(self._stored["optical"]) | set(pairs["GRB"]))
+        rows = pairs.groupby("GRB", sort=False).indices
+        self.pairs, self.summaries = {}, {}
+        for name in names:
+            burst = pairs.iloc[rows.get(name, [])]
+            self.pairs[name] = list(zip(_records(burst), self._flags(burst)))
+            self.summaries[name] = self._summary(name, entries.get(name), burst)
+
+        parsed = parse_ids(pd.Series(names))
+        dates, suffixes = parsed["Date"].fillna(0).to_numpy(dtype=np.int64), parsed["Suffix"].fillna(0).to_numpy(dtype=np.int64)
+        order = np.lexsort((suffixes, dates))
+        self.names, self.dates = np.array(names, dtype=object)[order], dates[order]
+        self.masks = {}
+        for restrictive in (False, True):
+            counts = [self.summaries[name]["Dark (restrictive)" if restrictive else "Dark"] for name in self.names]
+            dark = np.array([[count["Jak"] > 0, count["vdH"] > 0] for count in counts], dtype=bool).reshape(-1, 2)
+            matched = np.array([self.summaries[name]["Temporal matches"] > 0 for name in self.names], dtype=bool)
+            self.masks[restrictive] = {"jak": dark[:,0], "vdh": dark[:,1], "any": dark.any(axis=1), "none": matched & ~dark.any(axis=1)}
+        self.by_base = GRBIndex(pd.Series(names)).by_base.to_dict() # date -> name, for dates with a single burst
+        self.loaded = time.time()
+        self.load_seconds = time.perf_counter() - start
+
+    @classmethod
+    def load(cls, paths=None, max_dt=0.1):
+        """Index of the product files in `paths` (keys catalog, xrt and optical; defaults to `product_paths`)."""
+
+        paths = {**product_paths, **(paths or {})}
+        index = cls(*(pd.read_csv(paths[key]) for key in ("catalog", "xrt", "optical")), max_dt=max_dt)
+        index.paths = paths
+        return index
+
+    @staticmethod
+    def _flags(pairs):
+        """(criterion, restrictive) -> dark, for every pair."""
+
+        flags = {(c, r): pairs[[f"{col}_restrictive" if r else col for col in cols]].to_numpy(dtype=bool).any(axis=1)
+                 for c, cols in criteria.items() for r in (False, True)}
+        return [{key: bool(values[i]) for key, values in flags.items()} for i in range(len(pairs))]
+
+    def _summary(self, name, entry, pairs):
+        dark = pairs["Jak_dark"] | pairs["vdH_dark"]
+        darkest = pairs[dark].nsmallest(1, "B_ox")
+        return {"GRB": name, "catalog": entry,
+                "X-ray": self._count("xrt", name), "Optical": self._count("optical", name),
+                "Temporal matches": len(pairs),
+                "Dark": {"Jak": int(pairs["Jak_dark"].sum()), "vdH": int(pairs["vdH_dark"].sum()), "any": int(dark.sum())},
+                "Dark (restrictive)": {"Jak": int(pairs["Jak_dark_restrictive"].sum()), "vdH": int(pairs["vdH_dark_restrictive"].sum())},
+                "darkest pair": _records(darkest)[0] if len(darkest) else None}
+
+    def _count(self, band, name):
+        stored = self._stored[band].get(name)
+        store = self.xrt if band == "xrt" else self.optical
+        if stored is None:
+            return 0
+        start, stop = store.bounds(stored)
+        return stop - start
+
+    def resolve(self, grb):
+        """Normalized name under which `grb` is indexed, or None."""
+
+        name = re.sub(prefix_pattern, "", grb.strip().upper())
+        if name in self.summaries:
+            return name
+        match = re.match(id_pattern, name)
+        resolved = self.by_base.get(name[:6]) if match else None # tolerant of a missing letter suffix
+        if resolved is None or (match["Suffix"] and resolved[6:]):
+            return None # unknown date, or two different suffixes
+        return resolved
+
+    def burst_pairs(self, name, criterion=None, restrictive=False):
+        return [pair for pair, flags in self.pairs[name] if criterion is None or flags[(criterion, restrictive)]]
+
+    def columns(self, band, name):
+        """Light curve or photometry of a burst as column -> list of values."""
+
+        store = self.xrt if band == "xrt" else self.optical
+        stored = self._stored[band].get(name)
+        if stored is None:
+            return {}
+        columns = {}
+        for col, values in store[stored].items():
+            if values.dtype.kind == "f":
+                values = np.where(np.isfinite(values), values, None) # NaN, inf -> null
+            columns[col] = values.tolist()
+        return columns
+
+    def bursts(self, first=None, last=None, criterion=None, restrictive=False):
+        """Summaries of the bursts dated between `first` and `last` (YYYYMMDD, inclusive)."""
+
+        lo = 0 if first is None else np.searchsorted(self.dates, first, side="left")
+        hi = len(self.dates) if last is None else np.searchsorted(self.dates, last, side="right")
+        names = self.names[lo:hi]
+        if criterion is not None:
+            names = names[self.masks[restrictive][criterion][lo:hi]]
+        return [self.summaries[name] for name in names]
+
+    def status(self):
+        return {"paths": getattr(self, "paths", None), "loaded": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.loaded)),
+                "load seconds": round(self.load_seconds, 3), "bursts": len(self.names), "pairs": self.npairs,
+                "max_dt": self.max_dt}
+
+class QueryServer(ThreadingHTTPServer):
+    """
+    Local HTTP server answering queries from a `ProductIndex`, rebuilt when the products change.
+
+    Parameters
+    ----------
+    paths : dict or None
+        product files (keys catalog, xrt and optical), overriding `product_paths`
+    address : tuple
+        (host, port) to listen on; port 0 picks a free port
+    max_dt : float
+        maximum fractional time separation of a temporal match
+    poll_interval : float or None
+        seconds between checks of the product files for changes; None disables hot reload
+    """
+
+    daemon_threads = True
+
+    def __init__(self, paths=None, address=("127.0.0.1", 0), max_dt=0.1, poll_interval=2.):
+        super().__init__(address, _QueryHandler)
+        self.paths, self.max_dt = {**product_paths, **(paths or {})}, max_dt
+        self.stats = {"requests": 0, "reloads": 0, "reload errors": 0, "last reload error": None}
+        self._signature = self._stat()
+        self.index = ProductIndex.load(self.paths, max_dt)
+        self._stop = threading.Event()
+        if poll_interval is not None:
+            threading.Thread(target=self._watch, args=(poll_interval,), daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def _stat(self):
+        """Modification time and size of every product file (None if missing)."""
+
+        signature = []
+        for path in self.paths.values():
+            try:
+                st = os.stat(path)
+                signature.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def reload(self):
+        """Rebuilds the index from the product files and swaps it in. If that fails (e.g. a file
+        is half-written), the current index is kept and the error is reported in /status."""
+
+        try:
+            index = ProductIndex.load(self.paths, self.max_dt)
+        except Exception as e:
+            self.stats["reload errors"] += 1
+            self.stats["last reload error"] = repr(e)
+            return False
+        self.index = index # a single assignment, so every request sees either the old or the new index
+        self.stats["reloads"] += 1
+        return True
+
+    def _watch(self, poll_interval):
+        while not self._stop.wait(poll_interval):
+            signature = self._stat()
+            if signature != self._signature:
+                self._signature = signature
+                self.reload()
+
+    def server_close(self):
+        self._stop.set()
+        super().server_close()
+
+class _QueryHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        start = time.perf_counter()
+        server = self.server
+        server.stats["requests"] += 1
+        index = server.index
+        url = urlsplit(self.path)
+        parts = [unquote(part) for part in url.path.strip("/").split("/") if part]
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            status, body = self._route(index, parts, query)
+        except (ValueError, KeyError) as e:
+            status, body = 400, {"error": str(e)}
+        if parts in ([], ["status"]):
+            body |= server.stats
+        self._send(status, body, time.perf_counter() - start)
+
+    def _route(self, index, parts, query):
+        criterion = query.get("dark", "").lower() or None
+        if criterion is not None and criterion not in index.masks[False]:
+            raise ValueError(f"unknown criterion {criterion!r}; use one of {', '.join(index.masks[False])}")
+        restrictive = query.get("restrictive", "0").lower() in ("1", "true", "yes")
+        if parts in ([], ["status"]):
+            return 200, index.status()
+        if parts == ["bursts"]:
+            first, last = (_date(query[key]) if key in query else None for key in ("from", "to"))
+            return 200, index.bursts(first, last, criterion, restrictive)
+        if parts[0] == "grb" and len(parts) in (2, 3):
+            name = index.resolve(parts[1])
+            if name is None:
+                return 404, {"error": f"unknown GRB {parts[1]!r}"}
+            if len(parts) == 2:
+                return 200, index.summaries[name]
+            if parts[2] == "pairs":
+                if criterion == "none":
+                    raise ValueError("pairs can be selected by criterion jak, vdh or any")
+                return 200, index.burst_pairs(name, criterion, restrictive)
+            if parts[2] in ("xrt", "optical"):
+                return 200, index.columns(parts[2], name)
+        return 404, {"error": f"no such endpoint: /{'/'.join(parts)}"}
+
+    def _send(self, status, body, elapsed):
+        payload = json.dumps(body, ensure_ascii=False, allow_nan=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("X-Query-Time", f"{1e3*elapsed:.3f} ms")
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer per-burst, date-range and darkness queries over the products.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--catalog", default=product_paths["catalog"])
+    parser.add_argument("--xrt", default=product_paths["xrt"])
+    parser.add_argument("--optical", default=product_paths["optical"])
+    parser.add_argument("--max-dt", type=float, default=0.1)
+    parser.add_argument("--poll-interval", type=float, default=2., help="seconds between checks for changed products")
+    args = parser.parse_args()
+
+    server = QueryServer({"catalog": args.catalog, "xrt": args.xrt, "optical": args.optical},
+                         (args.host, args.port), args.max_dt, args.poll_interval)
+    status = server.index.status()
+    print(f"Serving {status['bursts']} bursts and {status['pairs']} temporal matches at {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
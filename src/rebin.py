@@ -0,0 +1,123 @@
+"""
+Adaptive rebinning of Swift-XRT light curves before pairing.
+
+Early WT-mode segments consist of hundreds of sub-second bins of S/N ~ 5 each, and every one
+of them within `max_dt` of an optical epoch becomes a separate pair, although neighbouring
+bins carry the same information about β_ox. `rebin_lightcurves` merges runs of adjacent bins
+of each burst until a merged bin reaches a target signal-to-noise ratio, without letting any
+merged bin span more than `max_dlogt` in log10 time, so that the time resolution stays well
+below the pairing tolerance. Upper limits are never merged.
+
+Bins are grouped greedily from the start of every light curve. All bursts are processed
+together: each round closes one merged bin per burst, using cumulative sums of the signal and
+variance to evaluate the S/N of every candidate run at once (so there are as many rounds as
+merged bins in the longest light curve, not as input bins).
+"""
+
+import numpy as np
+
+from .store import BurstStore
+from .pairing import _keys
+
+def _runs(codes, start, end, signal, variance, breaks, target_snr, max_dlogt):
+    """Boolean mask of the rows that start a merged bin."""
+
+    n = len(codes)
+    new_segment = np.ones(n, dtype=bool)
+    new_segment[1:] = (codes[1:] != codes[:-1]) | breaks[1:] | breaks[:-1] # limits form segments of their own
+    segment_starts = np.flatnonzero(new_segment)
+    bounds = np.append(segment_starts, n)
+    segment_end = np.repeat(bounds[1:], np.diff(bounds))
+    reach = np.maximum.accumulate(_keys(codes, end)) # latest end time of all bins up to here
+    cum_signal, cum_variance = np.append(0., np.cumsum(signal)), np.append(0., np.cumsum(variance))
+
+    first = np.zeros(n, dtype=bool)
+    active = segment_starts
+    while len(active):
+        first[active] = True
+        hi = np.searchsorted(reach, _keys(codes[active], start[active]) + max_dlogt, side="right")
+        hi = np.clip(hi, active + 1, segment_end[active]) # at least one bin, never past the segment
+        if target_snr is None:
+            following = hi
+        else:
+            counts = hi - active
+            offsets = np.cumsum(counts) - counts
+            i = np.repeat(active, counts)
+            j = i + np.arange(counts.sum()) - np.repeat(offsets, counts) # candidate last bins
+            with np.errstate(divide="ignore", invalid="ignore"):
+                snr = (cum_signal[j+1] - cum_signal[i])/np.sqrt(cum_variance[j+1] - cum_variance[i])
+            following = np.minimum.reduceat(np.where(snr >= target_snr, j+1, np.repeat(hi, counts)), offsets)
+        active = following[following < segment_end[active]]
+    return first
+
+def rebin_lightcurves(xrt, target_snr=20., max_dlogt=0.02, flux_cols=("Flux", "SpecFlux")):
+    """
+    Merges adjacent light-curve bins to a target S/N, with a maximum width in log10 time.
+
+    Parameters
+    ----------
+    xrt : BurstStore
+        X-ray light curves with Time, Tpos, Tneg and flux columns with <col>pos/<col>neg
+        errors (see store.xrt_store); upper limits have an infinite Fluxneg
+    target_snr : float or None
+        S/N at which a merged bin is closed; None merges everything allowed by `max_dlogt`
+    max_dlogt : float
+        maximum width of a merged bin [dex], from the start of its first bin to the end of
+        its last. The default (a factor 1.047) is well inside the ±10% of the pairing.
+    flux_cols : sequence of strings
+        flux columns to combine (those absent from the store are skipped); the S/N is that
+        of the first one
+
+    Returns
+    -------
+    rebinned : BurstStore
+        the merged light curves, with the same columns plus First (row of the first merged
+        bin in `xrt`) and Bins (number of merged bins), so that rebinned row k comprises rows
+        First[k] to First[k]+Bins[k]-1 of `xrt`. Each flux is the exposure-weighted mean of the
+        merged fluxes and its upper and lower errors are combined in quadrature separately;
+        Time is the flux-weighted mean time, and Tpos/Tneg reach the ends of the merged
+        interval. Bins that are not merged keep their values exactly.
+    """
+
+    if xrt.nrows == 0:
+        return BurstStore({**xrt.columns, "First": np.empty(0, dtype=np.int64), "Bins": np.empty(0, dtype=np.int64)},
+                          xrt.grbs, xrt.offsets, xrt.time_col)
+    flux_cols = [col for col in flux_cols if col in xrt.columns]
+    columns = {col: np.asarray(values) for col, values in xrt.columns.items()}
+    time, tpos, tneg = (np.asarray(columns[col], dtype=float) for col in ("Time", "Tpos", "Tneg"))
+    start, end = time - np.abs(tneg), time + np.abs(tpos)
+    width = np.where(end > start, end - start, 1.)
+    flux, plus, minus = (np.asarray(columns[flux_cols[0] + suffix], dtype=float) for suffix in ("", "pos", "neg"))
+    breaks = ~np.isfinite(flux) | ~np.isfinite(minus) | ~(np.abs(plus) + np.abs(minus) > 0) # limits and undefined bins
+    sigma = (np.abs(plus) + np.abs(minus))/2
+    codes = xrt.group_codes()
+    first = _runs(codes, start, end, np.where(breaks, 0., flux*width), np.where(breaks, 0., (sigma*width)**2),
+                  breaks, target_snr, max_dlogt)
+
+    rows = np.flatnonzero(first)
+    bins = np.diff(np.append(rows, len(first)))
+    single = bins == 1
+    exposure = np.add.reduceat(width, rows)
+    def combine(values, quadrature=False):
+        if quadrature: # keeps the sign convention of the input (e.g. negative Fluxneg)
+            total = np.copysign(np.sqrt(np.add.reduceat((values*width)**2, rows)), values[rows])
+        else:
+            total = np.add.reduceat(values*width, rows)
+        return np.where(single, values[rows], total/exposure)
+
+    rebinned = {col: values[rows] for col, values in columns.items()} # columns not combined below keep the first bin's value
+    for col in flux_cols:
+        rebinned[col] = combine(np.asarray(columns[col], dtype=float))
+        for suffix in ("pos", "neg"):
+            rebinned[col+suffix] = combine(np.asarray(columns[col+suffix], dtype=float), quadrature=True)
+    weights = np.where(breaks, 0., flux*width)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_time = np.add.reduceat(time*weights, rows)/np.add.reduceat(weights, rows) # mean photon arrival time
+    mean_time = np.where(np.isfinite(mean_time), mean_time, np.add.reduceat(time*width, rows)/exposure)
+    merged_start, merged_end = np.minimum.reduceat(start, rows), np.maximum.reduceat(end, rows)
+    rebinned["Time"] = np.where(single, time[rows], mean_time)
+    rebinned["Tpos"] = np.where(single, tpos[rows], merged_end - rebinned["Time"])
+    rebinned["Tneg"] = np.where(single, tneg[rows], np.copysign(rebinned["Time"] - merged_start, tneg[rows]))
+    rebinned["First"], rebinned["Bins"] = rows, bins
+    offsets = np.searchsorted(rows, xrt.offsets) # merged bins never span two bursts
+    return BurstStore(rebinned, xrt.grbs, offsets, xrt.time_col)
@@ -0,0 +1,160 @@
+"""
+Headless batch rendering of per-burst X-ray and optical/UV/IR light curves.
+
+Bursts are spread over a process pool; every worker uses the Agg backend, loads the
+light-curve data once, and reuses a single figure for all of the bursts it renders.
+Run from the top-level directory of the repository, e.g.
+
+    python -m src.render --outdir "products/dark lightcurves" 180618A 211227A
+"""
+
+import os, time, argparse
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from .store import BurstStore, xrt_store, optical_store
+
+bands = {"UV": (0, 3000, "darkviolet"), "Optical": (3000, 8000, "dodgerblue"), "IR": (8000, np.inf, "red")} # λ_eff ranges [Ang]
+
+_worker = {} # per-process state: stores, figure and axes
+
+def _errors(value, plus, minus):
+    """Error bar extents, with limits drawn with a fixed 40% arrow length."""
+
+    lower = np.where(np.isinf(minus), 0.4*value, minus)
+    upper = np.where(np.isinf(plus), 0.4*value, plus)
+    return np.vstack((lower, upper))
+
+def plot_xray(ax, lightcurve, flux_col="SpecFlux", **kwargs):
+    """Draws one burst's X-ray light curve (a BurstStore slice) on `ax`."""
+
+    flux = lightcurve[flux_col]
+    ax.errorbar(lightcurve["Time"], flux, xerr=np.vstack((np.abs(lightcurve["Tneg"]), lightcurve["Tpos"])),
+                yerr=_errors(flux, lightcurve[flux_col+"pos"], np.abs(lightcurve[flux_col+"neg"])),
+                uplims=np.isinf(lightcurve[flux_col+"neg"]), linestyle="", color="k", capthick=0, label="X-ray", **kwargs)
+
+def plot_optical(ax, photometry, band="Optical", **kwargs):
+    """Draws the points of one burst's photometry (a BurstStore slice) that fall in `band`."""
+
+    low, high, color = bands[band]
+    in_band = (photometry["λ_eff"] >= low) & (photometry["λ_eff"] < high) & np.isfinite(photometry["Flux"])
+    if not in_band.any():
+        return
+    flux = photometry["Flux"][in_band]
+    ax.errorbar(photometry["Time (s)"][in_band], flux,
+                yerr=_errors(flux, photometry["Fluxpos"][in_band], photometry["Fluxneg"][in_band]),
+                uplims=np.isinf(photometry["Fluxneg"][in_band]), lolims=np.isinf(photometry["Fluxpos"][in_band]),
+                linestyle="", marker=".", color=color, capthick=0, label=band, **kwargs)
+
+def _load(source, builder):
+    if source is None or isinstance(source, BurstStore):
+        return source
+    if os.path.isdir(source):
+        return BurstStore.load(source, mmap=True)
+    return builder(source)
+
+def _init_worker(xrt_source, optical_source, catalog, figsize, dpi):
+    _worker["xrt"] = _load(xrt_source, partial(xrt_store, catalog=catalog))
+    _worker["optical"] = _load(optical_source, optical_store)
+    _worker["fig"], _worker["ax"] = plt.subplots(figsize=figsize)
+    _worker["dpi"] = dpi
+
+def _render_one(grb, outdir):
+    start = time.perf_counter()
+    fig, ax = _worker["fig"], _worker["ax"]
+    ax.clear()
+    xrt, optical = _worker["xrt"], _worker["optical"]
+    n_x = n_o = 0
+    try:
+        if xrt is not None and grb in xrt:
+            lightcurve = xrt[grb]
+            n_x = len(lightcurve["Time"])
+            plot_xray(ax, lightcurve)
+        if optical is not None and grb in optical:
+            photometry = optical[grb]
+            n_o = len(photometry["Flux"])
+            for band in bands:
+                plot_optical(ax, photometry, band)
+        if n_x+n_o == 0:
+            raise KeyError(f"no data for GRB {grb}")
+        ax.set(xscale="log", yscale="log", xlabel="Time post-trigger [s]", ylabel="Flux [Jy]", title=f"GRB {grb}")
+        ax.grid(linestyle="--")
+        if ax.get_legend_handles_labels()[0]:
+            ax.legend(loc="upper right")
+        filename = os.path.join(outdir, f"{grb}.png")
+        fig.savefig(filename, dpi=_worker["dpi"])
+        status = "ok"
+    except Exception as e:
+        filename, status = None, f"error: {e}"
+    return {"GRB": grb, "file": filename, "X-ray points": n_x, "Optical points": n_o,
+            "Render time (s)": time.perf_counter()-start, "Status": status}
+
+def _render_chunk(args):
+    grbs, outdir = args
+    return [_render_one(grb, outdir) for grb in grbs]
+
+def render_lightcurves(grbs=None, xrt="./products/Swift_XRT_lightcurves.csv", optical="./products/all_optical.csv",
+                       catalog="./products/Swift_sGRB_catalog.csv", outdir="./products/lightcurves",
+                       processes=None, figsize=(8,6), dpi=200):
+    """
+    Renders light-curve PNGs for many bursts in parallel and writes a manifest.
+
+    Parameters
+    ----------
+    grbs : list of strings, optional
+        GRB IDs to render; defaults to every burst present in either data set
+    xrt, optical : BurstStore, string, or None
+        light-curve data, given as a store, a directory written by `BurstStore.save`
+        (memory-mapped by each worker), or the path to the CSV product
+    catalog : pandas DataFrame or string
+        burst catalog with Beta_X columns, used to convert XRT band fluxes to flux densities
+        when the X-ray data has no SpecFlux column
+    outdir : string
+        directory to write `<GRB>.png` files and `manifest.csv` to
+    processes : int, optional
+        number of worker processes; defaults to the number of CPU cores
+    figsize, dpi
+        passed on to matplotlib
+
+    Returns
+    -------
+    manifest : pandas DataFrame
+        one row per requested burst: output file, number of points drawn, render time and status
+    """
+
+    if grbs is None:
+        names = []
+        for source, builder in [(xrt, partial(xrt_store, catalog=catalog)), (optical, optical_store)]:
+            store = _load(source, builder)
+            if store is not None:
+                names.extend(store.grbs.tolist())
+        grbs = sorted(set(names))
+    os.makedirs(outdir, exist_ok=True)
+    processes = min(processes or os.cpu_count() or 1, max(len(grbs), 1))
+    chunks = [(list(chunk), outdir) for chunk in np.array_split(np.asarray(grbs, dtype=object), processes*4) if len(chunk)]
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                             initargs=(xrt, optical, catalog, figsize, dpi)) as pool:
+        rows = [row for chunk in pool.map(_render_chunk, chunks) for row in chunk]
+    manifest = pd.DataFrame(rows, columns=["GRB", "file", "X-ray points", "Optical points", "Render time (s)", "Status"])
+    manifest.to_csv(os.path.join(outdir, "manifest.csv"), index=False)
+    return manifest
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch-render GRB light curves to PNG files.")
+    parser.add_argument("grbs", nargs="*", help="GRB IDs to render (default: all)")
+    parser.add_argument("--xrt", default="./products/Swift_XRT_lightcurves.csv", help="XRT light-curve CSV or saved store directory")
+    parser.add_argument("--optical", default="./products/all_optical.csv", help="photometry CSV or saved store directory")
+    parser.add_argument("--catalog", default="./products/Swift_sGRB_catalog.csv", help="catalog with Beta_X for flux density conversion")
+    parser.add_argument("--outdir", default="./products/lightcurves")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--dpi", type=int, default=200)
+    args = parser.parse_args()
+
+    manifest = render_lightcurves(args.grbs or None, args.xrt, args.optical, args.catalog, args.outdir,
+                                  args.processes, dpi=args.dpi)
+    print(f"Rendered {(manifest['Status']=='ok').sum()}/{len(manifest)} light curves to {args.outdir}")
@@ -0,0 +1,301 @@
+"""
+Record/replay of the web services this project scrapes (UKSSDC grb.list, light-curve QDP files,
+xrt_spectra and xrt_live_cat pages, SIMBAD, ADS, GCN circulars/notices, the Swift GRB table, ...).
+
+Responses are captured once into a fixture store (one file per response plus an index.json)
+and served back by a local HTTP stand-in with configurable latency, error rate and throttling,
+so the fetch layer can be exercised and timed offline and deterministically. The stand-in maps
+`http://<address>/<host>/<path>?<query>` to the recorded response for `<host>/<path>?<query>`;
+setting the DARKGRBS_MIRROR environment variable to its address (done automatically by `serve`)
+makes `utilities.mirrored` rewrite every URL used by src/xrt.py, src/utilities.py and
+src/fluxtools.py to point at it. Notebooks can wrap their own URLs the same way.
+
+    python -m src.replay record --store data/fixtures https://www.swift.ac.uk/xrt_curves/grb.list ...
+    python -m src.replay serve --store data/fixtures --latency 0.2 --error-rate 0.05 --rate 5
+"""
+
+import os, json, time, random, hashlib, argparse, threading, contextlib
+from urllib.parse import urlsplit
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import requests
+
+from .utilities import mirror_variable
+
+def fixture_key(url):
+    """Scheme-independent key for a URL: host, path and (sorted) query string."""
+
+    parts = urlsplit(url)
+    query = "&".join(sorted(parts.query.split("&"))) if parts.query else ""
+    return parts.netloc + (parts.path or "/") + ("?"+query if query else "")
+
+class FixtureStore:
+    """
+    Directory of recorded HTTP responses.
+
+    Each response body is saved as `<sha1 of key>.body`; index.json maps keys to the
+    original URL, status code, content type and body file.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        path = os.path.join(directory, "index.json")
+        if os.path.exists(path):
+            with open(path) as f:
+                self.index = json.load(f)
+        else:
+            self.index = {}
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, url):
+        return fixture_key(url) in self.index
+
+    def get(self, url):
+        """(status, content type, body bytes) for a URL, or None if it was never recorded."""
+
+        entry = self.index.get(fixture_key(url))
+        if entry is None:
+            return None
+        with open(os.path.join(self.directory, entry["file"]), "rb") as f:
+            return entry["status"], entry["content_type"], f.read()
+
+    def put(self, url, status, content_type, body):
+        key = fixture_key(url)
+        filename = hashlib.sha1(key.encode()).hexdigest() + ".body"
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, filename), "wb") as f:
+                f.write(body)
+            self.index[key] = {"url": url, "status": status, "content_type": content_type,
+                               "file": filename, "recorded": time.strftime("%Y-%m-%dT%H:%M:%S")}
+            with open(os.path.join(self.directory, "index.json"), "w") as f:
+                json.dump(self.index, f, indent=1, sort_keys=True)
+
+def endpoint_urls(triggers=(), grbs=(), years=()):
+    """URLs scraped by src/xrt.py, src/utilities.py and the notebooks for the given Swift
+    trigger numbers, GRB IDs and GCN archive years, for passing to `record`. (ADS pages
+    depend on the bibcodes SIMBAD returns, so record those after the SIMBAD queries.)"""
+
+    urls = ["https://www.swift.ac.uk/xrt_curves/grb.list",
+            "https://swift.gsfc.nasa.gov/archive/grb_table/fullview/",
+            "http://svo2.cab.inta-csic.es/svo/theory/fps3/morefiles/vega.dat"]
+    for trigger in triggers:
+        urls += [f"https://www.swift.ac.uk/xrt_curves/{int(trigger):0>8}/flux_incbad.qdp",
+                 f"https://www.swift.ac.uk/xrt_spectra/{int(trigger):0>8}/",
+                 f"https://www.swift.ac.uk/xrt_live_cat/{int(trigger):0>8}/",
+                 f"https://gcn.gsfc.nasa.gov/notices_s/{int(trigger)}/BA/"]
+    for grb in grbs:
+        urls += [f"http://simbad.u-strasbg.fr/simbad/sim-id?Ident=GRB%20{grb}&submit=In+table&output.format=ASCII",
+                 f"https://gcn.gsfc.nasa.gov/other/{grb}.gcn3"]
+    urls += [f"https://gcn.gsfc.nasa.gov/selected_{year}.html" for year in years]
+    return urls
+
+def fetch(url, store, overwrite=False, timeout=60):
+    """Fetches a URL from the real service and records the response in `store` (a
+    FixtureStore or directory). Already-recorded URLs are skipped unless `overwrite`."""
+
+    store = store if isinstance(store, FixtureStore) else FixtureStore(store)
+    if url in store and not overwrite:
+        return store.get(url)
+    response = requests.get(url, timeout=timeout)
+    content_type = response.headers.get("Content-Type", "application/octet-stream")
+    store.put(url, response.status_code, content_type, response.content)
+    return response.status_code, content_type, response.content
+
+def record(urls, store, overwrite=False, timeout=60):
+    """
+    Records a list of URLs into a fixture store.
+
+    Parameters
+    ----------
+    urls : iterable of str
+        URLs to fetch from the live services
+    store : FixtureStore or str
+        fixture store or its directory
+    overwrite : bool
+        re-fetch URLs that have already been recorded
+    timeout : float
+        per-request timeout in seconds
+
+    Returns
+    -------
+    log : list of (url, status) tuples
+        status is the HTTP status code, or the exception message if the request failed
+    """
+
+    store = store if isinstance(store, FixtureStore) else FixtureStore(store)
+    log = []
+    for url in urls:
+        try:
+            log.append((url, fetch(url, store, overwrite, timeout)[0]))
+        except requests.RequestException as e:
+            log.append((url, str(e)))
+    return log
+
+class ReplayServer(ThreadingHTTPServer):
+    """
+    Local HTTP stand-in serving responses from a FixtureStore.
+
+    Parameters
+    ----------
+    store : FixtureStore or str
+        fixture store or its directory
+    address : tuple
+        (host, port) to listen on; port 0 picks a free port
+    latency : float
+        delay added to every response, in seconds
+    jitter : float
+        additional uniformly distributed delay in [0, jitter) seconds
+    error_rate : float
+        fraction of requests answered with 503 Service Unavailable
+    rate : float or None
+        sustained requests per second allowed before answering 429 Too Many Requests
+        (token bucket of size `burst`); None disables throttling
+    burst : int
+        token bucket size for `rate`
+    record_missing : bool
+        fetch and record URLs that are not in the store instead of answering 404
+    seed : int or None
+        seed for the latency/error random draws
+    """
+
+    daemon_threads = True
+
+    def __init__(self, store, address=("127.0.0.1", 0), latency=0., jitter=0., error_rate=0.,
+                 rate=None, burst=1, record_missing=False, seed=None):
+        super().__init__(address, _ReplayHandler)
+        self.store = store if isinstance(store, FixtureStore) else FixtureStore(store)
+        self.latency, self.jitter, self.error_rate = latency, jitter, error_rate
+        self.rate, self.burst, self.record_missing = rate, burst, record_missing
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._tokens, self._last = float(burst), time.monotonic()
+        self.stats = {"requests": 0, "served": 0, "missing": 0, "errors": 0, "throttled": 0}
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def _draw(self):
+        """Decides what to do with one request: returns (delay, outcome), where outcome is
+        None to serve the fixture, or 429/503."""
+
+        with self._lock:
+            self.stats["requests"] += 1
+            delay = self.latency + self.jitter*self._random.random()
+            if self.rate is not None:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last)*self.rate)
+                self._last = now
+                if self._tokens < 1:
+                    self.stats["throttled"] += 1
+                    return 0., 429
+                self._tokens -= 1
+            if self._random.random() < self.error_rate:
+                self.stats["errors"] += 1
+                return delay, 503
+            return delay, None
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        delay, outcome = server._draw()
+        if delay:
+            time.sleep(delay)
+        if outcome == 429:
+            return self._send(429, "text/plain", b"Too Many Requests", {"Retry-After": str(max(1, round(1/server.rate)))})
+        if outcome == 503:
+            return self._send(503, "text/plain", b"Service Unavailable")
+
+        url = "https:/" + self.path # path is /<host>/<path>?<query>; the scheme is not part of the fixture key
+        response = server.store.get(url)
+        if response is None and server.record_missing:
+            try:
+                response = fetch(url, server.store)
+            except requests.RequestException:
+                try: # some services (SIMBAD, SVO) are only reachable over plain http
+                    response = fetch("http:/" + self.path, server.store)
+                except requests.RequestException as e:
+                    return self._send(502, "text/plain", str(e).encode())
+        if response is None:
+            server._count("missing")
+            return self._send(404, "text/plain", f"No recorded response for {url}".encode())
+        server._count("served")
+        self._send(*response)
+
+    def _send(self, status, content_type, body, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # keep benchmark output clean
+
+@contextlib.contextmanager
+def serve(store, **kwargs):
+    """Runs a ReplayServer in a background thread for the duration of a `with` block, with
+    DARKGRBS_MIRROR pointing at it. Keyword arguments are passed to ReplayServer."""
+
+    server = ReplayServer(store, **kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    previous = os.environ.get(mirror_variable)
+    os.environ[mirror_variable] = server.url
+    try:
+        yield server
+    finally:
+        if previous is None:
+            os.environ.pop(mirror_variable, None)
+        else:
+            os.environ[mirror_variable] = previous
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record web responses to a fixture store, or serve them back locally.")
+    parser.add_argument("mode", choices=["record", "serve"])
+    parser.add_argument("urls", nargs="*", help="URLs to record (record mode); a file with one URL per line can be given with @file")
+    parser.add_argument("--store", default="./data/fixtures", help="fixture store directory")
+    parser.add_argument("--overwrite", action="store_true", help="re-fetch URLs that are already recorded")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.)
+    parser.add_argument("--jitter", type=float, default=0.)
+    parser.add_argument("--error-rate", type=float, default=0.)
+    parser.add_argument("--rate", type=float, default=None, help="requests per second before throttling with 429")
+    parser.add_argument("--burst", type=int, default=1)
+    parser.add_argument("--record-missing", action="store_true", help="fetch and record unknown URLs instead of answering 404")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.mode == "record":
+        urls = []
+        for arg in args.urls:
+            if arg.startswith("@"):
+                with open(arg[1:]) as f:
+                    urls.extend(line.strip() for line in f if line.strip())
+            else:
+                urls.append(arg)
+        for url, status in record(urls, args.store, args.overwrite):
+            print(status, url)
+    else:
+        server = ReplayServer(args.store, (args.host, args.port), args.latency, args.jitter, args.error_rate,
+                              args.rate, args.burst, args.record_missing, args.seed)
+        print(f"Serving {len(server.store)} recorded responses at {server.url} (set {mirror_variable}={server.url})")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,269 @@
+import os, json
+import numpy as np
+import pandas as pd
+
+from .utilities import split_uncertainties
+from .fluxtools import add_spectral_flux
+
+class BurstStore:
+    """
+    Ragged-array store for per-GRB tables (light curves, photometry).
+
+    Rows are sorted once by GRB and time, every column is kept as one contiguous NumPy
+    array, and an offset index maps each GRB to its (start, stop) row range. Selecting a
+    single burst is therefore a zero-copy slice whose cost scales with the size of that
+    burst rather than with the size of the catalog.
+
+    Parameters
+    ----------
+    columns : dict
+        column name -> array, already sorted by GRB and time
+    grbs : array_like
+        unique GRB IDs, in storage order
+    offsets : array_like
+        integer array of length len(grbs)+1; rows of grbs[i] are offsets[i]:offsets[i+1]
+    time_col : string
+        name of the time column
+    """
+
+    def __init__(self, columns, grbs, offsets, time_col="Time"):
+        self.columns = columns
+        self.grbs = np.asarray(grbs)
+        self.offsets = np.asarray(offsets)
+        self.time_col = time_col
+        self.index = {grb: i for i, grb in enumerate(self.grbs.tolist())}
+
+    @classmethod
+    def from_dataframe(cls, dataframe, time_col="Time", id_col="GRB"):
+        """Builds a store from a long-format DataFrame. Numeric columns become float/int
+        arrays and everything else becomes a fixed-width unicode array, so that every
+        column can be saved and memory-mapped."""
+
+        ids = dataframe[id_col].astype(str).to_numpy()
+        grbs, codes = np.unique(ids, return_inverse=True)
+        order = np.lexsort((dataframe[time_col].to_numpy(dtype=float), codes))
+        offsets = np.zeros(len(grbs)+1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(codes, minlength=len(grbs)))
+
+        columns = {}
+        for col in dataframe.columns.drop(id_col):
+            values = dataframe[col].to_numpy()[order]
+            if pd.api.types.is_numeric_dtype(dataframe[col]) and not pd.api.types.is_bool_dtype(dataframe[col]):
+                columns[col] = np.ascontiguousarray(values, dtype=float)
+            elif pd.api.types.is_bool_dtype(dataframe[col]):
+                columns[col] = np.ascontiguousarray(values, dtype=bool)
+            else:
+                columns[col] = np.asarray(pd.Series(values).fillna("").astype(str).to_numpy(), dtype=str)
+        return cls(columns, grbs, offsets, time_col)
+
+    def __len__(self):
+        return len(self.grbs)
+
+    def __contains__(self, grb):
+        return grb in self.index
+
+    def __iter__(self):
+        for grb in self.grbs:
+            yield grb, self[grb]
+
+    def __getitem__(self, grb):
+        """Dict of column name -> zero-copy view of the rows belonging to `grb`."""
+
+        start, stop = self.bounds(grb)
+        return {col: values[start:stop] for col, values in self.columns.items()}
+
+    @property
+    def nrows(self):
+        return int(self.offsets[-1])
+
+    def bounds(self, grb):
+        i = self.index[grb]
+        return int(self.offsets[i]), int(self.offsets[i+1])
+
+    def counts(self):
+        return pd.Series(np.diff(self.offsets), index=self.grbs)
+
+    def frame(self, grb=None):
+        """DataFrame of the rows belonging to `grb` (or of the whole store if None)."""
+
+        if grb is None:
+            data = {"GRB": np.repeat(self.grbs, np.diff(self.offsets))} | self.columns
+        else:
+            start, stop = self.bounds(grb)
+            data = {"GRB": np.full(stop-start, grb)} | self[grb]
+        return pd.DataFrame(data)
+
+    def group_codes(self):
+        """Integer burst code for every row, for vectorized per-burst computations."""
+
+        return np.repeat(np.arange(len(self.grbs)), np.diff(self.offsets))
+
+    def reduce(self, col, ufunc=np.minimum):
+        """Per-burst reduction of a column (e.g. earliest time, brightest flux) computed in a
+        single pass with `ufunc.reduceat` over the contiguous segments."""
+
+        if self.nrows == 0:
+            return pd.Series(dtype=float)
+        return pd.Series(ufunc.reduceat(np.asarray(self.columns[col]), self.offsets[:-1]), index=self.grbs)
+
+    def save(self, directory):
+        """Writes the store as one .npy file per column plus a JSON manifest."""
+
+        os.makedirs(directory, exist_ok=True)
+        names = {}
+        for i, (col, values) in enumerate(self.columns.items()):
+            names[col] = f"col{i}.npy"
+            np.save(os.path.join(directory, names[col]), values)
+        np.save(os.path.join(directory, "grbs.npy"), self.grbs.astype(str))
+        np.save(os.path.join(directory, "offsets.npy"), self.offsets)
+        with open(os.path.join(directory, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump({"time_col": self.time_col, "columns": names}, f, ensure_ascii=False, indent=1)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """Loads a store written by `save`. With `mmap=True` the column arrays are memory-mapped
+        read-only, so only the pages belonging to the bursts actually accessed are read."""
+
+        with open(os.path.join(directory, "manifest.json"), encoding="utf-8") as f:
+            manifest = json.load(f)
+        mode = "r" if mmap else None
+        columns = {col: np.load(os.path.join(directory, name), mmap_mode=mode)
+                   for col, name in manifest["columns"].items()}
+        grbs = np.load(os.path.join(directory, "grbs.npy"))
+        offsets = np.load(os.path.join(directory, "offsets.npy"))
+        return cls(columns, grbs, offsets, manifest["time_col"])
+
+def _storage_dtype(values):
+    """Column dtype used by `BurstStore.from_dataframe`: float for numbers, bool, or fixed-width unicode."""
+
+    values = np.asarray(values)
+    if values.dtype.kind == "b":
+        return np.dtype(bool)
+    if values.dtype.kind in "iuf":
+        return np.dtype(float)
+    return np.asarray(pd.Series(values).fillna("").astype(str).to_numpy(), dtype=str).dtype
+
+class BurstStoreWriter:
+    """
+    Writes a store to disk one burst at a time, in the layout of `BurstStore.save`, so that
+    stores larger than memory can be built incrementally and read back (memory-mapped) with
+    `BurstStore.load`. Column files are appended to as bursts arrive; the .npy header reserves
+    room for any length, so `close` only rewrites it in place with the final row count.
+
+    Parameters
+    ----------
+    directory : string
+        output directory
+    time_col : string
+        name of the time column
+    """
+
+    def __init__(self, directory, time_col="Time"):
+        os.makedirs(directory, exist_ok=True)
+        self.directory, self.time_col = directory, time_col
+        self.grbs, self.offsets = [], [0]
+        self._files, self._dtypes = {}, {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _header(self, col, nrows):
+        return {"descr": np.lib.format.dtype_to_descr(self._dtypes[col]), "fortran_order": False, "shape": (nrows,)}
+
+    def _write(self, columns, label):
+        if not self._files:
+            for i, (col, values) in enumerate(columns.items()):
+                self._dtypes[col] = _storage_dtype(values)
+                self._files[col] = open(os.path.join(self.directory, f"col{i}.npy"), "wb")
+                np.lib.format.write_array_header_1_0(self._files[col], self._header(col, 0))
+        if list(columns) != list(self._files):
+            raise ValueError(f"columns of {label} differ from those of the store: {list(columns)}")
+        for col, values in columns.items():
+            dtype = self._dtypes[col]
+            if dtype.kind == "U":
+                values = np.asarray(pd.Series(values).fillna("").astype(str).to_numpy(), dtype=str)
+                if values.dtype.itemsize > dtype.itemsize:
+                    raise ValueError(f"values of column {col!r} for {label} are wider than {dtype}")
+            self._files[col].write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+
+    def append(self, grb, columns):
+        """Appends the rows of one burst, given as a DataFrame or a dict of column -> array
+        (without the GRB column). Every burst must have the same columns; string columns keep
+        the width of the first burst that has rows."""
+
+        if isinstance(columns, pd.DataFrame):
+            columns = {col: columns[col].to_numpy() for col in columns.columns}
+        nrows = len(next(iter(columns.values()))) if columns else 0
+        if nrows == 0:
+            return
+        self._write(columns, grb)
+        self.grbs.append(str(grb))
+        self.offsets.append(self.offsets[-1] + nrows)
+
+    def extend(self, store):
+        """Appends all bursts of a BurstStore (e.g. one batch of results) in one write per column."""
+
+        if store.nrows == 0:
+            return
+        self._write(store.columns, f"bursts {store.grbs[0]}-{store.grbs[-1]}")
+        counts = np.diff(store.offsets)
+        self.grbs.extend(store.grbs[counts > 0].astype(str).tolist())
+        self.offsets.extend((self.offsets[-1] + np.cumsum(counts[counts > 0])).tolist())
+
+    def close(self):
+        """Finalizes the column headers and writes the GRB index and manifest."""
+
+        for col, f in self._files.items():
+            if f.closed:
+                continue
+            end = f.tell()
+            f.seek(0)
+            np.lib.format.write_array_header_1_0(f, self._header(col, self.offsets[-1]))
+            f.seek(end)
+            f.close()
+        names = {col: f"col{i}.npy" for i, col in enumerate(self._files)}
+        np.save(os.path.join(self.directory, "grbs.npy"), np.array(self.grbs, dtype=str))
+        np.save(os.path.join(self.directory, "offsets.npy"), np.array(self.offsets, dtype=np.int64))
+        with open(os.path.join(self.directory, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump({"time_col": self.time_col, "columns": names}, f, ensure_ascii=False, indent=1)
+
+def xrt_store(xrt_data="./products/Swift_XRT_lightcurves.csv", catalog=None):
+    """BurstStore of the Swift-XRT light curves, from a DataFrame or the path to the CSV
+    product. Negative error columns are stored as magnitudes (upper limits keep -inf/inf).
+    A `SpecFlux` column of `a_u` objects, if present, is split into SpecFlux/SpecFluxpos/SpecFluxneg
+    If a catalog (DataFrame or path) with Beta_X columns is given and there is no `SpecFlux`
+    column, flux densities are computed with `fluxtools.add_spectral_flux`."""
+
+    if isinstance(xrt_data, str):
+        xrt_data = pd.read_csv(xrt_data)
+    if isinstance(catalog, str):
+        catalog = pd.read_csv(catalog)
+    if catalog is not None and "SpecFlux" not in xrt_data.columns:
+        xrt_data = add_spectral_flux(xrt_data, catalog)
+    xrt_data = xrt_data.copy()
+    for col in ["Tneg", "Fluxneg"]:
+        xrt_data[col] = np.abs(pd.to_numeric(xrt_data[col]))
+    if "SpecFlux" in xrt_data.columns and not pd.api.types.is_numeric_dtype(xrt_data["SpecFlux"]):
+        split = split_uncertainties(xrt_data.pop("SpecFlux"))
+        xrt_data["SpecFlux"], xrt_data["SpecFluxpos"], xrt_data["SpecFluxneg"] = split["value"], split["plus"], split["minus"]
+    return BurstStore.from_dataframe(xrt_data, time_col="Time")
+
+def optical_store(all_optical="./products/all_optical.csv"):
+    """BurstStore of the compiled optical/UV/IR photometry, from a DataFrame or the path to
+    the CSV product. The `Flux (Jy)` column is split into Flux/Fluxpos/Fluxneg [Jy]; upper
+    limits have an infinite Fluxneg. Tables that already have those three columns, such as
+    the output of `ingest.ingest` (of which only the optical rows are kept), are used as
+    they are."""
+
+    if isinstance(all_optical, str):
+        all_optical = pd.read_csv(all_optical)
+    if "Band" in all_optical.columns:
+        all_optical = all_optical[all_optical["Band"] == "optical"]
+    all_optical = all_optical.copy()
+    if "Flux (Jy)" in all_optical.columns:
+        split = split_uncertainties(all_optical.pop("Flux (Jy)"))
+        all_optical["Flux"], all_optical["Fluxpos"], all_optical["Fluxneg"] = split["value"], split["plus"], split["minus"]
+    return BurstStore.from_dataframe(all_optical, time_col="Time (s)")
@@ -0,0 +1,146 @@
+"""
+Synthetic afterglow catalogs for benchmarking and scaling tests.
+
+`synthetic_catalog` produces tables with the same columns and conventions as the data
+products (Swift_sGRB_catalog.csv, Swift_XRT_lightcurves.csv and all_optical.csv), with
+sizes matching the real short-GRB sample at scale=1 and growing linearly with `scale`:
+broken power-law X-ray light curves with late-time upper limits, β_x with asymmetric
+errors, Galactic E(B-V), and multi-band optical/UV/IR photometry extrapolated from the
+X-ray flux with a β_ox distribution (including a dark tail), a large fraction of upper
+limits and exposures of 30 s to 1 hr.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+from .fluxtools import xray_spectral_flux, log_mean_energy, keV_to_Hz
+
+# (observatory, instrument, filter, λ_eff [Ang]) combinations drawn for the photometry
+filter_bank = [("Swift", "UVOT", "White", 3885.68), ("Swift", "UVOT", "U", 3465.), ("Swift", "UVOT", "B", 4392.),
+               ("Swift", "UVOT", "V", 5468.), ("Swift", "UVOT", "UVW1", 2600.), ("Swift", "UVOT", "UVW2", 1928.),
+               ("Gemini-N", "GMOS", "r", 6220.), ("Gemini-S", "GMOS", "i", 7590.), ("Keck", "LRIS", "g", 4770.),
+               ("VLT", "FORS2", "R", 6588.), ("VLT", "FORS2", "z", 8960.), ("Magellan", "FourStar", "J", 12350.),
+               ("Magellan", "FourStar", "H", 16620.), ("CAHA", "Omega2000", "K", 21590.)]
+
+real_sizes = {"bursts": 190, "xrt points": 5400, "optical points": 3100} # the short-GRB sample
+
+def _grb_names(n, rng):
+    """n unique names in YYMMDDx format, spread over 2005-2024 (A, B, ... suffixes)."""
+
+    days = pd.date_range("2005-01-01", "2024-12-31").strftime("%y%m%d").to_numpy()
+    order = rng.permutation(n)
+    base = days[order % len(days)]
+    suffix = np.array([chr(65+k) for k in range(26)])[np.minimum(order // len(days), 25)]
+    return np.char.add(base.astype(str), suffix)
+
+def _format_uncertain(value, plus, minus):
+    """String form of a_u objects, as written to the CSV products."""
+
+    text = pd.Series(value).astype(str) + " (+" + pd.Series(plus).astype(str) + ", -" + pd.Series(minus).astype(str) + ")"
+    return text.to_numpy()
+
+def synthetic_catalog(scale=1., seed=None, limit_fraction=0.6, dark_fraction=0.1):
+    """
+    Generates a synthetic short-GRB catalog.
+
+    Parameters
+    ----------
+    scale : float
+        size relative to the real sample (~190 bursts, ~5,400 XRT points, ~3,100 optical points)
+    seed : int or None
+        seed for the random number generator
+    limit_fraction : float
+        fraction of the optical points that are upper limits
+    dark_fraction : float
+        fraction of bursts drawn from a dark (low β_ox) population
+
+    Returns
+    -------
+    data : dict of pandas DataFrames
+        "catalog" (GRB, Trigger Number, T90, E(B-V), Beta_X, Beta_X_neg, Beta_X_pos, plus the
+        true β_ox used for the photometry), "xrt" (GRB, Time, Tpos, Tneg, Flux, Fluxpos,
+        Fluxneg) and "optical" (same columns as all_optical.csv)
+    """
+
+    rng = np.random.default_rng(seed)
+    n = max(int(round(real_sizes["bursts"]*scale)), 1)
+    grbs = _grb_names(n, rng)
+    beta_x = np.clip(rng.normal(1.0, 0.3, n), -0.5, 3.)
+    dark = rng.random(n) < dark_fraction
+    beta_ox = np.where(dark, rng.normal(0.2, 0.15, n), rng.normal(0.85, 0.15, n))
+    catalog = pd.DataFrame({"GRB": grbs, "Trigger Number": 100000 + rng.permutation(10*n)[:n],
+                            "T90": np.round(10**rng.normal(-0.3, 0.5, n), 3),
+                            "E(B-V)": np.round(rng.lognormal(np.log(0.05), 0.8, n), 3),
+                            "Beta_X": np.round(beta_x, 2), "Beta_X_neg": np.round(rng.uniform(0.1, 0.5, n), 2),
+                            "Beta_X_pos": np.round(rng.uniform(0.1, 0.6, n), 2), "Beta_OX (true)": beta_ox})
+
+    # light-curve models: up to two breaks between a steep/plateau/normal decay
+    n_breaks = rng.integers(0, 3, n)
+    alphas = np.column_stack([rng.uniform(0.2, 2.5, n), rng.uniform(0.2, 0.8, n), rng.uniform(1.0, 1.6, n)])
+    alphas = np.where(n_breaks[:,None] == 0, alphas[:,[2]], alphas)
+    logbreaks = np.sort(rng.uniform(2.5, 4.5, (n, 2)), axis=1)
+    logF100 = rng.normal(-10.3, 0.7, n) # log10 band flux at 100 s [erg/s/cm^2]
+    t_first = 10**rng.normal(1.9, 0.3, n)
+
+    def model(codes, logt):
+        logF = logF100[codes] - alphas[codes, 0]*(logt - 2)
+        for i in range(2):
+            active = n_breaks[codes] > i
+            kink = np.maximum(logt - logbreaks[codes, i], 0)
+            logF -= np.where(active, (alphas[codes, i+1] - alphas[codes, i])*kink, 0)
+        return logF
+
+    counts = rng.poisson(real_sizes["xrt points"]/real_sizes["bursts"], n) + 1
+    codes = np.repeat(np.arange(n), counts)
+    logt = np.log10(t_first[codes]) + rng.uniform(0, 1, len(codes))*(6.3 - np.log10(t_first[codes]))
+    order = np.lexsort((logt, codes))
+    codes, logt = codes[order], logt[order]
+    time = 10**logt
+    flux = 10**(model(codes, logt) + rng.normal(0, 0.08, len(codes)))
+    err = flux*rng.uniform(0.1, 0.35, len(codes))
+    limit = (logt > 5) & (rng.random(len(codes)) < 0.3)
+    half_width = time*rng.uniform(0.02, 0.2, len(codes))
+    xrt = pd.DataFrame({"GRB": grbs[codes], "Time": time, "Tpos": half_width, "Tneg": -half_width,
+                        "Flux": np.where(limit, 3*err, flux), "Fluxpos": np.where(limit, 0., err),
+                        "Fluxneg": np.where(limit, np.inf, -err)})
+
+    # photometry, extrapolated from the X-ray flux density at the same time
+    counts = rng.poisson(real_sizes["optical points"]/real_sizes["bursts"], n)
+    codes = np.repeat(np.arange(n), counts)
+    logt = rng.uniform(1.8, 6., len(codes))
+    bank = rng.integers(0, len(filter_bank), len(codes))
+    observatory, instrument, filt, lam = (np.array([f[i] for f in filter_bank])[bank] for i in range(4))
+    lam = lam.astype(float)
+    F_x = xray_spectral_flux(10**model(codes, logt), 0, 0, beta_x[codes], 0, 0)[0]
+    nu_o = 299792458/(lam/1e10)
+    F_o = F_x*(nu_o/(log_mean_energy*keV_to_Hz))**(-beta_ox[codes])
+    extinction = 3.1*catalog["E(B-V)"].to_numpy()[codes]*(5500/lam)
+    mag = np.round(-2.5*np.log10(F_o/3631) + extinction + rng.normal(0, 0.1, len(codes)), 2)
+    upper = rng.random(len(codes)) < limit_fraction
+    mag = np.where(upper, np.round(mag - rng.uniform(0.2, 2., len(codes)), 1), mag)
+    mag_err = np.round(rng.uniform(0.03, 0.3, len(codes)), 2)
+    flux = 3631*10**(-(mag - extinction)/2.5)
+    flux_err = flux*mag_err*np.log(10)/2.5
+    exposure = np.round(np.minimum(10**rng.uniform(1.5, 3.6, len(codes)), 10**logt), 1) # 30 s to 1 hr, centred on the epoch
+    optical = pd.DataFrame({"GRB": grbs[codes], "TriggerNumber": catalog["Trigger Number"].to_numpy()[codes],
+                            "Observatory": observatory, "Instrument": instrument, "Filter": filt, "λ_eff": lam,
+                            "Time (s)": np.round(10**logt, 1), "Magnitude": mag,
+                            "Mag error": np.where(upper, "UL", mag_err.astype(str)), "Source": "synthetic",
+                            "E(B-V)": catalog["E(B-V)"].to_numpy()[codes], "Extinction": extinction,
+                            "Flux (Jy)": _format_uncertain(flux, np.where(upper, 0., flux_err), np.where(upper, np.inf, flux_err)),
+                            "Exposure (s)": exposure})
+    optical = optical.sort_values(["GRB", "Time (s)"], ascending=[False, True], kind="stable").reset_index(drop=True)
+    return {"catalog": catalog, "xrt": xrt, "optical": optical}
+
+def write_synthetic_catalog(directory, scale=1., seed=None, **kwargs):
+    """Writes a synthetic catalog as Swift_sGRB_catalog.csv, Swift_XRT_lightcurves.csv and
+    all_optical.csv in `directory` and returns the three paths."""
+
+    os.makedirs(directory, exist_ok=True)
+    data = synthetic_catalog(scale, seed, **kwargs)
+    paths = []
+    for key, filename in [("catalog", "Swift_sGRB_catalog.csv"), ("xrt", "Swift_XRT_lightcurves.csv"), ("optical", "all_optical.csv")]:
+        paths.append(os.path.join(directory, filename))
+        data[key].to_csv(paths[-1], index=False)
+    return paths
@@ -1,35 +1,63 @@
-import numpy as np, requests
+import os, re, numpy as np, pandas as pd, requests
 from bs4 import BeautifulSoup as bs
+from .grbid import parse_ids, grb_years
 
-class custom_iter: # custom iterator class that allows for retrieval of current element w/out advancing
-    def __init__(self, iterable):
-        self.iterable = iterable
-        self.iterator = iter(iterable)
-        self.current = None
-    def __next__(self):
-        try:
-            self.current = next(self.iterator)
-        except StopIteration:
-            self.current = None
-        finally:
-            return self.current
-    def __len__(self):
-        return len(self.iterable)
+mirror_variable = "DARKGRBS_MIRROR"
 
-def split_filters(string):
-    UVOT_filters = ["B","U","UVW1","UVM2","UVW2","White"]
-    name_idxs = custom_iter([string.index(i) for i in UVOT_filters if i in string])
-    split_list = [string[name_idxs.current:next(name_idxs)] for i in range(len(UVOT_filters))]
-    split_list = [item for item in split_list if len(item)>0]
-    return np.unique(split_list).tolist()
+def mirrored(url):
+    """Rewrites a URL to go through the local replay server (see src/replay.py) when the
+    DARKGRBS_MIRROR environment variable is set, e.g. https://www.swift.ac.uk/xrt_curves/grb.list
+    becomes http://127.0.0.1:8765/www.swift.ac.uk/xrt_curves/grb.list. Otherwise returns it unchanged."""
+
+    mirror = os.environ.get(mirror_variable)
+    if not mirror:
+        return url
+    return mirror.rstrip("/") + "/" + url.split("://", 1)[-1]
+
+UVOT_filter_pattern = re.compile(r"(?P<Filter>UVW1|UVW2|UVM2|White|[UBV])\s*(?P<Relation>[=>])\s*(?P<Magnitude>\d+(?:\.\d+)?)")
+
+def parse_UVOT_filters(dataframe, colname="Other UVOT Filters", id_col="GRB"):
+    """Tokenizes the concatenated UVOT filter/magnitude strings from the Swift GRB table
+    (e.g. "B>19.76U>19.29UVW1=18.86") for a whole column at once. Returns a long-format
+    DataFrame with one row per measurement and columns GRB, Filter, Relation ("=" for a
+    detection, ">" for an upper limit), and Magnitude."""
+    
+    tokens = dataframe[colname].reset_index(drop=True).astype("string").str.extractall(UVOT_filter_pattern)
+    grbs = dataframe[id_col].to_numpy()[tokens.index.get_level_values(0)]
+    tokens = tokens.reset_index(drop=True)
+    tokens.insert(0, id_col, grbs)
+    tokens["Magnitude"] = tokens["Magnitude"].astype(float)
+    return tokens.drop_duplicates(ignore_index=True)
+
+a_u_pattern = r"^\s*(?P<value>[^\s(±]+)\s*(?:±\s*(?P<error>\S+)|\(\+\s*(?P<plus>[^,]+),\s*-\s*(?P<minus>[^)]+)\))?\s*$"
+
+def split_uncertainties(values):
+    """Splits a column of asymmetric uncertainties into plain float columns `value`, `plus`
+    and `minus`. Accepts either `a_u` objects or their string representations as written
+    to the CSV products, i.e. "1.4e-06 ± 3.8e-07" or "3.7e-05 (+0.0, -inf)"."""
+
+    values = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(values):
+        return pd.DataFrame({"value": values.astype(float), "plus": 0., "minus": 0.}, index=values.index)
+    if values.map(lambda entry: hasattr(entry, "value")).any():
+        return pd.DataFrame({"value": [getattr(entry, "value", np.nan) for entry in values],
+                             "plus": [getattr(entry, "plus", np.nan) for entry in values],
+                             "minus": [getattr(entry, "minus", np.nan) for entry in values]}, index=values.index)
+    parts = values.astype("string").str.extract(a_u_pattern)
+    parts = parts.apply(pd.to_numeric, errors="coerce").astype(float)
+    split = pd.DataFrame({"value": parts["value"],
+                          "plus": parts["plus"].fillna(parts["error"]).fillna(0),
+                          "minus": parts["minus"].fillna(parts["error"]).fillna(0)}, index=values.index)
+    split.loc[split["value"].isna(), ["plus", "minus"]] = np.nan
+    return split
 
 def new_since_Fong(dataframe, colname="GRB"):
-    indexer = [int(grb[:6]) > 150301 for grb in dataframe[colname]]
+    indexer = parse_ids(dataframe[colname])["Date"].gt(20150301).fillna(False).to_numpy()
     return dataframe[indexer].copy()
 
 def simbad_bibcodes(GRB):
     URL = f"http://simbad.u-strasbg.fr/simbad/sim-id?Ident=GRB%20{GRB}&submit=In+table&output.format=ASCII"
-    content = requests.get(URL).text
+    content = requests.get(mirrored(URL)).text
     entries = content.split("\n\n")
     bibcodes = entries[["Bibcodes" in entry or "References" in entry for entry in entries].index(True)].strip()
     
@@ -43,7 +71,7 @@ def literature_references(GRB,titles=True,links=True,GCNs=False):
             continue
         ADS_URL = f"https://ui.adsabs.harvard.edu/abs/{bibcode}/"
         link_list.append(ADS_URL)
-        soup = bs(requests.get(ADS_URL).text, features="lxml")
+        soup = bs(requests.get(mirrored(ADS_URL)).text, features="lxml")
         title = soup.find("title")
         title_list.append(title.text[:-11]) # exclude " - NASA/ADS" from the title
         
@@ -60,11 +88,4 @@ def addYear(GRB_df):
     """In-place function that adds a 'year' column to a DataFrame
     as long as it has a 'GRB' column."""
     
-    yrs = []
-    for i in GRB_df.index:
-        yy = int(GRB_df.loc[i,"GRB"][:2])
-        if yy>21:
-            yrs.append(1900+yy)
-        else:
-            yrs.append(2000+yy)
-    GRB_df["Year"] = yrs
\ No newline at end of file
+    GRB_df["Year"] = grb_years(GRB_df["GRB"]).to_numpy()
@@ -5,8 +5,10 @@ from bs4 import BeautifulSoup as bs
 from astropy.coordinates import SkyCoord
 from astropy.table import Table
 from asymmetric_uncertainty import a_u
+from .utilities import mirrored
+from .builder import TableBuilder
 
-grb_list = pd.read_table("https://www.swift.ac.uk/xrt_curves/grb.list",
+grb_list = pd.read_table(mirrored("https://www.swift.ac.uk/xrt_curves/grb.list"),
                          sep=" |\t",header=None,engine="python",
                          names=["_","GRB","Trigger Number"]).drop("_",axis=1)
 
@@ -37,19 +39,20 @@ def XRT_lightcurve(burst_id,lookuptable=grb_list):
     """
     trigger = lookuptable.loc[lookuptable["GRB"] == burst_id, "Trigger Number"]
     
-    lightcurveURL = f"https://www.swift.ac.uk/xrt_curves/{int(trigger):0>8}/flux_incbad.qdp"
-    fluxdata = pd.DataFrame(columns=['Time', 'Time_perr', 'Time_nerr', 'Flux', 'Flux_perr', 'Flux_nerr'])
+    lightcurveURL = mirrored(f"https://www.swift.ac.uk/xrt_curves/{int(trigger):0>8}/flux_incbad.qdp")
+    fluxtable = TableBuilder(['Time', 'Time_perr', 'Time_nerr', 'Flux', 'Flux_perr', 'Flux_nerr'])
     i = 0
     while True:
         try:
             current = Table.read(lightcurveURL,format="ascii.qdp",table_id=i,names=["Time","Flux"]).to_pandas()
-            fluxdata = pd.concat([fluxdata,current], ignore_index=True)
+            fluxtable.extend(current)
             i += 1
         except:
             if i>0:
                 break
             else:
                 raise IndexError
+    fluxdata = fluxtable.to_dataframe()
     fluxdata.columns = ["Time","Tpos","Tneg","Flux","Fluxpos","Fluxneg"]
     fluxdata = fluxdata.apply(pd.to_numeric)
     fluxdata["GRB"] = [burst_id]*len(fluxdata)
@@ -84,7 +87,7 @@ def get_columnDensity(burst_id,lookuptable=grb_list):
         trigger = int(grb_list.loc[grb_list["GRB"] == burst_id, "Trigger Number"])
     spectrumURL = f"https://www.swift.ac.uk/xrt_spectra/{trigger:0>8}/"
     
-    page = requests.get(spectrumURL)
+    page = requests.get(mirrored(spectrumURL))
     soup = bs(page.content,"html.parser")
     assert page.status_code != 404, "404 Error."
     assert len(soup.findAll("table",{"summary":"Model fitted to interval0 data"}))>0, "No tables found."
@@ -145,7 +148,7 @@ def get_photonIndex(burst_id,lookuptable=grb_list):
         trigger = int(grb_list.loc[grb_list["GRB"] == burst_id, "Trigger Number"])
     spectrumURL = f"https://www.swift.ac.uk/xrt_spectra/{trigger:0>8}/"
     
-    page = requests.get(spectrumURL)
+    page = requests.get(mirrored(spectrumURL))
     soup = bs(page.content,"html.parser")
     assert page.status_code != 404, "404 Error."
     assert len(soup.findAll("table",{"summary":"Model fitted to interval0 data"}))>0, "No tables found."
@@ -174,34 +177,33 @@ def get_photonIndex(burst_id,lookuptable=grb_list):
     gamma = a_u(Gamma, Gammapos, Gammaneg)
     return gamma, used_mode
 
-def get_temporalIndex(burst_id,query_time,lookuptable=grb_list):
+def get_lightcurveModel(burst_id,lookuptable=grb_list):
     """
-    Function for retrieving the temporal index (power-law slope) of a gamma-ray burst at a given time.
+    Function for retrieving the piecewise power-law model fitted to a gamma-ray burst's light curve by the XRT live catalogue.
     
-    Author: Caden Gobat, George Washington University
-
     Parameters
     ----------
     burst_id : string
         GRB ID/name in the form YYMMDDx
-    query_time : numeric
-        time (in seconds) at which to retrieve the temporal index
     lookuptable : pandas DataFrame
         the reference table to get the Trigger Number
 
     Returns
     -------
-    alpha : a_u
-        value of the temporal index at the specified time in the form (value (pos_err, neg_err)) [units of cm^-2]
+    breaktimes : list of a_u
+        end time (in seconds) of each power-law segment; the last entry is always inf
+    alphas : list of a_u
+        temporal index of each segment, in the sense F ∝ t^-α
 
     Raises
     ------
-    
+    AssertionError
+        if the live catalogue table cannot be parsed
     """
     trigger = lookuptable.loc[lookuptable["GRB"] == burst_id, "Trigger Number"]
     livecatURL = f"https://www.swift.ac.uk/xrt_live_cat/{int(trigger):0>8}/"
     
-    livecat_tables = pd.read_html(livecatURL)
+    livecat_tables = pd.read_html(mirrored(livecatURL))
     slopes_table = livecat_tables[2]
     assert len(slopes_table.columns)==2
     
@@ -221,6 +223,34 @@ def get_temporalIndex(burst_id,query_time,lookuptable=grb_list):
     
     assert len(breaktimes)+len(alphas) == len(slopes_table.index)+1, "Mismatch error in parsing table rows"
     
+    return breaktimes, alphas
+
+def get_temporalIndex(burst_id,query_time,lookuptable=grb_list):
+    """
+    Function for retrieving the temporal index (power-law slope) of a gamma-ray burst at a given time.
+    
+    Author: Caden Gobat, George Washington University
+
+    Parameters
+    ----------
+    burst_id : string
+        GRB ID/name in the form YYMMDDx
+    query_time : numeric
+        time (in seconds) at which to retrieve the temporal index
+    lookuptable : pandas DataFrame
+        the reference table to get the Trigger Number
+
+    Returns
+    -------
+    alpha : a_u
+        value of the temporal index at the specified time in the form (value (pos_err, neg_err)) [units of cm^-2]
+
+    Raises
+    ------
+    
+    """
+    breaktimes, alphas = get_lightcurveModel(burst_id,lookuptable)
+    
     for i,time in enumerate(breaktimes):
         if query_time < time:
             alpha = alphas[i]